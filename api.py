@@ -0,0 +1,449 @@
+"""Async HTTP API for the skincare agents, for the mobile app and partner integrations.
+
+    python api.py --port 8000            # or: uvicorn api:app --workers 4
+
+Endpoints (JSON bodies, or form data with an optional ``image`` file part):
+
+    GET  /health                 liveness; the only endpoint that needs no SKINCARE_API_TOKEN
+    GET  /v1/agents              agent keys and display names
+    POST /v1/analyze             {"agent", "text", "skin_type", "lang", "use_cache", "structured"} -> one analysis
+    POST /v1/analyze/stream      the same, streamed as server-sent events ("delta", then "done"); always markdown
+    POST /v1/consult             {"agents": [...], ...} -> every analysis and the merged report
+    POST /v1/consult/stream      one "agent" event as each specialist finishes, then "done"
+    GET  /v1/stats               cache, scheduler and coalescing counters
+    GET  /metrics                Prometheus metrics, when SKINCARE_TELEMETRY is on
+
+With ``"structured": true`` analyses come back as findings objects (conditions, severity,
+recommendations, ingredients, red flags) as well as markdown, and a consultation's findings are
+merged into one deduplicated ``findings`` object.
+
+The agents are synchronous, so each analysis runs on a bounded thread pool while the event loop
+keeps serving other connections. Identical requests that are in flight at the same time share
+one upstream call; streamed ones replay what was already sent and then follow it live.
+"""
+import argparse
+import asyncio
+import base64
+import contextlib
+import hashlib
+import hmac
+import json
+import os
+from dataclasses import asdict
+
+import anyio
+import uvicorn
+from dotenv import load_dotenv
+from openai import OpenAI
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+# The project modules read their SKINCARE_* settings when first imported, so .env comes first
+load_dotenv()
+
+from conversation import start_tokenizer  # noqa: E402
+from i18n import LANGUAGES, DEFAULT_LANGUAGE, t, use_language  # noqa: E402
+from image_processing import ImageRejected, preprocess_image  # noqa: E402
+from findings import merge_findings, render_markdown, to_dict  # noqa: E402
+from response_cache import normalize_input  # noqa: E402
+from scheduler import use_session  # noqa: E402
+from skincare_core import (  # noqa: E402
+    CONSULTATION_TIMEOUT, SKIN_TYPES, build_agents, merge_consultation, request_scheduler, response_cache, run_consultation
+)
+import telemetry  # noqa: E402
+
+# API settings, overridable through the environment
+API_TOKEN = os.getenv("SKINCARE_API_TOKEN", "")  # when set, requests need "Authorization: Bearer <token>"
+API_MAX_UPLOAD_BYTES = int(float(os.getenv("SKINCARE_API_MAX_UPLOAD_MB", "10")) * 1024 * 1024)
+API_WORKERS = int(os.getenv("SKINCARE_API_WORKERS", "32"))  # analyses running at once per process
+API_TIMEOUT = float(os.getenv("SKINCARE_API_TIMEOUT", str(CONSULTATION_TIMEOUT)))  # seconds per model request
+MAX_FORM_FIELDS = 20
+
+
+class BodySizeLimit:
+    """ASGI middleware that rejects request bodies over ``max_bytes`` as they stream in.
+
+    Chunked uploads without a Content-Length are counted too, so an upload never grows past
+    the limit in memory.
+    """
+
+    def __init__(self, app, max_bytes: int = API_MAX_UPLOAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        length = dict(scope["headers"]).get(b"content-length")
+        if length and length.isdigit() and int(length) > self.max_bytes:
+            await error_response(413, "Request body too large")(scope, receive, send)
+            return
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            received += len(message.get("body", b""))
+            if received > self.max_bytes:
+                raise HTTPException(413, "Request body too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def error_response(status: int, message: str) -> JSONResponse:
+    return JSONResponse({"error": message}, status_code=status)
+
+
+async def http_error(request: Request, error: HTTPException) -> JSONResponse:
+    return error_response(error.status_code, error.detail)
+
+
+class _Feed:
+    """Items produced by one streamed call, replayed to every request that follows it."""
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def push(self, item):
+        self.items.append(item)
+        self._wake()
+
+    def close(self, error: Exception = None):
+        self.done = True
+        self.error = error
+        self._wake()
+
+    def _wake(self):
+        # Followers wait on the old event; each change gets a fresh one
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def follow(self):
+        sent = 0
+        while True:
+            while sent < len(self.items):
+                yield self.items[sent]
+                sent += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class Coalescer:
+    """Shares one upstream call between identical requests that are in flight at the same time.
+
+    Blocking work runs on a thread pool of ``workers`` threads. Calls are not cancelled when
+    the request that started them disconnects, since others may be waiting on them, and a
+    finished call is forgotten at once: repeats after that are the response cache's job.
+    """
+
+    def __init__(self, workers: int = API_WORKERS):
+        self.workers = workers
+        self.calls = 0
+        self.coalesced = 0
+        self._limiter = None
+        self._calls = {}
+        self._feeds = {}
+
+    @property
+    def limiter(self) -> anyio.CapacityLimiter:
+        # Created on first use, inside the event loop
+        if self._limiter is None:
+            self._limiter = anyio.CapacityLimiter(self.workers)
+        return self._limiter
+
+    async def run_sync(self, function, *args):
+        """Run a blocking function on the pool, in a copy of the caller's context."""
+        return await anyio.to_thread.run_sync(function, *args, limiter=self.limiter)
+
+    async def call(self, key: str, function, *args):
+        """Return ``function(*args)``, run once for all concurrent callers with the same ``key``."""
+        task = self._calls.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(self.run_sync(function, *args))
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def stream(self, key: str, produce, *args):
+        """Yield the items of the blocking generator ``produce(*args)``, shared like ``call``."""
+        feed = self._feeds.get(key)
+        if feed is None:
+            self.calls += 1
+            feed = self._feeds[key] = _Feed()
+            # Held on the feed so the task is not garbage collected while it runs
+            feed.task = asyncio.ensure_future(self._pump(key, feed, produce, args))
+        else:
+            self.coalesced += 1
+        async for item in feed.follow():
+            yield item
+
+    async def _pump(self, key: str, feed: _Feed, produce, args):
+        loop = asyncio.get_running_loop()
+
+        def drain():
+            # The whole generator runs on one thread, as its spans and context blocks expect
+            for item in produce(*args):
+                loop.call_soon_threadsafe(feed.push, item)
+
+        try:
+            await self.run_sync(drain)
+            feed.close()
+        except Exception as e:
+            feed.close(e)
+        finally:
+            self._feeds.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._calls) + len(self._feeds)}
+
+
+def request_key(kind: str, params: dict) -> str:
+    """Identify requests that would produce the same answer."""
+    image_digest = hashlib.sha256(params["image_data"].encode()).hexdigest() if params["image_data"] else ""
+    payload = json.dumps([kind, params["agents"], normalize_input(params["text"]), params["skin_type"],
+                          image_digest, params["image_detail"], params["lang"], params["use_cache"],
+                          params["structured"]])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def as_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() not in ("0", "false", "no", "off")
+
+
+async def read_params(request: Request, agents: dict, coalescer: Coalescer) -> dict:
+    """Validate an analysis request, given as JSON or form data.
+
+    A multipart ``image`` part is decoded straight from its spooled file, without being read
+    into memory first; a JSON ``image`` is a base64 string or data URL. Either is downsized
+    exactly as the Streamlit page does.
+    """
+    if request.headers.get("content-type", "").startswith(("multipart/form-data", "application/x-www-form-urlencoded")):
+        # The form owns the uploaded file, so it stays open until the image is prepared
+        async with request.form(max_files=1, max_fields=MAX_FORM_FIELDS) as form:
+            data = {key: value for key, value in form.items() if isinstance(value, str)}
+            data["agents"] = form.getlist("agents")
+            upload = form.get("image")
+            image = upload.file if upload is not None and not isinstance(upload, str) and upload.size else None
+            return await validate_params(data, image, agents, coalescer)
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(400, "Body must be JSON or form data")
+    if not isinstance(data, dict):
+        raise HTTPException(400, "Body must be a JSON object")
+    image = None
+    if data.get("image"):
+        try:
+            image = base64.b64decode(str(data["image"]).split(",")[-1], validate=True)
+        except ValueError:
+            raise HTTPException(400, "image must be base64 encoded")
+    return await validate_params(data, image, agents, coalescer)
+
+
+async def validate_params(data: dict, image, agents: dict, coalescer: Coalescer) -> dict:
+    """Check the request fields and prepare ``image`` (bytes or a file), if there is one."""
+    names = data.get("agents") or ([data["agent"]] if data.get("agent") else [])
+    if isinstance(names, str):
+        names = [names]
+    # Form fields may list several agents in one comma-separated value
+    names = [name.strip() for value in names for name in str(value).split(",") if name.strip()]
+    unknown = [name for name in names if name not in agents]
+    if not names or unknown:
+        raise HTTPException(400, f"Unknown or missing agent: {', '.join(unknown) or '-'}; choose from {', '.join(agents)}")
+    skin_type = data.get("skin_type") or "normal"
+    if skin_type not in SKIN_TYPES:
+        raise HTTPException(400, f"skin_type must be one of {', '.join(SKIN_TYPES)}")
+    lang = data.get("lang") or DEFAULT_LANGUAGE
+    if lang not in LANGUAGES:
+        raise HTTPException(400, f"lang must be one of {', '.join(LANGUAGES)}")
+    text = str(data.get("text") or "")
+    if not text.strip() and not image:
+        raise HTTPException(400, "Send a question in text, an image, or both")
+
+    image_data, image_detail = None, "high"
+    if image:
+        try:
+            prepared = await coalescer.run_sync(preprocess_image, image)
+        except ImageRejected as e:
+            raise HTTPException(413 if e.reason == "too_large" else 400, str(e))
+        image_data, image_detail = prepared.data_url, prepared.detail
+    return {"agents": names, "text": text, "skin_type": skin_type, "lang": lang,
+            "use_cache": as_bool(data.get("use_cache", True)), "structured": as_bool(data.get("structured", False)),
+            "image_data": image_data, "image_detail": image_detail}
+
+
+def client_id(request: Request) -> str:
+    """Who a request is scheduled for: the caller's own id if it sends one, else its address."""
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "")
+
+
+def check_token(request: Request):
+    # Compared in constant time, so response timing does not reveal how much of a guess was right
+    supplied = request.headers.get("authorization", "").encode()
+    if API_TOKEN and not hmac.compare_digest(supplied, f"Bearer {API_TOKEN}".encode()):
+        raise HTTPException(401, "Missing or invalid bearer token")
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def create_app(agents: dict = None, coalescer: Coalescer = None) -> Starlette:
+    """Build the API around ``agents`` (by default the specialists, on a client from the environment)."""
+    coalescer = coalescer or Coalescer()
+    state = {"agents": agents}
+
+    def get_agents() -> dict:
+        if state["agents"] is None:
+            state["agents"] = build_agents(OpenAI())
+        return state["agents"]
+
+    async def prepare(request: Request) -> dict:
+        check_token(request)
+        return await read_params(request, get_agents(), coalescer)
+
+    async def health(request: Request):
+        return JSONResponse({"status": "ok"})
+
+    async def list_agents(request: Request):
+        check_token(request)
+        lang = request.query_params.get("lang", DEFAULT_LANGUAGE)
+        return JSONResponse({"agents": [
+            {"key": key, "name": agent.name, "label": t(f"agent.{key}", lang, default=key)}
+            for key, agent in get_agents().items()
+        ]})
+
+    async def analyze(request: Request):
+        params = await prepare(request)
+        name = params["agents"][0]
+        agent = get_agents()[name]
+        with use_language(params["lang"]), use_session(client_id(request)):
+            result = await coalescer.call(
+                request_key("analyze", params), agent.run, params["text"], params["image_data"], params["skin_type"],
+                API_TIMEOUT, params["use_cache"], params["image_detail"], params["structured"]
+            )
+        return JSONResponse(dict(asdict(result), agent=name))
+
+    async def analyze_stream(request: Request):
+        params = await prepare(request)
+        params["structured"] = False  # partial JSON is of no use to a reader; this endpoint streams markdown
+        name = params["agents"][0]
+        agent = get_agents()[name]
+
+        async def events():
+            with use_language(params["lang"]), use_session(client_id(request)):
+                deltas = coalescer.stream(
+                    request_key("analyze", params), agent.analyze_stream, params["text"], params["image_data"],
+                    params["skin_type"], API_TIMEOUT, params["use_cache"], params["image_detail"]
+                )
+                async for delta in deltas:
+                    yield sse("delta", {"text": delta})
+            yield sse("done", {"agent": name})
+
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    def consult_args(params: dict) -> tuple:
+        return (get_agents(), params["agents"], params["text"], params["image_data"], params["skin_type"],
+                API_TIMEOUT, params["use_cache"], params["image_detail"], params["structured"])
+
+    async def consult(request: Request):
+        params = await prepare(request)
+        with use_language(params["lang"]), use_session(client_id(request)):
+            results = await coalescer.call(
+                request_key("consult", params), lambda *args: dict(run_consultation(*args)), *consult_args(params)
+            )
+        if params["structured"]:
+            combined = merge_findings(results, params["agents"])
+            with use_language(params["lang"]):
+                report = render_markdown(combined)
+            return JSONResponse({"results": {name: to_dict(findings) for name, findings in results.items()},
+                                 "findings": to_dict(combined), "report": report})
+        return JSONResponse({"results": results, "report": merge_consultation(results, params["agents"])})
+
+    async def consult_stream(request: Request):
+        params = await prepare(request)
+
+        async def events():
+            results = {}
+            with use_language(params["lang"]), use_session(client_id(request)):
+                finished = coalescer.stream(request_key("consult", params), run_consultation, *consult_args(params))
+                async for name, response in finished:
+                    if params["structured"]:
+                        results[name] = response
+                        yield sse("agent", {"agent": name, "text": render_markdown(response), "findings": to_dict(response)})
+                    else:
+                        yield sse("agent", {"agent": name, "text": response})
+            if params["structured"]:
+                yield sse("done", {"agents": params["agents"], "findings": to_dict(merge_findings(results, params["agents"]))})
+            else:
+                yield sse("done", {"agents": params["agents"]})
+
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    async def stats(request: Request):
+        check_token(request)
+        return JSONResponse({"coalescer": coalescer.stats(), "scheduler": request_scheduler.stats(),
+                             "cache": response_cache.stats()})
+
+    async def metrics(request: Request):
+        check_token(request)
+        if not telemetry.TELEMETRY_ENABLED:
+            raise HTTPException(404, "Telemetry is off; set SKINCARE_TELEMETRY=1")
+        return PlainTextResponse(telemetry.render_metrics(), media_type="text/plain; version=0.0.4")
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app: Starlette):
+        start_tokenizer()
+        yield
+
+    return Starlette(
+        lifespan=lifespan,
+        routes=[
+            Route("/health", health),
+            Route("/metrics", metrics),
+            Route("/v1/agents", list_agents),
+            Route("/v1/analyze", analyze, methods=["POST"]),
+            Route("/v1/analyze/stream", analyze_stream, methods=["POST"]),
+            Route("/v1/consult", consult, methods=["POST"]),
+            Route("/v1/consult/stream", consult_stream, methods=["POST"]),
+            Route("/v1/stats", stats),
+        ],
+        middleware=[Middleware(BodySizeLimit, max_bytes=API_MAX_UPLOAD_BYTES)],
+        exception_handlers={HTTPException: http_error},
+    )
+
+
+app = create_app()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="server processes; set SKINCARE_RATE_LIMIT_DB to share limits")
+    args = parser.parse_args()
+    uvicorn.run("api:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
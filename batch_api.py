@@ -0,0 +1,200 @@
+import io
+import json
+import os
+import sys
+import time
+
+from openai import OpenAI
+
+from findings import render_markdown, to_dict
+
+# OpenAI Batch API limits per input file; chunks stay a little under the byte limit
+BATCH_MAX_REQUESTS = 50000
+BATCH_MAX_BYTES = 190 * 1024 * 1024
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_POLL_INTERVAL = 60  # seconds between status checks
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def task_id(case_id: str, agent_name: str) -> str:
+    """Encode a (case, agent) pair as a Batch API custom_id."""
+    return json.dumps([case_id, agent_name], ensure_ascii=False)
+
+
+def parse_task_id(custom_id: str) -> tuple:
+    case_id, agent_name = json.loads(custom_id)
+    return case_id, agent_name
+
+
+class BatchJob:
+    """A bulk analysis submitted through the OpenAI Batch API, with its state kept on disk.
+
+    The state file records every chunk's input file, batch id and status, so a restarted
+    process picks up polling where the previous one stopped instead of submitting again.
+    """
+
+    def __init__(self, client: OpenAI, agents: dict, state_path: str, structured: bool = False):
+        self.client = client
+        self.agents = agents
+        self.state_path = state_path
+        self.structured = structured
+        self.state = {"chunks": []}
+        if os.path.exists(state_path):
+            with open(state_path, encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def save(self):
+        # Write to a temporary file first so a crash never leaves a truncated state file
+        temporary = self.state_path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(temporary, self.state_path)
+
+    def submitted(self) -> set:
+        """Return the custom_ids whose chunk has not been collected yet.
+
+        Once a chunk is collected its outcomes are in the output file, and tasks that failed
+        or were left unfinished are submitted again on the next run.
+        """
+        return {custom_id for chunk in self.state["chunks"] if not chunk["collected"] for custom_id in chunk["custom_ids"]}
+
+    def build_lines(self, tasks: list, load_image):
+        """Yield (custom_id, line) Batch API requests for (case, agent name) tasks, one at a time."""
+        for case, agent_name in tasks:
+            image_data, image_detail = load_image(case)
+            custom_id = task_id(case["id"], agent_name)
+            yield custom_id, json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": self.agents[agent_name].request_body(case["text"], image_data, case["skin_type"], image_detail,
+                                                             structured=self.structured),
+            }, ensure_ascii=False) + "\n"
+
+    def submit(self, tasks: list, load_image) -> int:
+        """Upload every task not yet submitted, in chunks within the Batch API limits.
+
+        Returns the number of new chunks.
+        """
+        pending = self.submitted()
+        tasks = [(case, name) for case, name in tasks if task_id(case["id"], name) not in pending]
+        chunk, chunk_bytes, created = [], 0, 0
+        for custom_id, line in self.build_lines(tasks, load_image):
+            size = len(line.encode("utf-8"))
+            if chunk and (len(chunk) >= BATCH_MAX_REQUESTS or chunk_bytes + size > BATCH_MAX_BYTES):
+                self._submit_chunk(chunk)
+                created += 1
+                chunk, chunk_bytes = [], 0
+            chunk.append((custom_id, line))
+            chunk_bytes += size
+        if chunk:
+            self._submit_chunk(chunk)
+            created += 1
+        return created
+
+    def _submit_chunk(self, chunk: list):
+        payload = "".join(line for _, line in chunk).encode("utf-8")
+        input_file = self.client.files.create(
+            file=(f"skincare-batch-{len(self.state['chunks'])}.jsonl", io.BytesIO(payload)), purpose="batch"
+        )
+        batch = self.client.batches.create(
+            input_file_id=input_file.id, endpoint=BATCH_ENDPOINT, completion_window=BATCH_COMPLETION_WINDOW
+        )
+        self.state["chunks"].append({
+            "input_file_id": input_file.id,
+            "batch_id": batch.id,
+            "status": batch.status,
+            "collected": False,
+            "custom_ids": [custom_id for custom_id, _ in chunk],
+        })
+        self.save()
+
+    def poll(self):
+        """Refresh the status of every unfinished chunk."""
+        for chunk in self.state["chunks"]:
+            if chunk["status"] in TERMINAL_STATUSES:
+                continue
+            batch = self.client.batches.retrieve(chunk["batch_id"])
+            chunk["status"] = batch.status
+            chunk["output_file_id"] = batch.output_file_id
+            chunk["error_file_id"] = batch.error_file_id
+        self.save()
+
+    def outstanding(self) -> int:
+        return sum(1 for chunk in self.state["chunks"] if not chunk["collected"] and chunk["status"] not in TERMINAL_STATUSES)
+
+    def collect(self, cases: dict, write, done: set = frozenset()) -> int:
+        """Apply tool post-processing to finished chunks and pass one record per task to ``write``.
+
+        ``done`` holds the (batch id, custom_id) pairs already written. A chunk is only marked
+        collected after all its records are written, so after a crash in between the chunk is
+        collected again and those pairs are skipped rather than written twice.
+
+        Returns the number of records written.
+        """
+        written = 0
+        for chunk in self.state["chunks"]:
+            if chunk["collected"] or chunk["status"] not in TERMINAL_STATUSES:
+                continue
+            for file_id in (chunk.get("output_file_id"), chunk.get("error_file_id")):
+                if not file_id:
+                    continue
+                for line in self.client.files.content(file_id).text.splitlines():
+                    if not line.strip():
+                        continue
+                    output = json.loads(line)
+                    if (chunk["batch_id"], output["custom_id"]) in done:
+                        continue
+                    record = self._record(output, cases, chunk["batch_id"])
+                    if record is not None:
+                        write(record)
+                        written += 1
+            chunk["collected"] = True
+            self.save()
+        return written
+
+    def _record(self, output: dict, cases: dict, batch_id: str = "") -> dict:
+        case_id, agent_name = parse_task_id(output["custom_id"])
+        case = cases.get(case_id)
+        if case is None:
+            return None
+        agent = self.agents[agent_name]
+        response = output.get("response") or {}
+        body = response.get("body") or {}
+        record = {
+            "id": case_id,
+            "agent": agent_name,
+            "skin_type": case["skin_type"],
+            "model": body.get("model", ""),
+            "usage": body.get("usage", {}),
+            "cached": False,
+            "batch": True,
+            "batch_id": batch_id,
+        }
+        if output.get("error") or response.get("status_code") != 200:
+            error = output.get("error") or body.get("error") or {}
+            return dict(record, response=agent.format_error(Exception(error.get("message", "batch request failed"))),
+                        error=True)
+        # Same tool post-processing as SkinCareAgent.run
+        tool_results, _complete = agent.run_tools(case["text"], case["skin_type"])
+        if self.structured:
+            findings = agent.structure(body["choices"][0]["message"]["content"] or "", tool_results)
+            return dict(record, response=render_markdown(findings), findings=to_dict(findings), error=False)
+        text = agent.combine(body["choices"][0]["message"]["content"], tool_results)
+        return dict(record, response=text, error=False)
+
+    def wait(self, cases: dict, write, poll_interval: float = BATCH_POLL_INTERVAL, done: set = frozenset()) -> int:
+        """Poll until every chunk has finished, writing results as chunks complete.
+
+        ``done`` is passed on to ``collect``.
+        """
+        written = self.collect(cases, write, done)
+        while self.outstanding():
+            time.sleep(poll_interval)
+            self.poll()
+            written += self.collect(cases, write, done)
+            statuses = [chunk["status"] for chunk in self.state["chunks"]]
+            print(f"Batch chunks: {statuses.count('completed')}/{len(statuses)} completed, "
+                  f"{self.outstanding()} in progress", file=sys.stderr)
+        return written
@@ -0,0 +1,178 @@
+"""Load-test the HTTP API (api.py) against the deterministic mock backend.
+
+Starts the mock OpenAI/PubMed server and the API on local ports, then sends a mix of
+single-agent, streamed and multi-agent requests from many concurrent clients. A share of the
+requests repeat a few popular questions at the same moment, to exercise request coalescing;
+the response cache is bypassed unless --use-cache is given, so coalescing is what saves calls.
+
+    python benchmarks/api_load_test.py --requests 400 --concurrency 64 --output api-load.json
+    python benchmarks/api_load_test.py --url http://127.0.0.1:8000   # an already running API
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mock_backend import MockBackend, MockConfig  # noqa: E402
+from pipeline_benchmark import summarize, git_revision, noise_image  # noqa: E402
+
+POPULAR_QUESTIONS = [
+    "I have acne on my forehead",
+    "dry patches around my eyes",
+    "how do I fade dark spots",
+]
+AGENTS = ["Dermatologist AI", "Herbal Specialist", "Home Remedy Expert", "Research Assistant"]
+SKIN_TYPES = ["oily", "combination", "normal", "dry", "sensitive"]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_api(backend_url: str) -> str:
+    """Run the API with uvicorn on a background thread, its agents pointed at the mock backend."""
+    # The core reads its settings at import time, so point it at the mock first
+    os.environ["SKINCARE_PUBMED_BASE_URL"] = backend_url
+    os.environ["SKINCARE_PUBMED_RATE"] = "1000"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    from openai import OpenAI
+    import uvicorn
+
+    import api
+    from skincare_core import build_agents
+
+    app = api.create_app(build_agents(OpenAI(base_url=f"{backend_url}/v1")))
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", backlog=4096))
+    threading.Thread(target=server.run, name="api-server", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def make_request(rng: random.Random, args, image: bytes) -> dict:
+    """One request of the mix: its endpoint, fields and optional image."""
+    duplicate = rng.random() < args.duplicate_ratio
+    text = rng.choice(POPULAR_QUESTIONS) if duplicate else f"{rng.choice(POPULAR_QUESTIONS)} (case {rng.randrange(10 ** 9)})"
+    fields = {"text": text, "skin_type": "normal" if duplicate else rng.choice(SKIN_TYPES), "use_cache": args.use_cache}
+    kind = rng.choices(["analyze", "stream", "consult"], [args.analyze_weight, args.stream_weight, args.consult_weight])[0]
+    if kind == "consult":
+        fields["agents"] = AGENTS[:2]
+    else:
+        fields["agent"] = AGENTS[0] if duplicate else rng.choice(AGENTS)
+    with_image = not duplicate and rng.random() < args.image_ratio
+    return {"kind": kind, "fields": fields, "image": image if with_image else None, "duplicate": duplicate}
+
+
+def send(session: requests.Session, url: str, request: dict, token: str) -> dict:
+    path = {"analyze": "/v1/analyze", "stream": "/v1/analyze/stream", "consult": "/v1/consult"}[request["kind"]]
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    start = time.perf_counter()
+    first = None
+    try:
+        if request["image"] is not None:
+            data = {key: ",".join(value) if isinstance(value, list) else str(value)
+                    for key, value in request["fields"].items()}
+            response = session.post(url + path, data=data, headers=headers, stream=True,
+                                    files={"image": ("skin.png", request["image"], "image/png")})
+        else:
+            response = session.post(url + path, json=request["fields"], headers=headers, stream=True)
+        for _ in response.iter_content(chunk_size=None):
+            if first is None:
+                first = time.perf_counter() - start
+        status = response.status_code
+    except requests.RequestException as e:
+        status = type(e).__name__
+    return {"kind": request["kind"], "status": status, "seconds": time.perf_counter() - start, "first_byte": first}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="load-test this running API instead of starting one on the mock")
+    parser.add_argument("--token", default=os.getenv("SKINCARE_API_TOKEN", ""), help="bearer token for --url")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.5, help="share of requests repeating a popular question")
+    parser.add_argument("--image-ratio", type=float, default=0.1, help="share of unique requests uploading a photo")
+    parser.add_argument("--analyze-weight", type=float, default=0.5)
+    parser.add_argument("--stream-weight", type=float, default=0.35)
+    parser.add_argument("--consult-weight", type=float, default=0.15)
+    parser.add_argument("--use-cache", action="store_true", help="let repeats hit the response cache as well")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="where to write the JSON results")
+    parser.add_argument("--latency", type=float, default=0.3, help="mock seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=MockConfig.tokens_per_second)
+    parser.add_argument("--completion-tokens", type=int, default=MockConfig.completion_tokens)
+    parser.add_argument("--pubmed-latency", type=float, default=MockConfig.pubmed_latency)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    image = noise_image(1280, 960, args.seed)
+    workload = [make_request(rng, args, image) for _ in range(args.requests)]
+    config = MockConfig(args.latency, args.tokens_per_second, args.completion_tokens, args.pubmed_latency, args.seed)
+
+    backend = MockBackend(config)
+    with backend:
+        url = args.url or start_api(backend.url)
+        local = threading.local()
+
+        def run(request):
+            if not hasattr(local, "session"):
+                local.session = requests.Session()
+            return send(local.session, url, request, args.token)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            outcomes = list(pool.map(run, workload))
+        elapsed = time.perf_counter() - start
+        stats = requests.get(url + "/v1/stats", headers={"Authorization": f"Bearer {args.token}"} if args.token else {}).json()
+
+    statuses = Counter(str(outcome["status"]) for outcome in outcomes)
+    results = {
+        "requests": len(outcomes),
+        "seconds": elapsed,
+        "throughput": len(outcomes) / elapsed,
+        "statuses": dict(statuses),
+        "latency": summarize([outcome["seconds"] for outcome in outcomes]),
+        "by_kind": {
+            kind: summarize([outcome["seconds"] for outcome in outcomes if outcome["kind"] == kind])
+            for kind in sorted({outcome["kind"] for outcome in outcomes})
+        },
+        "stream_first_byte": summarize([outcome["first_byte"] for outcome in outcomes
+                                        if outcome["kind"] == "stream" and outcome["first_byte"] is not None] or [0.0]),
+        "server": stats,
+    }
+    print(f"{results['requests']} requests in {elapsed:.2f}s: {results['throughput']:.1f} req/s, statuses {dict(statuses)}")
+    print(f"latency median {results['latency']['median'] * 1000:.0f} ms, p95 {results['latency']['p95'] * 1000:.0f} ms; "
+          f"stream first byte median {results['stream_first_byte']['median'] * 1000:.0f} ms")
+    print(f"upstream: {stats['coalescer']['calls']} calls, {stats['coalescer']['coalesced']} requests coalesced, "
+          f"{stats['scheduler']['sent']} model requests sent")
+
+    if args.output:
+        run_info = {
+            "meta": {"revision": git_revision(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                     "concurrency": args.concurrency, "mock": vars(config)},
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(run_info, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if any(not key.startswith("2") for key in statuses):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
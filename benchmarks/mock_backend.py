@@ -0,0 +1,302 @@
+"""Deterministic local mock of the OpenAI chat completions, files and batches endpoints and of PubMed E-utilities.
+
+Responses depend only on the request and the seed, and latency is simulated from a fixed
+time to first token plus a token rate, so benchmark runs are comparable. A batch completes the
+first time its status is retrieved, with requests for models in ``unknown_models`` going to its
+error file. Run it standalone to point the app or the batch CLI at it:
+
+    python benchmarks/mock_backend.py --port 8765 --latency 0.2 --tokens-per-second 400
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 SKINCARE_PUBMED_BASE_URL=http://127.0.0.1:8765 streamlit run main.py
+"""
+import argparse
+import email.parser
+import email.policy
+import hashlib
+import itertools
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+WORDS = ["skin", "barrier", "gentle", "cleanser", "moisturizer", "sunscreen", "niacinamide", "ceramide",
+         "hydration", "inflammation", "routine", "patch", "test", "dermatologist", "retinoid", "exfoliate"]
+STREAM_CHUNK_TOKENS = 4  # tokens per streamed delta
+# Values for schema strings that should look real, so structured replies exercise condition matching and merging
+SCHEMA_STRINGS = {
+    "conditions.name": ["acne", "dryness", "redness", "dark spots", "eczema", "oily skin"],
+    "conditions.area": ["forehead", "cheeks", "chin", "around the eyes", ""],
+    "ingredients.name": ["niacinamide", "ceramides", "salicylic acid", "azelaic acid", "zinc oxide"],
+}
+
+
+@dataclass
+class MockConfig:
+    latency: float = 0.05  # seconds before the first token
+    tokens_per_second: float = 500.0
+    completion_tokens: int = 300
+    pubmed_latency: float = 0.05
+    seed: int = 0
+    unknown_models: tuple = ()  # requests for these models fail with 404 model_not_found
+
+
+def _rng(config: MockConfig, payload) -> random.Random:
+    digest = hashlib.sha256(json.dumps([config.seed, payload], sort_keys=True, default=str).encode()).digest()
+    return random.Random(digest)
+
+
+def schema_instance(rng: random.Random, schema: dict, path: str = ""):
+    """Generate a value matching a (structured outputs) JSON schema."""
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    kind = schema.get("type")
+    if kind == "object":
+        return {key: schema_instance(rng, value, f"{path.split('.')[-1]}.{key}" if path else key)
+                for key, value in schema["properties"].items()}
+    if kind == "array":
+        return [schema_instance(rng, schema["items"], path) for _ in range(rng.randint(1, 3))]
+    if kind == "integer":
+        return rng.randint(1, 3)
+    if path in SCHEMA_STRINGS:
+        return rng.choice(SCHEMA_STRINGS[path])
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12)))
+
+
+def completion_text(config: MockConfig, body: dict) -> list:
+    """Return the completion as a list of tokens, derived from the request and the seed.
+
+    A request with a JSON schema response format gets a JSON document matching the schema,
+    split into four-character tokens.
+    """
+    rng = _rng(config, body.get("messages"))
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        document = json.dumps(schema_instance(rng, response_format["json_schema"]["schema"]))
+        return [document[start:start + 4] for start in range(0, len(document), 4)]
+    return [rng.choice(WORDS) + " " for _ in range(config.completion_tokens)]
+
+
+def prompt_tokens(body: dict) -> int:
+    # Roughly four characters per token, which is close enough for relative comparisons
+    return max(1, len(json.dumps(body.get("messages", []))) // 4)
+
+
+def model_not_found(body: dict) -> dict:
+    model = body.get("model", "")
+    return {"error": {"message": f"The model `{model}` does not exist", "type": "invalid_request_error",
+                      "code": "model_not_found"}}
+
+
+def completion(config: MockConfig, body: dict, tokens: list) -> dict:
+    """Build the non-streamed chat.completion response for ``tokens``."""
+    usage = {"prompt_tokens": prompt_tokens(body), "completion_tokens": len(tokens),
+             "total_tokens": prompt_tokens(body) + len(tokens)}
+    return {"id": "chatcmpl-mock", "created": 0, "model": body.get("model", "mock"), "object": "chat.completion",
+            "usage": usage, "choices": [{"index": 0, "finish_reason": "stop",
+                                         "message": {"role": "assistant", "content": "".join(tokens)}}]}
+
+
+def parse_multipart(content_type: str, data: bytes) -> dict:
+    """Return the form fields of a multipart/form-data body as name -> (filename, bytes)."""
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + data
+    )
+    return {part.get_param("name", header="content-disposition"): (part.get_filename(), part.get_payload(decode=True))
+            for part in message.iter_parts()}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    config = MockConfig()
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, delayed ACKs add ~40 ms per response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if path.endswith("/files"):
+            self._create_file(data)
+            return
+        if path.endswith("/batches"):
+            self._create_batch(json.loads(data))
+            return
+        if not path.endswith("/chat/completions"):
+            self._send_json({"error": {"message": "not found"}}, 404)
+            return
+        body = json.loads(data or b"{}")
+        if body.get("model") in self.config.unknown_models:
+            self._send_json(model_not_found(body), 404)
+            return
+        tokens = completion_text(self.config, body)
+        response = completion(self.config, body, tokens)
+        usage = response["usage"]
+        base = {"id": "chatcmpl-mock", "created": 0, "model": body.get("model", "mock")}
+        time.sleep(self.config.latency)
+
+        if not body.get("stream"):
+            time.sleep(len(tokens) / self.config.tokens_per_second)
+            self._send_json(response)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for start in range(0, len(tokens), STREAM_CHUNK_TOKENS):
+            piece = tokens[start:start + STREAM_CHUNK_TOKENS]
+            time.sleep(len(piece) / self.config.tokens_per_second)
+            self._send_event(dict(base, object="chat.completion.chunk", choices=[
+                {"index": 0, "finish_reason": None, "delta": {"content": "".join(piece)}}
+            ]))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self._send_event(dict(base, object="chat.completion.chunk", choices=[], usage=usage))
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+
+    def _send_event(self, payload: dict):
+        self._send_chunk(f"data: {json.dumps(payload)}\n\n".encode())
+
+    def _send_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _create_file(self, data: bytes):
+        filename, content = parse_multipart(self.headers["Content-Type"], data)["file"]
+        file_id = f"file-{next(self.server.ids)}"
+        self.server.files[file_id] = content
+        self._send_json(self._file(file_id, filename))
+
+    def _file(self, file_id: str, filename: str = "") -> dict:
+        return {"id": file_id, "object": "file", "bytes": len(self.server.files[file_id]), "created_at": 0,
+                "filename": filename or file_id, "purpose": "batch", "status": "processed"}
+
+    def _create_batch(self, request: dict):
+        if request["input_file_id"] not in self.server.files:
+            self._send_json({"error": {"message": "input file not found"}}, 404)
+            return
+        batch_id = f"batch-{next(self.server.ids)}"
+        self.server.batches[batch_id] = {
+            "id": batch_id, "object": "batch", "endpoint": request["endpoint"], "input_file_id": request["input_file_id"],
+            "completion_window": request["completion_window"], "status": "validating", "created_at": 0,
+            "output_file_id": None, "error_file_id": None, "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        }
+        self._send_json(self.server.batches[batch_id])
+
+    def _run_batch(self, batch: dict):
+        """Answer every request in the batch's input file, splitting them into output and error files."""
+        outputs, errors = [], []
+        for line in self.server.files[batch["input_file_id"]].decode("utf-8").splitlines():
+            request = json.loads(line)
+            body = request["body"]
+            result = {"id": f"batch_req-{next(self.server.ids)}", "custom_id": request["custom_id"], "error": None}
+            if body.get("model") in self.config.unknown_models:
+                errors.append(dict(result, response={"status_code": 404, "body": model_not_found(body)}))
+            else:
+                tokens = completion_text(self.config, body)
+                outputs.append(dict(result, response={"status_code": 200, "body": completion(self.config, body, tokens)}))
+        for results, field in ((outputs, "output_file_id"), (errors, "error_file_id")):
+            if results:
+                file_id = f"file-{next(self.server.ids)}"
+                self.server.files[file_id] = "".join(json.dumps(result) + "\n" for result in results).encode("utf-8")
+                batch[field] = file_id
+        batch["request_counts"] = {"total": len(outputs) + len(errors), "completed": len(outputs), "failed": len(errors)}
+        batch["status"] = "completed"
+
+    def _get_openai(self, path: str):
+        parts = path.strip("/").split("/")
+        if parts[-1] == "content" and parts[-3] == "files" and parts[-2] in self.server.files:
+            content = self.server.files[parts[-2]]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        elif parts[-2] == "files" and parts[-1] in self.server.files:
+            self._send_json(self._file(parts[-1]))
+        elif parts[-2] == "batches" and parts[-1] in self.server.batches:
+            batch = self.server.batches[parts[-1]]
+            with self.server.lock:
+                if batch["status"] == "validating":
+                    self._run_batch(batch)
+            self._send_json(batch)
+        else:
+            self._send_json({"error": {"message": "not found"}}, 404)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if "/files" in url.path or "/batches" in url.path:
+            self._get_openai(url.path)
+            return
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        time.sleep(self.config.pubmed_latency)
+        if url.path.endswith("esearch.fcgi"):
+            rng = _rng(self.config, params.get("term"))
+            ids = [str(rng.randrange(10_000_000, 40_000_000)) for _ in range(int(params.get("retmax", 5)))]
+            self._send_json({"esearchresult": {"count": str(rng.randrange(50, 5000)), "idlist": ids}})
+        elif url.path.endswith("esummary.fcgi"):
+            result = {}
+            for paper_id in params.get("id", "").split(","):
+                rng = _rng(self.config, paper_id)
+                result[paper_id] = {"title": " ".join(rng.choice(WORDS) for _ in range(12)).capitalize()}
+            self._send_json({"result": result})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+
+class MockBackend:
+    """Run the mock server on a background thread: ``with MockBackend(config) as backend: ...``."""
+
+    def __init__(self, config: MockConfig = None, port: int = 0):
+        handler = type("ConfiguredMockHandler", (MockHandler,), {"config": config or MockConfig()})
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.server.daemon_threads = True
+        # Uploaded files and batches, by id
+        self.server.files = {}
+        self.server.batches = {}
+        self.server.ids = itertools.count(1)
+        self.server.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.server.serve_forever, name="mock-backend", daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=MockConfig.latency, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=MockConfig.tokens_per_second)
+    parser.add_argument("--completion-tokens", type=int, default=MockConfig.completion_tokens)
+    parser.add_argument("--pubmed-latency", type=float, default=MockConfig.pubmed_latency)
+    parser.add_argument("--seed", type=int, default=MockConfig.seed)
+    args = parser.parse_args()
+    config = MockConfig(args.latency, args.tokens_per_second, args.completion_tokens, args.pubmed_latency, args.seed)
+    with MockBackend(config, args.port) as backend:
+        print(f"Mock backend on {backend.url} (OpenAI base URL {backend.url}/v1)")
+        backend.thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""Benchmark the agent pipeline end to end against a deterministic mock backend.
+
+Covers single-agent latency (blocking and streamed), multi-agent fan-out, image encoding at
+several sizes, remedy and PubMed tool lookups, PDF text sanitizing and PDF rendering of long
+reports. Results are written as JSON; pass --compare to check a run against an earlier one.
+
+    python benchmarks/pipeline_benchmark.py --output bench.json
+    python benchmarks/pipeline_benchmark.py --output new.json --compare bench.json --threshold 0.1
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mock_backend import MockBackend, MockConfig  # noqa: E402
+
+IMAGE_SIZES = [(640, 480), (1920, 1080), (4032, 3024)]
+REPORT_PARAGRAPHS = [20, 200]
+TOOL_QUERIES = [
+    "I have acne on my forehead and dark spots on my cheeks",
+    "dry patches around my eyes, some redness and itchy patches",
+    "worried about a changing mole and sunburn after the beach",
+    "oily skin with blackheads, stress and lack of sleep lately",
+]
+
+
+def summarize(samples: list) -> dict:
+    samples = sorted(samples)
+    return {
+        "rounds": len(samples),
+        "min": samples[0],
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    }
+
+
+def measure(function, rounds: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        function()
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def noise_image(width: int, height: int, seed: int = 0) -> bytes:
+    """A deterministic photo-like PNG: smooth gradient plus seeded noise, so encoders cannot shortcut it."""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    gradient = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    noise = Image.frombytes("RGB", (width, height), rng.randbytes(width * height * 3))
+    buffer = io.BytesIO()
+    Image.blend(gradient, noise, 0.3).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def long_report(paragraphs: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = ["hydrate", "“barrier”", "sunscreen", "—", "ceramide", "niacinamide", "🌿", "retinoid", "…", "gentle"]
+    return "\n\n".join(" ".join(rng.choice(words) for _ in range(80)) for _ in range(paragraphs))
+
+
+def build_benchmarks(backend_url: str, rounds: int) -> dict:
+    """Return name -> zero-argument callable producing a result dict."""
+    # The core reads its settings at import time, so point it at the mock first
+    os.environ["SKINCARE_PUBMED_BASE_URL"] = backend_url
+    os.environ["SKINCARE_PUBMED_RATE"] = "1000"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    # The largest noise PNG is over the default upload limits, which are not what is measured here
+    os.environ["SKINCARE_IMAGE_MAX_MB"] = "1000"
+    os.environ["SKINCARE_IMAGE_MAX_PIXELS"] = "100000000"
+    from openai import OpenAI
+
+    import skincare_core
+    from image_processing import preprocess_image
+    from remedies import match_conditions
+    from report import build_pdf_report, sanitize_text_for_pdf
+
+    agents = skincare_core.build_agents(OpenAI(base_url=f"{backend_url}/v1", max_retries=0))
+    benchmarks = {}
+
+    def single_agent(name):
+        return lambda: measure(lambda: agents[name].run("acne and dark spots on my cheeks", use_cache=False), rounds)
+
+    benchmarks["agent.dermatologist"] = single_agent("Dermatologist AI")
+    benchmarks["agent.research"] = single_agent("Research Assistant")
+
+    def streamed():
+        first_tokens = []
+
+        def run():
+            start = time.perf_counter()
+            stream = agents["Dermatologist AI"].analyze_stream("acne and dark spots", use_cache=False)
+            next(stream)
+            first_tokens.append(time.perf_counter() - start)
+            for _ in stream:
+                pass
+
+        result = measure(run, rounds)
+        result["time_to_first_token"] = summarize(first_tokens[1:] or first_tokens)
+        return result
+
+    benchmarks["agent.stream"] = streamed
+
+    def fan_out():
+        names = list(agents)
+        return measure(lambda: list(skincare_core.run_consultation(agents, names, "acne and dry skin", use_cache=False)),
+                       rounds)
+
+    benchmarks["consultation.fan_out"] = fan_out
+
+    for width, height in IMAGE_SIZES:
+        image = noise_image(width, height)
+        benchmarks[f"image.preprocess.{width}x{height}"] = lambda image=image: measure(lambda: preprocess_image(image), rounds)
+
+    def tool_lookups():
+        def run():
+            for query in TOOL_QUERIES:
+                match_conditions(query)
+                skincare_core.get_herbal_remedies(query, "oily")
+                skincare_core.get_home_remedies(query)
+                skincare_core.get_exercise_recommendations(query)
+                skincare_core.get_dermatologist_advice(query)
+        return measure(run, rounds * 10)
+
+    benchmarks["tools.remedies"] = tool_lookups
+
+    def pubmed(cold):
+        def run():
+            if cold:
+                skincare_core.pubmed_client.clear()
+            skincare_core.search_pubmed_research("acne treatment")
+        return lambda: measure(run, rounds)
+
+    benchmarks["tools.pubmed.cold"] = pubmed(True)
+    benchmarks["tools.pubmed.warm"] = pubmed(False)
+
+    for paragraphs in REPORT_PARAGRAPHS:
+        report = long_report(paragraphs)
+        benchmarks[f"pdf.sanitize.{paragraphs}p"] = lambda report=report: measure(lambda: sanitize_text_for_pdf(report), rounds * 10)
+        benchmarks[f"pdf.render.{paragraphs}p"] = lambda report=report: measure(
+            lambda: build_pdf_report("Full Consultation", "combination", "acne and dark spots", report), rounds
+        )
+    return benchmarks
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Print median changes against a baseline run and return the names that regressed."""
+    regressions = []
+    print(f"\n{'benchmark':<32} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in current["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            print(f"{name:<32} {'-':>12} {result['median'] * 1000:>10.2f}ms {'new':>8}")
+            continue
+        change = result["median"] / previous["median"] - 1 if previous["median"] else 0.0
+        flag = " REGRESSION" if change > threshold else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<32} {previous['median'] * 1000:>10.2f}ms {result['median'] * 1000:>10.2f}ms {change:>+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="benchmark-results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="median slowdown reported as a regression")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this text")
+    parser.add_argument("--latency", type=float, default=MockConfig.latency, help="mock seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=MockConfig.tokens_per_second)
+    parser.add_argument("--completion-tokens", type=int, default=MockConfig.completion_tokens)
+    parser.add_argument("--pubmed-latency", type=float, default=MockConfig.pubmed_latency)
+    args = parser.parse_args()
+
+    config = MockConfig(args.latency, args.tokens_per_second, args.completion_tokens, args.pubmed_latency)
+    results = {}
+    with MockBackend(config) as backend:
+        for name, benchmark in build_benchmarks(backend.url, args.rounds).items():
+            if args.filter not in name:
+                continue
+            results[name] = benchmark()
+            print(f"{name:<32} median {results[name]['median'] * 1000:10.2f} ms   p95 {results[name]['p95'] * 1000:10.2f} ms")
+
+    run = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "rounds": args.rounds,
+            "mock": vars(config),
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(run, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(run, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Compare the compiled remedy store against holding the remedy tables in a Python dict.
+
+Generates a synthetic dataset (conditions x categories x languages x skin types), then
+measures per-lookup latency and resident memory for each approach in a fresh process.
+
+    python benchmarks/remedy_store_benchmark.py --conditions 2000
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CATEGORIES = ["herbal", "home", "exercise", "dermatologist"]
+LANGUAGES = ["en", "es", "fr", "de", "hi", "ar", "ja"]
+SKIN_TYPES = ["oily", "combination", "normal", "dry", "sensitive"]
+
+
+def memory_kb() -> dict:
+    """Private (anonymous) and file-backed resident memory of this process in KiB.
+
+    File-backed pages, such as the memory-mapped store, are shared between processes.
+    """
+    usage = {"RssAnon": 0, "RssFile": 0}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key = line.split(":")[0]
+                if key in usage:
+                    usage[key] = int(line.split()[1])
+    except OSError:
+        import resource
+        usage["RssAnon"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage
+
+
+def generate_dataset(path: str, conditions: int):
+    rng = random.Random(42)
+    words = ["aloe", "honey", "turmeric", "neem", "oat", "green tea", "rose water", "clay", "shea", "jojoba"]
+    data = {"version": 1, "conditions": []}
+    for i in range(conditions):
+        data["conditions"].append({
+            "id": f"condition_{i}",
+            "terms": {lang: [f"condition {i} {lang}", f"synonym {i} {lang}"] for lang in LANGUAGES},
+            "advice": {
+                category: {
+                    lang: {skin_type: ", ".join(rng.choices(words, k=12)) for skin_type in SKIN_TYPES}
+                    for lang in LANGUAGES
+                }
+                for category in CATEGORIES
+            }
+        })
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def lookup_keys(conditions: int, count: int) -> list:
+    rng = random.Random(7)
+    return [(f"condition_{rng.randrange(conditions)}", rng.choice(CATEGORIES), rng.choice(SKIN_TYPES), rng.choice(LANGUAGES))
+            for _ in range(count)]
+
+
+def run_worker(mode: str, source: str, db_path: str, conditions: int, lookups: int):
+    baseline = memory_kb()
+    keys = lookup_keys(conditions, lookups)
+    if mode == "dict":
+        # Equivalent of keeping the tables as dict literals in every worker
+        with open(source, encoding="utf-8") as f:
+            data = json.load(f)
+        table = {condition["id"]: condition["advice"] for condition in data["conditions"]}
+        del data
+
+        def lookup(condition, category, skin_type, lang):
+            return table[condition][category][lang][skin_type]
+    else:
+        from remedy_store import RemedyStore
+        store = RemedyStore(db_path)
+
+        def lookup(condition, category, skin_type, lang):
+            return store.advice(condition, category, skin_type, lang)
+
+    start = time.perf_counter()
+    for key in keys:
+        lookup(*key)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "mode": mode,
+        "lookup_us": elapsed / len(keys) * 1e6,
+        "private_kb": memory_kb()["RssAnon"] - baseline["RssAnon"],
+        "shared_kb": memory_kb()["RssFile"] - baseline["RssFile"],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--conditions", type=int, default=2000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--worker", choices=["dict", "store"], help=argparse.SUPPRESS)
+    parser.add_argument("--source", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.source, args.db, args.conditions, args.lookups)
+        return
+
+    from remedy_store import build_store
+
+    with tempfile.TemporaryDirectory() as workdir:
+        source = os.path.join(workdir, "remedies.json")
+        db_path = os.path.join(workdir, "remedies.db")
+        generate_dataset(source, args.conditions)
+        start = time.perf_counter()
+        build_store([source], db_path)
+        build_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        build_store([source], db_path)
+        noop_seconds = time.perf_counter() - start
+
+        print(f"Dataset: {args.conditions} conditions, {os.path.getsize(source) / 1e6:.1f} MB JSON, "
+              f"{os.path.getsize(db_path) / 1e6:.1f} MB store")
+        print(f"Store build: {build_seconds:.2f}s full, {noop_seconds * 1000:.1f}ms when unchanged")
+        for mode in ("dict", "store"):
+            output = subprocess.run(
+                [sys.executable, __file__, "--worker", mode, "--source", source, "--db", db_path,
+                 "--conditions", str(args.conditions), "--lookups", str(args.lookups)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output)
+            print(f"{mode:>6}: {result['lookup_us']:8.1f} us/lookup, {result['private_kb'] / 1024:8.1f} MB private RSS, "
+                  f"{result['shared_kb'] / 1024:8.1f} MB shared RSS")
+
+
+if __name__ == "__main__":
+    main()
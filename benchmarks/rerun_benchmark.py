@@ -0,0 +1,54 @@
+"""Measure Streamlit rerun latency for widget changes in main.py.
+
+Drives the app headlessly with Streamlit's AppTest and times full reruns triggered by the
+language selectbox and the skin-type slider. No OpenAI request is made.
+
+    python benchmarks/rerun_benchmark.py --reruns 40
+"""
+import argparse
+import os
+import statistics
+import time
+
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+LANGUAGES = ["es", "fr", "en", "de"]
+
+
+def summarize(name: str, samples: list):
+    samples = sorted(samples)
+    print(f"{name:>9}: median {statistics.median(samples) * 1000:7.1f} ms, "
+          f"p90 {samples[int(len(samples) * 0.9)] * 1000:7.1f} ms over {len(samples)} reruns")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reruns", type=int, default=40)
+    args = parser.parse_args()
+
+    # The app only checks that a key is configured; the benchmark never calls the API
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    app = AppTest.from_file(APP_PATH, default_timeout=60)
+    app.run()
+    if app.exception:
+        raise SystemExit(f"App failed to start: {app.exception}")
+
+    language_times = []
+    skin_type_times = []
+    for i in range(args.reruns):
+        start = time.perf_counter()
+        app.selectbox[0].set_value(LANGUAGES[i % len(LANGUAGES)]).run()
+        language_times.append(time.perf_counter() - start)
+
+        slider = app.select_slider[0]
+        start = time.perf_counter()
+        slider.set_value(slider.options[i % len(slider.options)]).run()
+        skin_type_times.append(time.perf_counter() - start)
+
+    summarize("language", language_times)
+    summarize("skin type", skin_type_times)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Measure peak memory of preparing one uploaded photo, as the Streamlit page and the API do.
+
+Each upload is handled in a fresh subprocess that checks, decodes, downsizes and re-encodes
+the photo for the model and makes its preview. The figure reported is how much higher that
+process's peak resident set went than a baseline subprocess that only read the same upload.
+Uploads are photo-like noise at phone and DSLR resolutions, as JPEG and PNG.
+
+    python benchmarks/upload_memory_benchmark.py --output upload-memory.json
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pipeline_benchmark import git_revision, noise_image  # noqa: E402
+
+SIZES = [(1920, 1080), (4032, 3024), (8000, 6000)]
+FORMATS = ["JPEG", "PNG"]
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS. Linux carries it over from the parent
+# into child processes, so this process never builds the uploads itself and stays small.
+MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def peak_bytes() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * MAXRSS_UNIT
+
+
+def measure(path: str, prepare: bool = True) -> dict:
+    """Run in a subprocess: read the upload at ``path``, prepare it unless this is the baseline."""
+    from image_processing import preprocess_image
+
+    # Warm up imports and codecs on a tiny image, so only the upload itself is measured
+    preprocess_image(noise_image(64, 48))
+    with open(path, "rb") as f:
+        upload = io.BytesIO(f.read())
+    start = time.perf_counter()
+    if prepare:
+        len(preprocess_image(upload).data_url)
+    return {"peak": peak_bytes(), "seconds": time.perf_counter() - start, "upload_mb": len(upload.getvalue()) / 1048576}
+
+
+def run_child(path: str, env: dict, mode: str) -> dict:
+    output = subprocess.run([sys.executable, __file__, mode, path], env=env, capture_output=True, text=True,
+                            check=True).stdout
+    return json.loads(output)
+
+
+def upload_path(directory: str, width: int, height: int, image_format: str) -> str:
+    return os.path.join(directory, f"{width}x{height}.{image_format.lower()}")
+
+
+def write_uploads(directory: str):
+    """Run in a subprocess: write every test upload into ``directory``."""
+    from PIL import Image
+
+    for width, height in SIZES:
+        with Image.open(io.BytesIO(noise_image(width, height))) as image:
+            for image_format in FORMATS:
+                image.save(upload_path(directory, width, height, image_format), format=image_format, quality=92)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", help="where to write the JSON results")
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    parser.add_argument("--baseline", help=argparse.SUPPRESS)
+    parser.add_argument("--write", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.write:
+        write_uploads(args.write)
+        return
+    if args.measure or args.baseline:
+        print(json.dumps(measure(args.measure or args.baseline, prepare=bool(args.measure))))
+        return
+
+    # The largest noise PNGs are over the default upload limits, which are not what is measured here
+    env = dict(os.environ, SKINCARE_IMAGE_MAX_MB="1000", SKINCARE_IMAGE_MAX_PIXELS="100000000")
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        subprocess.run([sys.executable, __file__, "--write", directory], check=True)
+        for width, height in SIZES:
+            for image_format in FORMATS:
+                path = upload_path(directory, width, height, image_format)
+                baseline = run_child(path, env, "--baseline")
+                measured = run_child(path, env, "--measure")
+                name = f"{width}x{height} {image_format}"
+                results[name] = {"upload_mb": measured["upload_mb"], "seconds": measured["seconds"],
+                                 "peak_mb": max(0, measured["peak"] - baseline["peak"]) / 1048576}
+                print(f"{name:>15}: {results[name]['upload_mb']:6.1f} MB upload, peak +{results[name]['peak_mb']:6.1f} MB, "
+                      f"{results[name]['seconds'] * 1000:6.0f} ms")
+
+    if args.output:
+        run_info = {"meta": {"revision": git_revision(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")},
+                    "results": results}
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(run_info, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
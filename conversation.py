@@ -0,0 +1,138 @@
+import hashlib
+import os
+import re
+import threading
+from dataclasses import dataclass
+
+# Chat settings, overridable through the environment. Earlier turns sent with a follow-up are
+# capped at CHAT_TOKEN_BUDGET tokens, so a long conversation costs no more per turn than a short one.
+CHAT_TOKEN_BUDGET = int(os.getenv("SKINCARE_CHAT_TOKEN_BUDGET", "3000"))
+CHAT_SUMMARY_TOKENS = int(os.getenv("SKINCARE_CHAT_SUMMARY_TOKENS", "400"))  # part of the budget kept for the summary
+MESSAGE_OVERHEAD_TOKENS = 4  # role and separators the API adds around each message
+SUMMARY_SENTENCE_CHARS = 200  # each dropped turn is summarised by its first sentence, cut to this length
+
+
+_tokenizer = {}  # "loader" thread once started; "encoding" once the vocabulary is loaded, or None if it cannot be
+_tokenizer_lock = threading.Lock()
+
+
+def _load_encoding():
+    # tiktoken downloads its vocabulary on first use, so this fails without network or a local cache
+    try:
+        import tiktoken
+        _tokenizer["encoding"] = tiktoken.get_encoding("o200k_base")
+    except Exception:
+        _tokenizer["encoding"] = None
+
+
+def start_tokenizer():
+    """Load the tokenizer in the background, once per process; call it from app or API startup.
+
+    No request then waits on the vocabulary download. Until it is ready, or when it cannot be
+    fetched, token counts are estimated from characters.
+    """
+    with _tokenizer_lock:
+        if "loader" in _tokenizer:
+            return
+        _tokenizer["loader"] = threading.Thread(target=_load_encoding, name="tiktoken-loader", daemon=True)
+        _tokenizer["loader"].start()
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with the gpt-4o tokenizer once ``start_tokenizer`` has loaded it, else estimate them."""
+    if not text:
+        return 0
+    encoding = _tokenizer.get("encoding")
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # Roughly four characters per token in English; non-Latin scripts run closer to one
+    return max(len(text) // 4, len(text.encode("utf-8")) // 6) + 1
+
+
+def first_sentence(text: str, limit: int = SUMMARY_SENTENCE_CHARS) -> str:
+    """The first sentence of ``text`` without markdown, cut to ``limit`` characters."""
+    plain = " ".join(re.sub(r"[#*_`>|]+", " ", text).split())
+    sentence = re.split(r"(?<=[.!?])\s", plain, maxsplit=1)[0]
+    return sentence if len(sentence) <= limit else sentence[:limit - 1].rstrip() + "…"
+
+
+def image_digest(image_data: str) -> str:
+    return hashlib.sha256(image_data.encode()).hexdigest() if image_data else ""
+
+
+@dataclass
+class Turn:
+    role: str
+    text: str
+    tokens: int
+
+
+class Conversation:
+    """One user's chat with one agent, kept within a token budget.
+
+    Recent turns are sent verbatim. When they outgrow the budget the oldest are folded into
+    a short extractive summary (the first sentence of each), and the oldest summary lines go
+    once that outgrows its own share. Nothing here calls the model, so trimming adds no latency.
+    """
+
+    def __init__(self, budget: int = CHAT_TOKEN_BUDGET, summary_budget: int = CHAT_SUMMARY_TOKENS):
+        self.budget = budget
+        self.summary_budget = min(summary_budget, budget)
+        self.turns = []
+        self.summary = []  # (line, tokens) pairs
+        self.image = ""  # digest of the image already sent in this conversation
+        self.image_description = None  # future resolving to a compact text description of it
+
+    def add(self, role: str, text: str):
+        self.turns.append(Turn(role, text, count_tokens(text) + MESSAGE_OVERHEAD_TOKENS))
+        self.trim()
+
+    def tokens(self) -> int:
+        return sum(turn.tokens for turn in self.turns) + sum(tokens for _, tokens in self.summary)
+
+    def trim(self):
+        """Fold the oldest turns into the summary until everything fits the budget."""
+        while self.turns and self.tokens() > self.budget:
+            turn = self.turns.pop(0)
+            prefix = "The user asked" if turn.role == "user" else "You answered"
+            line = f"{prefix}: {first_sentence(turn.text)}"
+            self.summary.append((line, count_tokens(line) + 1))
+            while self.summary and sum(tokens for _, tokens in self.summary) > self.summary_budget:
+                self.summary.pop(0)
+
+    def take_image(self, image_data: str) -> bool:
+        """Return True if ``image_data`` has to be sent, i.e. it is not the image already sent."""
+        digest = image_digest(image_data)
+        if not digest or digest == self.image:
+            return False
+        self.image = digest
+        self.image_description = None
+        return True
+
+    def context_note(self) -> str:
+        """Text for the system prompt standing in for dropped turns and the earlier image."""
+        notes = []
+        if self.summary:
+            notes.append("Earlier in this conversation:\n" + "\n".join(f"- {line}" for line, _ in self.summary))
+        if self.image:
+            description = None
+            if self.image_description is not None and self.image_description.done():
+                try:
+                    description = self.image_description.result()
+                except Exception:
+                    description = None
+            if description:
+                notes.append(f"The user shared a photo earlier. It showed: {description}")
+            else:
+                notes.append("The user shared a photo earlier; your earlier replies describe what it showed.")
+        return "\n\n".join(notes)
+
+    def messages(self) -> list:
+        """The verbatim turns as chat messages."""
+        return [{"role": turn.role, "content": turn.text} for turn in self.turns]
+
+    def reset(self):
+        self.turns = []
+        self.summary = []
+        self.image = ""
+        self.image_description = None
@@ -0,0 +1,221 @@
+import json
+from dataclasses import asdict, dataclass, field
+
+from i18n import t
+from remedies import match_conditions
+from response_cache import normalize_input
+
+# Typed agent output. With structured output the model fills in FINDINGS_SCHEMA instead of
+# writing free-form markdown, so the UI, the PDF report and the history store read fields
+# directly and several agents' findings merge locally, without another model call.
+SEVERITIES = ["unknown", "none", "mild", "moderate", "severe"]  # least to most serious
+CATEGORIES = ["routine", "ingredient", "home_remedy", "herbal", "lifestyle", "exercise", "professional"]
+PRIORITIES = [1, 2, 3]  # 1 = do this first
+CATEGORY_ICONS = {
+    "routine": "🧴", "ingredient": "🧪", "home_remedy": "🏠", "herbal": "🌿",
+    "lifestyle": "🧘", "exercise": "💪", "professional": "👨‍⚕️",
+}
+
+STRUCTURED_INSTRUCTIONS = (
+    "Return your analysis as JSON matching the schema: a short summary; each visible or described "
+    "skin condition with its severity and body area; concrete recommendations with a category and a "
+    "priority (1 = do first); active ingredients worth using and why; and red flags that need a "
+    "doctor. Use empty lists when nothing applies."
+)
+
+
+def _object(properties: dict) -> dict:
+    # Strict structured outputs need every property required and no others allowed
+    return {"type": "object", "properties": properties, "required": list(properties), "additionalProperties": False}
+
+
+FINDINGS_SCHEMA = _object({
+    "summary": {"type": "string"},
+    "conditions": {"type": "array", "items": _object({
+        "name": {"type": "string"},
+        "severity": {"type": "string", "enum": SEVERITIES},
+        "area": {"type": "string"},
+    })},
+    "recommendations": {"type": "array", "items": _object({
+        "text": {"type": "string"},
+        "category": {"type": "string", "enum": CATEGORIES},
+        "priority": {"type": "integer", "enum": PRIORITIES},
+    })},
+    "ingredients": {"type": "array", "items": _object({
+        "name": {"type": "string"},
+        "purpose": {"type": "string"},
+    })},
+    "red_flags": {"type": "array", "items": {"type": "string"}},
+})
+RESPONSE_FORMAT = {"type": "json_schema", "json_schema": {"name": "skin_findings", "strict": True, "schema": FINDINGS_SCHEMA}}
+
+
+@dataclass(slots=True)
+class Condition:
+    name: str
+    severity: str = "unknown"
+    area: str = ""
+    condition_id: str = ""  # the remedy dataset's id for ``name``, in any language, if it has one
+
+
+@dataclass(slots=True)
+class Recommendation:
+    text: str
+    category: str = "routine"
+    priority: int = 2
+    agent: str = ""
+
+
+@dataclass(slots=True)
+class Ingredient:
+    name: str
+    purpose: str = ""
+
+
+@dataclass(slots=True)
+class Findings:
+    """One agent's structured analysis, or several agents' merged."""
+    summary: str = ""
+    conditions: list = field(default_factory=list)
+    recommendations: list = field(default_factory=list)
+    ingredients: list = field(default_factory=list)
+    red_flags: list = field(default_factory=list)
+    notes: list = field(default_factory=list)  # tool results, kept apart from the model's fields
+    agents: list = field(default_factory=list)
+
+
+def _choice(value, allowed: list, default):
+    return value if value in allowed else default
+
+
+def from_dict(data: dict, agent: str = "") -> Findings:
+    """Build Findings from the model's JSON or a stored ``to_dict``, dropping malformed items."""
+    def items(key):
+        return [item for item in data.get(key) or [] if isinstance(item, dict)]
+
+    conditions = []
+    for item in items("conditions"):
+        name = str(item.get("name") or "").strip()
+        if name:
+            condition_id = item.get("condition_id") or next(iter(match_conditions(name)), "")
+            conditions.append(Condition(name, _choice(item.get("severity"), SEVERITIES, "unknown"),
+                                        str(item.get("area") or ""), condition_id))
+    return Findings(
+        summary=str(data.get("summary") or ""),
+        conditions=conditions,
+        recommendations=[
+            Recommendation(str(item["text"]), _choice(item.get("category"), CATEGORIES, "routine"),
+                           _choice(item.get("priority"), PRIORITIES, 2), item.get("agent") or agent)
+            for item in items("recommendations") if item.get("text")
+        ],
+        ingredients=[Ingredient(str(item["name"]), str(item.get("purpose") or ""))
+                     for item in items("ingredients") if item.get("name")],
+        red_flags=[str(flag) for flag in data.get("red_flags") or [] if flag],
+        notes=[str(note) for note in data.get("notes") or [] if note],
+        agents=list(data.get("agents") or ([agent] if agent else [])),
+    )
+
+
+def parse_findings(content: str, agent: str = "") -> Findings:
+    """Parse a structured-output reply; raises ValueError if it is not a JSON object."""
+    data = json.loads(content)
+    if not isinstance(data, dict):
+        raise ValueError("structured output is not a JSON object")
+    return from_dict(data, agent)
+
+
+def to_dict(findings: Findings) -> dict:
+    return asdict(findings)
+
+
+def dumps(findings: Findings) -> str:
+    return json.dumps(to_dict(findings), ensure_ascii=False, separators=(",", ":"))
+
+
+def loads(text: str) -> Findings:
+    return from_dict(json.loads(text))
+
+
+def merge_findings(results: dict, agent_names: list, label=str) -> Findings:
+    """Merge several agents' findings locally, in the order the agents were selected.
+
+    Conditions are matched by their dataset id (so "acné" and "acne" are one condition) and
+    keep the highest severity; duplicate recommendations, ingredients and red flags collapse
+    into one, and recommendations are ordered by priority. Each summary is prefixed with
+    ``label(agent name)``.
+    """
+    merged = Findings()
+    conditions = {}
+    seen_recommendations = set()
+    seen_ingredients = set()
+    seen_flags = set()
+    for name in agent_names:
+        findings = results.get(name)
+        if findings is None:
+            continue
+        merged.agents.append(name)
+        if findings.summary:
+            merged.summary += ("\n\n" if merged.summary else "") + f"{label(name)}: {findings.summary}"
+        for condition in findings.conditions:
+            key = condition.condition_id or normalize_input(condition.name)
+            current = conditions.get(key)
+            if current is None:
+                conditions[key] = Condition(condition.name, condition.severity, condition.area, condition.condition_id)
+                continue
+            if SEVERITIES.index(condition.severity) > SEVERITIES.index(current.severity):
+                current.severity = condition.severity
+            if condition.area and condition.area.lower() not in current.area.lower():
+                current.area = f"{current.area}, {condition.area}" if current.area else condition.area
+        for recommendation in findings.recommendations:
+            key = normalize_input(recommendation.text)
+            if key not in seen_recommendations:
+                seen_recommendations.add(key)
+                merged.recommendations.append(Recommendation(recommendation.text, recommendation.category,
+                                                             recommendation.priority, recommendation.agent or name))
+        for ingredient in findings.ingredients:
+            if ingredient.name.lower() not in seen_ingredients:
+                seen_ingredients.add(ingredient.name.lower())
+                merged.ingredients.append(ingredient)
+        for flag in findings.red_flags:
+            if normalize_input(flag) not in seen_flags:
+                seen_flags.add(normalize_input(flag))
+                merged.red_flags.append(flag)
+        merged.notes.extend(note for note in findings.notes if note not in merged.notes)
+    merged.conditions = list(conditions.values())
+    merged.recommendations.sort(key=lambda recommendation: recommendation.priority)
+    return merged
+
+
+def condition_line(condition: Condition) -> str:
+    """One line per condition, e.g. "Acne: Moderate (forehead)"; known conditions are translated."""
+    name = t(f"condition.{condition.condition_id}", default=condition.name) if condition.condition_id else condition.name
+    return f"{name}: {t('severity.' + condition.severity)}" + (f" ({condition.area})" if condition.area else "")
+
+
+def ingredient_line(ingredient: Ingredient) -> str:
+    return f"{ingredient.name}: {ingredient.purpose}" if ingredient.purpose else ingredient.name
+
+
+def render_markdown(findings: Findings) -> str:
+    """Markdown for the UI, in the current language; red flags come first."""
+    parts = []
+    if findings.red_flags:
+        parts.append(f"#### {t('findings.red_flags')}\n" + "\n".join(f"- ⚠️ {flag}" for flag in findings.red_flags))
+    if findings.summary:
+        parts.append(findings.summary)
+    if findings.conditions:
+        parts.append(f"#### {t('findings.conditions')}\n" + "\n".join(
+            f"- {condition_line(condition)}" for condition in findings.conditions
+        ))
+    if findings.recommendations:
+        parts.append(f"#### {t('findings.recommendations')}\n" + "\n".join(
+            f"{number}. {CATEGORY_ICONS[recommendation.category]} {recommendation.text}"
+            for number, recommendation in enumerate(findings.recommendations, 1)
+        ))
+    if findings.ingredients:
+        parts.append(f"#### {t('findings.ingredients')}\n" + "\n".join(
+            f"- {ingredient_line(ingredient)}" for ingredient in findings.ingredients
+        ))
+    if findings.notes:
+        parts.append("\n\n".join(findings.notes))
+    return "\n\n".join(parts)
@@ -0,0 +1,237 @@
+import atexit
+import contextlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+# History settings, overridable through the environment. History is opt-in: with no database
+# path nothing is recorded and consultations live only in the browser session.
+HISTORY_DB_PATH = os.getenv("SKINCARE_HISTORY_DB", "")
+HISTORY_MAX_ROWS = int(os.getenv("SKINCARE_HISTORY_MAX_ROWS", "100000"))  # oldest rows are compacted away beyond this
+HISTORY_BATCH_SIZE = 100  # rows written per transaction at most
+HISTORY_FLUSH_INTERVAL = 0.5  # seconds the writer waits to fill a batch
+HISTORY_QUEUE_SIZE = 10000  # pending writes; beyond this new entries are dropped, not waited for
+HISTORY_FLUSH_TIMEOUT = 10  # seconds flush, and so interpreter exit, waits for pending writes at most
+HISTORY_PAGE_SIZE = 20
+COMPACT_EVERY = 1000  # rows written between compactions
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS consultations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    agent TEXT NOT NULL,
+    skin_type TEXT NOT NULL,
+    question TEXT NOT NULL,
+    response TEXT NOT NULL,
+    sections TEXT,
+    findings TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS consultations_user ON consultations (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS consultations_session ON consultations (session_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS consultations_agent ON consultations (agent, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS consultations_created ON consultations (created_at);
+"""
+
+
+class HistoryStore:
+    """Consultation history in SQLite, written off the request path.
+
+    ``record`` only puts the entry on a queue; one writer thread drains it in batched
+    transactions, so Streamlit sessions never wait on each other for the write lock. In WAL
+    mode readers are not blocked by that writer, and the paginated reads walk the
+    (user, time) index with a keyset cursor rather than an OFFSET.
+    """
+
+    def __init__(self, db_path: str = HISTORY_DB_PATH, max_rows: int = HISTORY_MAX_ROWS,
+                 batch_size: int = HISTORY_BATCH_SIZE, flush_interval: float = HISTORY_FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.max_rows = max_rows
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.compactions = 0
+        self._queue = queue.Queue(maxsize=HISTORY_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._writer = None
+        if self.db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            with self._connect() as conn:
+                # Must be set before the first table exists to take effect
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.executescript(SCHEMA)
+                # Databases created before structured findings lack the column
+                if "findings" not in {column[1] for column in conn.execute("PRAGMA table_info(consultations)")}:
+                    conn.execute("ALTER TABLE consultations ADD COLUMN findings TEXT")
+            self._writer = threading.Thread(target=self._write_loop, name="skincare-history", daemon=True)
+            self._writer.start()
+            atexit.register(self.flush)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.db_path)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """Open a connection for one transaction, and close it afterwards."""
+        # A short-lived connection per read is safe across threads; the writer keeps its own
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, user_id: str, session_id: str, agent: str, skin_type: str, question: str, response: str,
+               sections: list = None, findings: dict = None) -> bool:
+        """Queue one consultation for writing; returns False if it was dropped.
+
+        ``findings`` is a structured analysis as a dict (``findings.to_dict``), kept alongside
+        its markdown ``response``.
+        """
+        if not self.enabled:
+            return False
+        row = (user_id, session_id, agent, skin_type, question or "", response or "",
+               json.dumps(sections, ensure_ascii=False) if sections else None,
+               json.dumps(findings, ensure_ascii=False) if findings else None, time.time())
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        return True
+
+    def _write_loop(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode NORMAL only risks the latest batches on power loss, never corruption
+        conn.execute("PRAGMA synchronous=NORMAL")
+        since_compaction = 0
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO consultations (user_id, session_id, agent, skin_type, question, response, sections, "
+                        "findings, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", batch
+                    )
+            except Exception:
+                with self._lock:
+                    self.dropped += len(batch)  # history is best effort
+            else:
+                with self._lock:
+                    self.written += len(batch)
+                    self.batches += 1
+                since_compaction += len(batch)
+                # Checked every few batches, so the table overshoots the cap by at most that much
+                if self.max_rows and since_compaction >= COMPACT_EVERY:
+                    since_compaction = 0
+                    try:
+                        self._compact(conn)
+                    except sqlite3.Error:
+                        pass  # the batch is already committed; the next compaction catches up
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _compact(self, conn: sqlite3.Connection):
+        """Delete the oldest rows beyond ``max_rows`` and hand their pages back to the file system."""
+        with conn:
+            conn.execute(
+                "DELETE FROM consultations WHERE id <= "
+                "(SELECT id FROM consultations ORDER BY id DESC LIMIT 1 OFFSET ?)", (self.max_rows,)
+            )
+        conn.execute("PRAGMA incremental_vacuum")
+        with self._lock:
+            self.compactions += 1
+
+    def flush(self, timeout: float = HISTORY_FLUSH_TIMEOUT) -> bool:
+        """Wait until every queued entry has been written; returns False if some were not.
+
+        Gives up after ``timeout`` seconds, or as soon as the writer thread has died, so an
+        exit never hangs on history.
+        """
+        if not self.enabled:
+            return True
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._writer.is_alive():
+                    return False
+                # Woken when the writer finishes a batch; the short wait notices a dead writer
+                self._queue.all_tasks_done.wait(min(remaining, 0.1))
+        return True
+
+    def page(self, user_id: str, before: tuple = None, limit: int = HISTORY_PAGE_SIZE, agent: str = None) -> tuple:
+        """Return (entries, cursor) for one page of a user's history, newest first.
+
+        Pass the returned cursor as ``before`` for the next page; it is None on the last page.
+        """
+        if not self.enabled:
+            return [], None
+        query = "SELECT * FROM consultations WHERE user_id = ?"
+        params = [user_id]
+        if agent:
+            query += " AND agent = ?"
+            params.append(agent)
+        if before:
+            query += " AND (created_at, id) < (?, ?)"
+            params.extend(before)
+        query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(query, params).fetchall()
+        except sqlite3.Error:
+            return [], None
+        entries = [self._entry(row) for row in rows[:limit]]
+        cursor = (entries[-1]["created_at"], entries[-1]["id"]) if len(rows) > limit else None
+        return entries, cursor
+
+    def get(self, entry_id: int):
+        """Return one entry by id, or None."""
+        if not self.enabled:
+            return None
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM consultations WHERE id = ?", (entry_id,)).fetchone()
+        return self._entry(row) if row else None
+
+    def count(self, user_id: str) -> int:
+        if not self.enabled:
+            return 0
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM consultations WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    @staticmethod
+    def _entry(row: sqlite3.Row) -> dict:
+        entry = dict(row)
+        entry["sections"] = json.loads(entry["sections"]) if entry["sections"] else None
+        entry["findings"] = json.loads(entry["findings"]) if entry["findings"] else None
+        return entry
+
+    def stats(self) -> dict:
+        """Return write counters and the number of entries still queued."""
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "written": self.written,
+                "dropped": self.dropped,
+                "batches": self.batches,
+                "compactions": self.compactions,
+            }
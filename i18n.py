@@ -0,0 +1,190 @@
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import string
+
+# Translation catalogues. Each language has a source catalogue, locales/<lang>.json, mapping
+# message keys to text with str.format placeholders. It is compiled into locales/build/<lang>.json
+# with its fallback chain already applied, so a language is one file read the first time it is
+# selected and a dict lookup afterwards. Compiled files are rebuilt when a source is newer.
+LOCALE_DIR = os.getenv("SKINCARE_LOCALE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "locales"))
+BUILD_DIR = os.path.join(LOCALE_DIR, "build")
+
+DEFAULT_LANGUAGE = "en"
+
+# Languages offered in the UI, by their own names
+LANGUAGES = {
+    "en": "English",
+    "es": "Español",
+    "fr": "Français",
+    "de": "Deutsch",
+    "hi": "हिन्दी",
+    "ar": "العربية",
+    "ja": "日本語"
+}
+
+# The language of the current request. Tool functions run in a copy of the caller's context,
+# so they format their output in the language the request was made in.
+_current_language = contextvars.ContextVar("skincare_language", default=DEFAULT_LANGUAGE)
+
+
+def current_language() -> str:
+    return _current_language.get()
+
+
+@contextlib.contextmanager
+def use_language(lang: str):
+    """Make ``lang`` the language of everything run inside the block."""
+    token = _current_language.set(lang or DEFAULT_LANGUAGE)
+    try:
+        yield
+    finally:
+        _current_language.reset(token)
+
+
+def fallback_chain(lang: str) -> list:
+    """Languages consulted for a key, most specific first: "pt-BR" -> ["pt-BR", "pt", "en"]."""
+    chain = [lang]
+    base = lang.replace("_", "-").split("-")[0]
+    if base != lang:
+        chain.append(base)
+    if DEFAULT_LANGUAGE not in chain:
+        chain.append(DEFAULT_LANGUAGE)
+    return chain
+
+
+def source_path(lang: str) -> str:
+    return os.path.join(LOCALE_DIR, f"{lang}.json")
+
+
+def compiled_path(lang: str) -> str:
+    return os.path.join(BUILD_DIR, f"{lang}.json")
+
+
+def read_catalog(path: str) -> dict:
+    """Read one source catalogue; a missing file is an empty catalogue."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def compile_catalog(lang: str) -> dict:
+    """Merge ``lang``'s fallback chain into one flat catalogue and write it to the build directory."""
+    messages = {}
+    for fallback in reversed(fallback_chain(lang)):
+        messages.update(read_catalog(source_path(fallback)))
+    try:
+        os.makedirs(BUILD_DIR, exist_ok=True)
+        temporary = f"{compiled_path(lang)}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(messages, f, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+        os.replace(temporary, compiled_path(lang))
+    except OSError:
+        pass  # a read-only deployment still serves the merged catalogue from memory
+    return messages
+
+
+def _is_stale(lang: str) -> bool:
+    try:
+        built = os.stat(compiled_path(lang)).st_mtime
+    except FileNotFoundError:
+        return True
+    for fallback in fallback_chain(lang):
+        try:
+            if os.stat(source_path(fallback)).st_mtime > built:
+                return True
+        except FileNotFoundError:
+            continue
+    return False
+
+
+@functools.lru_cache(maxsize=None)
+def catalog(lang: str) -> dict:
+    """Return the compiled catalogue for ``lang``, loading (and if needed compiling) it once."""
+    if _is_stale(lang):
+        return compile_catalog(lang)
+    with open(compiled_path(lang), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def t(key: str, lang: str = None, default: str = None, **params) -> str:
+    """Translate ``key`` into ``lang`` (default: the current language) and fill in ``params``.
+
+    Keys missing from the whole fallback chain return ``default``, or the key itself.
+    """
+    text = catalog(lang or current_language()).get(key)
+    if text is None:
+        text = key if default is None else default
+    return text.format(**params) if params else text
+
+
+def placeholders(text: str) -> set:
+    return {field for _, field, _, _ in string.Formatter().parse(text) if field is not None}
+
+
+def check_catalogs(languages: list = None) -> dict:
+    """Compare every language's source catalogue with English.
+
+    Returns, per language, the keys it lacks (served from its fallbacks), keys English does
+    not have, and keys whose placeholders differ from English.
+    """
+    reference = read_catalog(source_path(DEFAULT_LANGUAGE))
+    report = {}
+    for lang in languages or LANGUAGES:
+        messages = read_catalog(source_path(lang))
+        report[lang] = {
+            "missing": sorted(set(reference) - set(messages)),
+            "extra": sorted(set(messages) - set(reference)),
+            "placeholders": sorted(
+                key for key in set(reference) & set(messages) if placeholders(reference[key]) != placeholders(messages[key])
+            ),
+        }
+    return report
+
+
+def missing_remedy_translations(languages: list = None) -> dict:
+    """Return, per language, the remedy texts (condition/category/skin type) only available in English."""
+    from remedy_store import REMEDY_SOURCES, read_source
+
+    texts = {}
+    for path in REMEDY_SOURCES:
+        for row in read_source(path):
+            if row["category"] != "term":
+                texts.setdefault((row["condition"], row["category"], row["skin_type"]), set()).add(row["lang"])
+    return {
+        lang: sorted("/".join(entry) for entry, langs in texts.items() if DEFAULT_LANGUAGE in langs and lang not in langs)
+        for lang in languages or LANGUAGES
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compile the translation catalogues and report missing translations.")
+    parser.add_argument("languages", nargs="*", help="languages to build (default: all in LANGUAGES)")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 if anything is missing")
+    args = parser.parse_args()
+
+    languages = args.languages or list(LANGUAGES)
+    report = check_catalogs(languages)
+    remedies = missing_remedy_translations(languages)
+    incomplete = False
+    for lang in languages:
+        messages = compile_catalog(lang)
+        problems = report[lang]
+        print(f"{lang}: {len(messages)} messages -> {compiled_path(lang)}")
+        for kind, keys in (("missing", problems["missing"]), ("not in English", problems["extra"]),
+                           ("placeholder mismatch", problems["placeholders"]), ("remedy text missing", remedies[lang])):
+            if keys:
+                incomplete = True
+                print(f"  {kind} ({len(keys)}): {', '.join(keys)}")
+    if args.check and incomplete:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
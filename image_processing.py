@@ -0,0 +1,216 @@
+import base64
+import io
+import math
+import os
+from dataclasses import dataclass
+
+from PIL import ExifTags, Image, ImageOps
+
+import telemetry
+
+# Encoding settings, overridable through the environment
+IMAGE_FORMAT = os.getenv("SKINCARE_IMAGE_FORMAT", "JPEG").upper()  # JPEG or WEBP
+IMAGE_QUALITY = int(os.getenv("SKINCARE_IMAGE_QUALITY", "85"))
+IMAGE_DETAIL = os.getenv("SKINCARE_IMAGE_DETAIL", "auto")  # auto, low or high
+
+# Upload limits. Both are checked from the file header before any pixels are decoded, so an
+# oversized file or a decompression bomb (a small file that expands to gigapixels) is turned
+# away without the memory spike.
+IMAGE_MAX_BYTES = int(float(os.getenv("SKINCARE_IMAGE_MAX_MB", "20")) * 1024 * 1024)
+IMAGE_MAX_PIXELS = int(os.getenv("SKINCARE_IMAGE_MAX_PIXELS", "50000000"))
+ACCEPTED_FORMATS = ["JPEG", "PNG", "WEBP"]  # JPEG includes the multi-picture (MPO) files some phone cameras write
+
+# On-screen preview, made from the same decode as the model's copy
+PREVIEW_SIZE = 480  # longest side, in pixels
+PREVIEW_QUALITY = 80
+
+# Geometry the OpenAI vision models use for "high" detail: the image is fit inside
+# 2048x2048, its shortest side is scaled down to 768, and it is billed per 512px tile
+MAX_SIDE = 2048
+SHORT_SIDE = 768
+TILE_SIZE = 512
+BASE_TOKENS = 85
+TOKENS_PER_TILE = 170
+# Shrink a little further when a side only just spills over into another row/column of tiles
+TILE_SNAP_TOLERANCE = 0.1
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+# EXIF orientations that turn the picture by 90 degrees, swapping its width and height
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+class ImageRejected(ValueError):
+    """An upload that is not accepted.
+
+    ``reason`` is "too_large", "too_many_pixels", "format" or "unreadable", and ``limit`` the
+    limit that was exceeded, if any, for building a translated message.
+    """
+
+    def __init__(self, reason: str, message: str, limit: int = None):
+        super().__init__(message)
+        self.reason = reason
+        self.limit = limit
+
+
+@dataclass
+class PreparedImage:
+    """An upload that has been normalized and re-encoded for a vision request."""
+    data: bytes
+    mime_type: str
+    detail: str
+    width: int
+    height: int
+    original_bytes: int
+    original_tokens: int
+    tokens: int
+    preview: bytes = b""  # small JPEG for showing the upload on screen
+
+    @property
+    def base64_data(self) -> str:
+        return base64.b64encode(self.data).decode()
+
+    @property
+    def data_url(self) -> str:
+        return f"data:{self.mime_type};base64,{self.base64_data}"
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - len(self.data)
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.original_tokens - self.tokens
+
+
+def high_detail_size(width: int, height: int) -> tuple:
+    """Return the size the model rescales an image to for "high" detail."""
+    scale = min(1.0, MAX_SIDE / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, SHORT_SIDE / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def estimate_vision_tokens(width: int, height: int, detail: str = "high") -> int:
+    """Estimate the vision tokens billed for an image of the given size."""
+    if detail == "low":
+        return BASE_TOKENS
+    width, height = high_detail_size(width, height)
+    tiles = math.ceil(width / TILE_SIZE) * math.ceil(height / TILE_SIZE)
+    return BASE_TOKENS + TOKENS_PER_TILE * tiles
+
+
+def target_size(width: int, height: int, detail: str) -> tuple:
+    """Pick the output size: no larger than the model will look at, snapped to the tile grid."""
+    if detail == "low":
+        scale = min(1.0, TILE_SIZE / max(width, height))
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    new_width, new_height = high_detail_size(width, height)
+    scale = 1.0
+    for side in (new_width, new_height):
+        overflow = side % TILE_SIZE
+        if side > TILE_SIZE and 0 < overflow <= TILE_SIZE * TILE_SNAP_TOLERANCE:
+            scale = min(scale, (side - overflow) / side)
+    return max(1, int(new_width * scale)), max(1, int(new_height * scale))
+
+
+def choose_detail(width: int, height: int) -> str:
+    """Use "low" detail for images that already fit in a single tile."""
+    if IMAGE_DETAIL in ("low", "high"):
+        return IMAGE_DETAIL
+    return "low" if max(width, height) <= TILE_SIZE else "high"
+
+
+def upload_size(source) -> int:
+    """Size in bytes of an upload given as bytes or a seekable binary file."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source)
+    size = source.seek(0, io.SEEK_END)
+    source.seek(0)
+    return size
+
+
+def open_upload(source, max_bytes: int = IMAGE_MAX_BYTES, max_pixels: int = IMAGE_MAX_PIXELS) -> Image.Image:
+    """Open an upload after checking its size, format and dimensions; no pixels are decoded yet.
+
+    ``source`` is the uploaded bytes or a binary file (a Streamlit or Starlette upload), which
+    is read in place rather than copied. Raises ImageRejected.
+    """
+    size = upload_size(source)
+    if size > max_bytes:
+        raise ImageRejected("too_large", f"image is {size / 1048576:.1f} MB, over the {max_bytes / 1048576:.0f} MB limit",
+                            max_bytes // 1048576)
+    stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source
+    stream.seek(0)
+    too_many_pixels = ImageRejected("too_many_pixels", f"image has more than {max_pixels:,} pixels", max_pixels // 1000000)
+    try:
+        image = Image.open(stream, formats=ACCEPTED_FORMATS)
+    except Image.DecompressionBombError:
+        raise too_many_pixels
+    except OSError:
+        raise ImageRejected("format", "not a JPEG, PNG or WebP image")
+    if image.width * image.height > max_pixels:
+        image.close()
+        raise too_many_pixels
+    return image
+
+
+def preprocess_image(source, image_format: str = IMAGE_FORMAT, quality: int = IMAGE_QUALITY) -> PreparedImage:
+    """Check, orient, strip, resize and re-encode an uploaded image for the vision model.
+
+    The upload is decoded once, straight to roughly the size the model needs where the format
+    allows it (JPEG decodes at 1/2, 1/4 or 1/8 scale), and both the model's copy and the
+    on-screen preview are made from that decode. Raises ImageRejected for uploads over the
+    size or pixel limits, in another format, or that fail to decode.
+    """
+    original_bytes = upload_size(source)
+    with telemetry.span("image", "preprocess", original_bytes=original_bytes) as span, open_upload(source) as image:
+        original_tokens = estimate_vision_tokens(*image.size, detail="high")
+        try:
+            # Work out the upright size from the header, so the decoder can be told the target up
+            # front (PNG keeps EXIF after the pixel data, so for PNG this is the decode)
+            transposed = image.getexif().get(ExifTags.Base.Orientation, 1) in TRANSPOSED_ORIENTATIONS
+            width, height = image.size[::-1] if transposed else image.size
+            detail = choose_detail(width, height)
+            size = target_size(width, height, detail)
+            image.draft(None, size[::-1] if transposed else size)
+            image.load()
+        except (OSError, SyntaxError) as e:
+            raise ImageRejected("unreadable", f"image could not be decoded: {e}")
+        # Apply the EXIF orientation so the pixels are upright once metadata is dropped
+        ImageOps.exif_transpose(image, in_place=True)
+
+        # Palette and alpha images are resized with their alpha and flattened afterwards, at the smaller size
+        if image.mode in ("LA", "P", "PA"):
+            image = image.convert("RGBA")
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGB")
+        if size != image.size:
+            image = image.resize(size, Image.Resampling.LANCZOS)
+        if image.mode == "RGBA":
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+
+        output = io.BytesIO()
+        # Saving without exif/icc arguments writes no metadata
+        image.save(output, format=image_format, quality=quality, optimize=True)
+        preview = io.BytesIO()
+        ImageOps.contain(image, (PREVIEW_SIZE, PREVIEW_SIZE), Image.Resampling.LANCZOS).save(
+            preview, format="JPEG", quality=PREVIEW_QUALITY
+        )
+        span.set(encoded_bytes=output.tell(), detail=detail)
+
+    telemetry.record_image_bytes("original", original_bytes)
+    telemetry.record_image_bytes("encoded", output.tell())
+    return PreparedImage(
+        data=output.getvalue(),
+        mime_type=MIME_TYPES.get(image_format, "image/jpeg"),
+        detail=detail,
+        width=size[0],
+        height=size[1],
+        original_bytes=original_bytes,
+        original_tokens=original_tokens,
+        tokens=estimate_vision_tokens(*size, detail=detail),
+        preview=preview.getvalue(),
+    )
@@ -0,0 +1,258 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# PubMed client settings, overridable through the environment. Point the base URL at a local
+# stub server to exercise the client offline.
+PUBMED_BASE_URL = os.getenv("SKINCARE_PUBMED_BASE_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils")
+PUBMED_API_KEY = os.getenv("NCBI_API_KEY", "")
+# NCBI allows 3 requests/second without an API key and 10 with one
+PUBMED_RATE = float(os.getenv("SKINCARE_PUBMED_RATE", "10" if PUBMED_API_KEY else "3"))
+PUBMED_RETRIES = int(os.getenv("SKINCARE_PUBMED_RETRIES", "3"))
+PUBMED_DEADLINE = float(os.getenv("SKINCARE_PUBMED_DEADLINE", "20"))  # seconds for a whole search, retries included
+PUBMED_CACHE_TTL = int(os.getenv("SKINCARE_PUBMED_CACHE_TTL", "86400"))
+PUBMED_CACHE_MAX_ENTRIES = int(os.getenv("SKINCARE_PUBMED_CACHE_MAX_ENTRIES", "512"))
+
+SEARCH_FILTER = "dermatology OR skin OR skincare"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+
+def normalize_topic(topic: str) -> str:
+    """Normalize a search topic so trivially different queries share a cache entry."""
+    return " ".join((topic or "").lower().split())
+
+
+@dataclass
+class PubMedResult:
+    """Outcome of one dermatology search: the hit count, top PubMed IDs and their titles."""
+    topic: str
+    count: str
+    ids: list
+    titles: dict = field(default_factory=dict)
+
+
+class TokenBucket:
+    """Token-bucket rate limiter shared by every thread using one client."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class _InFlight:
+    """A lookup being fetched by one thread that other threads can wait on until ``deadline``."""
+
+    def __init__(self, deadline: float):
+        self.deadline = deadline
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class PubMedClient:
+    """PubMed E-utilities client with a pooled session, rate limiting, retries and a TTL cache.
+
+    Search results are cached per normalized topic and article summaries per PubMed ID, so a
+    popular topic costs no requests once warm. Concurrent searches for the same topic share one
+    in-flight request. A search, with its retries and the title lookup, gives up after
+    ``deadline`` seconds however many attempts are left.
+    """
+
+    def __init__(self, base_url: str = PUBMED_BASE_URL, rate: float = PUBMED_RATE, retries: int = PUBMED_RETRIES,
+                 ttl: int = PUBMED_CACHE_TTL, max_entries: int = PUBMED_CACHE_MAX_ENTRIES, api_key: str = PUBMED_API_KEY,
+                 timeout: float = 15, deadline: float = PUBMED_DEADLINE):
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.api_key = api_key
+        self.timeout = timeout
+        self.deadline = deadline
+        self.hits = 0
+        self.misses = 0
+        self.limiter = TokenBucket(rate)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=8)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._searches = OrderedDict()
+        self._summaries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _get(self, endpoint: str, params: dict, deadline: float = None) -> dict:
+        """GET one E-utilities endpoint, retrying throttled and failed requests with jittered backoff.
+
+        ``deadline`` is a ``time.monotonic()`` value; each attempt only gets the time left before
+        it, and no retry is started once waiting for it would pass the deadline.
+        """
+        params = dict(params, retmode="json")
+        if self.api_key:
+            params["api_key"] = self.api_key
+        url = f"{self.base_url}/{endpoint}"
+        deadline = deadline or time.monotonic() + self.deadline
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise requests.Timeout(f"PubMed {endpoint} gave up after its {self.deadline:.0f}s deadline")
+            response = retry_after = None
+            try:
+                response = self.session.get(url, params=params, timeout=min(self.timeout, remaining))
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    response.raise_for_status()
+                    return response.json()
+                retry_after = response.headers.get("Retry-After")
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+            # Full jitter keeps workers that were throttled together from retrying in lockstep
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            if time.monotonic() + delay >= deadline:
+                if response is not None:
+                    response.raise_for_status()
+                raise requests.Timeout(f"PubMed {endpoint} gave up after its {self.deadline:.0f}s deadline")
+            time.sleep(delay)
+
+    def _cached(self, cache: OrderedDict, key):
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.time():
+            del cache[key]
+            return None
+        cache.move_to_end(key)
+        return value
+
+    def _store(self, cache: OrderedDict, key, value):
+        cache[key] = (value, time.time() + self.ttl)
+        cache.move_to_end(key)
+        while len(cache) > self.max_entries:
+            cache.popitem(last=False)
+
+    def search(self, topic: str, max_ids: int = 5, max_titles: int = 3) -> PubMedResult:
+        """Search dermatology papers on ``topic``.
+
+        Raises ``requests.RequestException`` if the search itself fails. Titles are best
+        effort: if the summary request fails the result carries IDs only.
+        """
+        key = (normalize_topic(topic), max_ids)
+        with self._lock:
+            cached = self._cached(self._searches, key)
+            if cached is not None:
+                self.hits += 1
+            else:
+                leader = key not in self._inflight
+                if leader:
+                    self._inflight[key] = _InFlight(time.monotonic() + self.deadline)
+                pending = self._inflight[key]
+
+        if cached is not None:
+            count, ids = cached
+            return PubMedResult(topic=topic, count=count, ids=ids, titles=self.summaries(ids[:max_titles]))
+
+        if leader:
+            try:
+                count, ids = self._search(key[0], max_ids, pending.deadline)
+                pending.result = (count, ids, self.summaries(ids[:max_titles], pending.deadline))
+            except Exception as e:
+                pending.error = e
+            finally:
+                with self._lock:
+                    self.misses += 1
+                    if pending.error is None:
+                        self._store(self._searches, key, pending.result[:2])
+                    del self._inflight[key]
+                pending.done.set()
+        else:
+            # Followers give up with the leader's deadline rather than wait on a stuck request
+            if not pending.done.wait(max(0.0, pending.deadline - time.monotonic())):
+                raise requests.Timeout(f"PubMed search gave up after its {self.deadline:.0f}s deadline")
+            with self._lock:
+                self.hits += 1
+        if pending.error is not None:
+            raise pending.error
+        count, ids, titles = pending.result
+        return PubMedResult(topic=topic, count=count, ids=ids, titles=dict(titles))
+
+    def _search(self, topic: str, max_ids: int, deadline: float = None) -> tuple:
+        data = self._get("esearch.fcgi", {
+            "db": "pubmed",
+            "term": f"{topic} AND ({SEARCH_FILTER})",
+            "retmax": str(max_ids),
+            "sort": "relevance",
+        }, deadline)
+        result = data.get("esearchresult", {})
+        return result.get("count", "0"), list(result.get("idlist", []))
+
+    def summaries(self, ids: list, deadline: float = None) -> dict:
+        """Return titles for the given PubMed IDs, fetching every uncached ID in one batched request."""
+        titles = {}
+        with self._lock:
+            for paper_id in ids:
+                title = self._cached(self._summaries, paper_id)
+                if title is not None:
+                    titles[paper_id] = title
+        missing = [paper_id for paper_id in ids if paper_id not in titles]
+        if not missing:
+            return titles
+
+        try:
+            data = self._get("esummary.fcgi", {"db": "pubmed", "id": ",".join(missing)}, deadline)
+        except (requests.RequestException, ValueError):
+            return titles
+        fetched = data.get("result", {})
+        with self._lock:
+            for paper_id in missing:
+                if paper_id in fetched:
+                    title = fetched[paper_id].get("title") or "No title available"
+                    titles[paper_id] = title
+                    self._store(self._summaries, paper_id, title)
+        return titles
+
+    def clear(self):
+        """Drop every cached search and summary and reset the counters."""
+        with self._lock:
+            self._searches.clear()
+            self._summaries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Return search hit/miss counters and cache sizes."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "searches": len(self._searches),
+                "summaries": len(self._summaries),
+            }
@@ -0,0 +1,123 @@
+import re
+import sqlite3
+from collections import deque
+
+from remedy_store import RemedyStore, build_store, DEFAULT_LANGUAGE
+
+# Japanese and Chinese are written without spaces, so a term in those scripts is a word
+# wherever it occurs
+UNSPACED_SCRIPT = re.compile("[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uff66-\uff9f]")
+
+
+def _joins(left: str, right: str) -> bool:
+    """True if two adjacent characters belong to the same word."""
+    return left.isalnum() and right.isalnum() and not (UNSPACED_SCRIPT.match(left) or UNSPACED_SCRIPT.match(right))
+
+
+class KeywordIndex:
+    """Aho-Corasick automaton over condition terms.
+
+    Finds every term occurrence in a single pass over the text, so lookup cost depends on
+    the length of the text and not on how many terms the index holds.
+    """
+
+    def __init__(self, terms: dict):
+        # terms maps a lowercase term to the condition it identifies
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for term, condition in terms.items():
+            self._add(term.lower(), condition)
+        self._build_failure_links()
+
+    def _add(self, term: str, condition: str):
+        state = 0
+        for char in term:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((len(term), condition))
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find(self, text: str) -> list:
+        """Return (start, end, condition) for every whole-word term occurrence in ``text``."""
+        text = text.lower()
+        matches = []
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, condition in self._output[state]:
+                start, end = position - length + 1, position + 1
+                # Only accept whole words, so "mole" does not match inside "molecule"
+                if (start == 0 or not _joins(text[start - 1], text[start])) and (end == len(text) or not _joins(text[end - 1], text[end])):
+                    matches.append((start, end, condition))
+        return matches
+
+
+def _open_store() -> RemedyStore:
+    try:
+        build_store()
+    except (OSError, sqlite3.Error):
+        # A read-only deployment can still serve a store that was compiled ahead of time
+        pass
+    return RemedyStore()
+
+
+def _build_index(store: RemedyStore) -> KeywordIndex:
+    terms = {condition.replace("_", " "): condition for condition in store.priorities()}
+    terms.update(store.terms())
+    return KeywordIndex(terms)
+
+
+# The remedy data lives in the compiled store (see remedy_store.py); only the term index
+# and condition priorities are held in memory. Both are built once at import time.
+REMEDY_STORE = _open_store()
+CONDITION_INDEX = _build_index(REMEDY_STORE)
+CONDITION_PRIORITY = REMEDY_STORE.priorities()
+
+
+def match_conditions(text: str) -> list:
+    """Return every condition mentioned in ``text``, most relevant first.
+
+    Conditions are ranked by priority, then by how often they are mentioned, then by
+    where they are first mentioned.
+    """
+    if not text:
+        return []
+    counts = {}
+    first_seen = {}
+    for start, _end, condition in CONDITION_INDEX.find(text):
+        counts[condition] = counts.get(condition, 0) + 1
+        first_seen.setdefault(condition, start)
+    return sorted(
+        counts,
+        key=lambda condition: (-CONDITION_PRIORITY.get(condition, 0), -counts[condition], first_seen[condition])
+    )
+
+
+def lookup_remedies(category: str, text: str, skin_type: str = None, lang: str = DEFAULT_LANGUAGE) -> list:
+    """Return (condition, advice) pairs from one category for every condition in ``text``."""
+    results = []
+    for condition in match_conditions(text):
+        advice = REMEDY_STORE.advice(condition, category, skin_type, lang)
+        if advice is not None:
+            results.append((condition, advice))
+    return results
@@ -0,0 +1,248 @@
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+# Location of the source dataset(s) and the compiled store, overridable through the environment
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+REMEDY_SOURCES = [
+    path for path in os.getenv("SKINCARE_REMEDY_SOURCES", os.path.join(DATA_DIR, "remedies.json")).split(os.pathsep) if path
+]
+REMEDY_DB_PATH = os.getenv("SKINCARE_REMEDY_DB", os.path.join(DATA_DIR, "remedies.db"))
+# Readers map this much of the file into memory; the OS shares those pages between processes
+MMAP_SIZE = 256 * 1024 * 1024
+
+DEFAULT_LANGUAGE = "en"
+ALL_SKIN_TYPES = "all"
+
+# Bumped whenever SCHEMA changes; a store compiled with another version is rebuilt from scratch
+SCHEMA_VERSION = 2
+# Each source keeps its own rows, even for conditions, terms and advice another source also has,
+# so rebuilding or dropping one source never removes what the others still provide
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    digest TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS conditions (
+    id TEXT NOT NULL,
+    source_id INTEGER NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (id, source_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS terms (
+    term TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    condition_id TEXT NOT NULL,
+    source_id INTEGER NOT NULL,
+    PRIMARY KEY (term, condition_id, source_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS advice (
+    condition_id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    skin_type TEXT NOT NULL,
+    text TEXT NOT NULL,
+    source_id INTEGER NOT NULL,
+    PRIMARY KEY (condition_id, category, lang, skin_type, source_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS conditions_by_source ON conditions (source_id);
+CREATE INDEX IF NOT EXISTS terms_by_source ON terms (source_id);
+CREATE INDEX IF NOT EXISTS advice_by_source ON advice (source_id);
+"""
+DROP_SCHEMA = """
+DROP TABLE IF EXISTS sources;
+DROP TABLE IF EXISTS conditions;
+DROP TABLE IF EXISTS terms;
+DROP TABLE IF EXISTS advice;
+"""
+
+
+def read_source(path: str) -> list:
+    """Read a JSON or CSV remedy source into flat rows.
+
+    Each row is a dict with condition, category, lang, skin_type, text and priority.
+    The "term" category lists the words and synonyms that identify a condition.
+    JSON sources nest advice per condition (see data/remedies.json); CSV sources use
+    one row per entry with those columns.
+    """
+    rows = []
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            for record in csv.DictReader(f):
+                rows.append({
+                    "condition": record["condition"].strip(),
+                    "category": record["category"].strip(),
+                    "lang": (record.get("lang") or DEFAULT_LANGUAGE).strip(),
+                    "skin_type": (record.get("skin_type") or ALL_SKIN_TYPES).strip(),
+                    "text": record["text"],
+                    "priority": int(record.get("priority") or 0),
+                })
+        return rows
+
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    for condition in data["conditions"]:
+        priority = condition.get("priority", 0)
+        for lang, terms in condition.get("terms", {}).items():
+            for term in terms:
+                rows.append({"condition": condition["id"], "category": "term", "lang": lang,
+                             "skin_type": ALL_SKIN_TYPES, "text": term, "priority": priority})
+        for category, by_language in condition.get("advice", {}).items():
+            for lang, by_skin_type in by_language.items():
+                for skin_type, text in by_skin_type.items():
+                    rows.append({"condition": condition["id"], "category": category, "lang": lang,
+                                 "skin_type": skin_type, "text": text, "priority": priority})
+    return rows
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_store(sources: list = None, db_path: str = None) -> list:
+    """Compile the remedy sources into the SQLite store, rebuilding only what changed.
+
+    Sources whose size and mtime are unchanged are skipped without being read. A changed
+    source has its rows replaced; sources no longer listed are dropped. Returns the paths
+    that were (re)loaded.
+    """
+    sources = [os.path.abspath(path) for path in (sources or REMEDY_SOURCES)]
+    db_path = db_path or REMEDY_DB_PATH
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            conn.executescript(DROP_SCHEMA + SCHEMA + f"PRAGMA user_version = {SCHEMA_VERSION};")
+        else:
+            conn.executescript(SCHEMA)
+        # Take the write lock up front so concurrent workers do not rebuild the same source twice
+        conn.execute("BEGIN IMMEDIATE")
+        known = {row[0]: row[1:] for row in conn.execute("SELECT path, id, mtime, size, digest FROM sources")}
+        rebuilt = []
+
+        for stale in set(known) - set(sources):
+            _delete_source(conn, known[stale][0])
+
+        for path in sources:
+            stat = os.stat(path)
+            previous = known.get(path)
+            if previous and previous[1] == stat.st_mtime and previous[2] == stat.st_size:
+                continue
+            digest = _file_digest(path)
+            if previous and previous[3] == digest:
+                conn.execute("UPDATE sources SET mtime = ?, size = ? WHERE id = ?", (stat.st_mtime, stat.st_size, previous[0]))
+                continue
+
+            if previous:
+                _delete_source(conn, previous[0])
+            source_id = conn.execute(
+                "INSERT INTO sources (path, mtime, size, digest) VALUES (?, ?, ?, ?)",
+                (path, stat.st_mtime, stat.st_size, digest)
+            ).lastrowid
+            _load_rows(conn, source_id, read_source(path))
+            rebuilt.append(path)
+
+        conn.commit()
+    finally:
+        conn.close()
+    return rebuilt
+
+
+def _delete_source(conn, source_id: int):
+    conn.execute("DELETE FROM terms WHERE source_id = ?", (source_id,))
+    conn.execute("DELETE FROM advice WHERE source_id = ?", (source_id,))
+    conn.execute("DELETE FROM conditions WHERE source_id = ?", (source_id,))
+    conn.execute("DELETE FROM sources WHERE id = ?", (source_id,))
+
+
+def _load_rows(conn, source_id: int, rows: list):
+    conditions = {}
+    terms = []
+    advice = []
+    for row in rows:
+        conditions[row["condition"]] = max(conditions.get(row["condition"], 0), row["priority"])
+        if row["category"] == "term":
+            terms.append((row["text"].lower(), row["lang"], row["condition"], source_id))
+        else:
+            advice.append((row["condition"], row["category"], row["lang"], row["skin_type"], row["text"], source_id))
+    conn.executemany("INSERT OR REPLACE INTO conditions (id, source_id, priority) VALUES (?, ?, ?)",
+                     [(condition, source_id, priority) for condition, priority in conditions.items()])
+    conn.executemany("INSERT OR REPLACE INTO terms (term, lang, condition_id, source_id) VALUES (?, ?, ?, ?)", terms)
+    conn.executemany(
+        "INSERT OR REPLACE INTO advice (condition_id, category, lang, skin_type, text, source_id) VALUES (?, ?, ?, ?, ?, ?)",
+        advice
+    )
+
+
+class RemedyStore:
+    """Read-only view of the compiled remedy store.
+
+    Each thread gets its own read-only, memory-mapped connection, so every Streamlit process
+    shares the same file pages through the OS page cache instead of holding the tables on its heap.
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or REMEDY_DB_PATH
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            uri = "file:" + os.path.abspath(self.db_path).replace("?", "%3f") + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+            conn.execute("PRAGMA query_only = ON")
+            self._local.conn = conn
+        return conn
+
+    def terms(self) -> dict:
+        """Return every term mapped to its condition, across all languages."""
+        return dict(self._connection().execute("SELECT DISTINCT term, condition_id FROM terms"))
+
+    def priorities(self) -> dict:
+        """Return the ranking priority of every condition, the highest any source gives it."""
+        return dict(self._connection().execute("SELECT id, MAX(priority) FROM conditions GROUP BY id"))
+
+    def advice(self, condition: str, category: str, skin_type: str = None, lang: str = DEFAULT_LANGUAGE) -> str:
+        """Return the advice text for a condition, or None.
+
+        Falls back from the requested skin type to "all", and from the requested language
+        to English. When several sources have the same entry, the one loaded last wins.
+        """
+        languages = [lang] if lang == DEFAULT_LANGUAGE else [lang, DEFAULT_LANGUAGE]
+        skin_types = [skin_type, ALL_SKIN_TYPES] if skin_type else [ALL_SKIN_TYPES]
+        rows = self._connection().execute(
+            "SELECT lang, skin_type, text, source_id FROM advice WHERE condition_id = ? AND category = ?"
+            f" AND lang IN ({','.join('?' * len(languages))}) AND skin_type IN ({','.join('?' * len(skin_types))})",
+            (condition, category, *languages, *skin_types)
+        ).fetchall()
+        if not rows:
+            return None
+        best = min(rows, key=lambda row: (languages.index(row[0]), skin_types.index(row[1]), -row[3]))
+        return best[2]
+
+
+def open_store(sources: list = None, db_path: str = None) -> RemedyStore:
+    """Bring the store up to date with its sources and open it for reading."""
+    build_store(sources, db_path)
+    return RemedyStore(db_path)
+
+
+if __name__ == "__main__":
+    import sys
+
+    rebuilt = build_store(sys.argv[1:] or None)
+    print(f"Remedy store {REMEDY_DB_PATH}: {len(rebuilt)} source(s) rebuilt")
+    for path in rebuilt:
+        print(f"  {path}")
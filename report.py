@@ -0,0 +1,339 @@
+import copy
+import glob
+import io
+import logging
+import os
+import re
+import threading
+import unicodedata
+
+from fontTools import ttLib
+from fpdf import FPDF
+from fpdf.enums import XPos, YPos
+from fpdf.fonts import CORE_FONTS_CHARWIDTHS, SubsetMap
+
+from findings import Findings, condition_line, ingredient_line
+from i18n import t
+
+logger = logging.getLogger(__name__)
+
+# Report fonts, overridable through the environment. SKINCARE_PDF_FONTS is a list of TTF/OTF
+# files separated by os.pathsep: the first is the body font, the rest are fallbacks for scripts
+# it does not cover (e.g. Devanagari, Arabic, CJK). Without it, any other fonts dropped into
+# fonts/, then the Noto subsets shipped there, then a few common system fonts are used; with no
+# Unicode font at all the report falls back to Helvetica, which only covers Latin-1.
+PDF_FONTS = [path for path in os.getenv("SKINCARE_PDF_FONTS", "").split(os.pathsep) if path]
+FONT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
+# Shipped in fonts/ (see fonts/README.md): the body font first, then fallbacks by script
+BUNDLED_FONTS = [
+    "NotoSans-Regular.ttf",
+    "NotoSansJP-Regular.otf",
+    "NotoNaskhArabic-Regular.otf",
+    "NotoSerifDevanagari-Regular.otf",
+    "NotoSansSymbols2-Regular.ttf",
+]
+SYSTEM_FONTS = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/noto/NotoSans-Regular.ttf",
+    "/usr/share/fonts/truetype/noto/NotoSansDevanagari-Regular.ttf",
+    "/usr/share/fonts/truetype/noto/NotoSansArabic-Regular.ttf",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/Library/Fonts/Arial Unicode.ttf",
+    "C:/Windows/Fonts/arialuni.ttf",
+]
+
+# Page layout, in millimetres and points
+LINE_HEIGHT = 6
+BODY_SIZE = 10
+HEADING_SIZE = 12
+TITLE_SIZE = 16
+
+# Typographic characters Helvetica cannot encode, mapped to ASCII look-alikes
+ASCII_REPLACEMENTS = {
+    "\u201c": '"', "\u201d": '"', "\u201e": '"',
+    "\u2018": "'", "\u2019": "'", "\u201a": "'",
+    "\u2013": "-", "\u2014": "-", "\u2212": "-",
+    "\u2026": "...", "\u2022": "*", "\u00a0": " ",
+    "\u20ac": "EUR", "\u00a3": "GBP", "\u00a5": "JPY",
+    "\u00a9": "(c)", "\u00ae": "(R)", "\u2122": "(TM)",
+}
+
+# Scripts that need shaping and bidi reordering (Hebrew, Arabic, Indic); such lines are laid
+# out by fpdf2 itself, which shapes them with uharfbuzz
+COMPLEX_SCRIPT = re.compile("[\u0590-\u08ff\u0900-\u0dff]")
+# Drawn for characters no report font covers, so the gap is visible rather than silent
+PLACEHOLDER = "\u25a1"
+
+
+class TranslationTable(dict):
+    """A ``str.translate`` table that decides each code point once, on first sight.
+
+    After warm-up every lookup is a plain dict hit inside ``str.translate``, so text is mapped
+    at C speed instead of through a per-character Python loop. Unsupported characters become
+    ``missing`` and are logged once each; invisible control and format characters (carriage
+    returns, variation selectors, joiners) are dropped instead, since there is nothing to show.
+    """
+
+    def __init__(self, supported, replacements: dict = None, missing: str = None):
+        super().__init__(str.maketrans(replacements or {}))
+        self.supported = supported
+        self.missing = missing
+
+    def __missing__(self, codepoint: int):
+        if self.supported(codepoint):
+            value = codepoint
+        elif unicodedata.category(chr(codepoint)) in ("Cc", "Cf") or 0xFE00 <= codepoint <= 0xFE0F:
+            value = None
+        else:
+            value = self.missing
+            logger.warning("No report font has U+%04X %s; it is drawn as %r", codepoint,
+                           unicodedata.name(chr(codepoint), ""), self.missing)
+        self[codepoint] = value
+        return value
+
+
+LATIN1_TABLE = TranslationTable(lambda codepoint: codepoint < 256, ASCII_REPLACEMENTS, "?")
+
+
+def sanitize_text_for_pdf(text):
+    """Map text onto the Latin-1 characters Helvetica can render; anything else becomes '?'."""
+    if not text:
+        return text
+    return text.translate(LATIN1_TABLE)
+
+
+def find_fonts() -> list:
+    """Return the report font files: SKINCARE_PDF_FONTS, else fonts/ and common system fonts."""
+    if PDF_FONTS:
+        return [path for path in PDF_FONTS if os.path.exists(path)]
+    local = sorted(
+        path for path in glob.glob(os.path.join(FONT_DIR, "*.[ot]t[fc]"))
+        if not re.search(r"-(Bold|Italic)", os.path.basename(path)) and os.path.basename(path) not in BUNDLED_FONTS
+    )
+    bundled = [os.path.join(FONT_DIR, name) for name in BUNDLED_FONTS]
+    return local + [path for path in bundled + SYSTEM_FONTS if os.path.exists(path)]
+
+
+def bold_variant(path: str):
+    """Return the bold sibling of a font file (DejaVuSans-Bold.ttf, NotoSans-Bold.ttf), if any."""
+    stem, extension = os.path.splitext(path)
+    candidate = re.sub(r"-Regular$", "", stem) + "-Bold" + extension
+    return candidate if os.path.exists(candidate) else None
+
+
+class FontPrototype:
+    """A TTF font parsed once per process and attached cheaply to each new document.
+
+    Parsing the cmap and metrics is what makes ``FPDF.add_font`` slow. Everything a document
+    changes (the glyph subset, and the fontTools object that output subsets in place) is
+    recreated per document from the cached font bytes, which with lazy table loading costs
+    well under a millisecond. This resets fpdf2's per-document font attributes directly, which
+    is why fpdf2 is pinned to one version.
+    """
+
+    def __init__(self, path: str, style: str = ""):
+        with open(path, "rb") as f:
+            self.data = f.read()
+        pdf = FPDF()
+        pdf.add_font("prototype", style, path)
+        self.font = pdf.fonts[f"prototype{style}"]
+
+    def attach(self, pdf: FPDF, family: str, style: str = ""):
+        font = copy.copy(self.font)
+        font.i = len(pdf.fonts) + 1
+        font.fontkey = f"{family}{style}"
+        font.ttfont = ttLib.TTFont(io.BytesIO(self.data), recalcTimestamp=False, lazy=True)
+        font.subset = SubsetMap(font)
+        font.missing_glyphs = []
+        font.biggest_size_pt = 0
+        font._hbfont = None
+        pdf.fonts[font.fontkey] = font
+
+
+class ReportTemplate:
+    """Fonts, glyph widths and the character mapping for PDF reports, built once and reused.
+
+    Each report still gets its own FPDF document, but font parsing, the merged width table
+    and the translation table are shared, and paragraphs are wrapped here with that table
+    rather than by ``multi_cell``, whose line breaking re-measures the line on every character.
+    """
+
+    def __init__(self, font_paths: list = None):
+        self.font_paths = font_paths
+        self.fonts = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Parse the fonts and build the width and translation tables on first use."""
+        with self._lock:
+            if self.fonts is not None:
+                return
+            paths = find_fonts() if self.font_paths is None else self.font_paths
+            fonts = []
+            for number, path in enumerate(paths):
+                variants = {"": FontPrototype(path)}
+                if number == 0 and bold_variant(path):
+                    variants["B"] = FontPrototype(bold_variant(path), "B")
+                fonts.append(variants)
+
+            if fonts:
+                # Each character is measured in the first font that has it, as fpdf2's fallback does
+                widths = {}
+                for variants in reversed(fonts):
+                    font = variants[""].font
+                    widths.update((chr(codepoint), font.cw[codepoint]) for codepoint in font.cmap)
+                self.widths = {"": widths, "B": widths}
+                if "B" in fonts[0]:
+                    bold = fonts[0]["B"].font
+                    self.widths["B"] = dict(widths, **{chr(codepoint): bold.cw[codepoint] for codepoint in bold.cmap})
+                # Characters no font covers (usually emoji) are drawn as a placeholder
+                placeholder = PLACEHOLDER if PLACEHOLDER in widths else "?"
+                self.table = TranslationTable(lambda codepoint: chr(codepoint) in widths or codepoint == 10,
+                                              {"\t": "    "}, placeholder)
+            else:
+                self.widths = {"": CORE_FONTS_CHARWIDTHS["helvetica"], "B": CORE_FONTS_CHARWIDTHS["helveticaB"]}
+                self.table = LATIN1_TABLE
+            self.fonts = fonts
+
+    @property
+    def unicode(self) -> bool:
+        return bool(self.fonts)
+
+    def new_document(self) -> FPDF:
+        self.load()
+        pdf = FPDF()
+        pdf.set_auto_page_break(True, margin=15)
+        if self.fonts:
+            for number, variants in enumerate(self.fonts):
+                for style, prototype in variants.items():
+                    prototype.attach(pdf, f"report{number}", style)
+            pdf.set_fallback_fonts([f"report{number}" for number in range(1, len(self.fonts))], exact_match=False)
+        pdf.add_page()
+        return pdf
+
+    def set_font(self, pdf: FPDF, style: str, size: float):
+        if not self.fonts:
+            pdf.set_font("helvetica", style, size)
+        else:
+            pdf.set_font("report0", style if style in self.fonts[0] else "", size)
+
+    def text_width(self, text: str, style: str = "") -> int:
+        """Width of ``text`` in thousandths of the font size."""
+        widths = self.widths[style]
+        return sum(widths.get(char, 500) for char in text)
+
+    def wrap(self, line: str, limit: float, style: str = "") -> list:
+        """Greedily break one paragraph into lines no wider than ``limit`` (thousandths of the font size)."""
+        space = self.text_width(" ", style)
+        lines, current, current_width = [], [], 0
+        for word in line.split(" "):
+            width = self.text_width(word, style)
+            if current and current_width + space + width > limit:
+                lines.append(" ".join(current))
+                current, current_width = [], 0
+            if width > limit:
+                # Unspaced text (CJK, long URLs) is broken between characters
+                chunk, chunk_width = "", 0
+                for char in word:
+                    char_width = self.text_width(char, style)
+                    if chunk and chunk_width + char_width > limit:
+                        lines.append(chunk)
+                        chunk, chunk_width = "", 0
+                    chunk += char
+                    chunk_width += char_width
+                word, width = chunk, chunk_width
+            current_width += width + (space if current else 0)
+            current.append(word)
+        lines.append(" ".join(current))
+        return lines
+
+    def write_text(self, pdf: FPDF, text: str, size: float = BODY_SIZE, style: str = ""):
+        """Write wrapped text at the cursor, one cell per line."""
+        self.set_font(pdf, style, size)
+        limit = pdf.epw * pdf.k * 1000 / size
+        for paragraph in text.translate(self.table).split("\n"):
+            if self.fonts and COMPLEX_SCRIPT.search(paragraph):
+                # Shaped widths differ from the per-character ones, so fpdf2 lays these out
+                self.multi_cell(pdf, LINE_HEIGHT, paragraph)
+                continue
+            for line in self.wrap(paragraph, limit, style):
+                pdf.cell(0, LINE_HEIGHT, line, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    def multi_cell(self, pdf: FPDF, height: float, text: str, align: str = "L"):
+        """Write ``text`` with fpdf2's own wrapping, shaped only if it has a complex script.
+
+        Shaping runs every line through harfbuzz and bidi, which roughly triples the render
+        time of a Latin report, so it is switched on for these paragraphs alone.
+        """
+        shape = bool(self.fonts and COMPLEX_SCRIPT.search(text))
+        if shape:
+            pdf.set_text_shaping(True)
+        try:
+            pdf.multi_cell(0, height, text, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align=align)
+        finally:
+            if shape:
+                pdf.set_text_shaping(False)
+
+    def heading(self, pdf: FPDF, text: str, size: float = HEADING_SIZE, align: str = "L"):
+        # Wrapped, since a consultation's title lists every agent
+        self.set_font(pdf, "B", size)
+        self.multi_cell(pdf, 10, text.translate(self.table), align)
+
+    def write_findings(self, pdf: FPDF, findings: Findings):
+        """Write structured findings as short headed lists, warning signs first."""
+        lists = [
+            (t("findings.red_flags"), [f"! {flag}" for flag in findings.red_flags]),
+            (None, [findings.summary] if findings.summary else []),
+            (t("findings.conditions"), [f"\u2022 {condition_line(condition)}" for condition in findings.conditions]),
+            (t("findings.recommendations"), [f"{number}. {recommendation.text}"
+                                             for number, recommendation in enumerate(findings.recommendations, 1)]),
+            (t("findings.ingredients"), [f"\u2022 {ingredient_line(ingredient)}" for ingredient in findings.ingredients]),
+            (None, findings.notes),
+        ]
+        for title, lines in lists:
+            if not lines:
+                continue
+            if title:
+                self.heading(pdf, title, BODY_SIZE + 1)
+            for line in lines:
+                self.write_text(pdf, line)
+            pdf.ln(2)
+
+
+REPORT_TEMPLATE = ReportTemplate()
+
+
+def build_pdf_report(analyzed_by: str, skin_type: str, user_input: str, analysis) -> bytes:
+    """Render an analysis as a downloadable PDF report.
+
+    ``analysis`` is either one agent's text or a list of (agent name, text) sections, which
+    are rendered one after another in the same document; any text may instead be structured
+    Findings, laid out as headed lists. Labels are in the current language.
+    """
+    template = REPORT_TEMPLATE
+    pdf = template.new_document()
+    template.heading(pdf, t("report.title"), TITLE_SIZE, align="C")
+    pdf.ln(5)
+    template.heading(pdf, t("report.analyzed_by", agent=analyzed_by))
+    template.heading(pdf, t("report.skin_type", skin_type=t(f"skin.{skin_type}", default=skin_type.title())))
+    pdf.ln(5)
+    if user_input:
+        template.heading(pdf, t("report.question"))
+        template.write_text(pdf, user_input)
+        pdf.ln(5)
+    template.heading(pdf, t("report.analysis"))
+    sections = [(None, analysis)] if isinstance(analysis, (str, Findings)) else analysis
+    for number, (agent_name, text) in enumerate(sections):
+        if agent_name:
+            if number:
+                pdf.ln(3)
+                pdf.line(pdf.l_margin, pdf.get_y(), pdf.l_margin + pdf.epw, pdf.get_y())
+                pdf.ln(3)
+            template.heading(pdf, agent_name)
+        if isinstance(text, Findings):
+            template.write_findings(pdf, text)
+        else:
+            template.write_text(pdf, text or "")
+    # pdf.output() returns a bytearray; Streamlit wants bytes
+    return bytes(pdf.output())
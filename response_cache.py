@@ -0,0 +1,143 @@
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Cache settings, overridable through the environment
+CACHE_MAX_ENTRIES = int(os.getenv("SKINCARE_CACHE_MAX_ENTRIES", "256"))
+CACHE_TTL_SECONDS = int(os.getenv("SKINCARE_CACHE_TTL", "3600"))
+CACHE_DB_PATH = os.getenv("SKINCARE_CACHE_DB", "")  # empty disables the on-disk tier
+
+
+def normalize_input(text: str) -> str:
+    """Normalize user input so trivially different questions share a cache entry."""
+    return " ".join((text or "").lower().split())
+
+
+def make_cache_key(agent_name: str, instructions: str, skin_type: str, user_input: str,
+                   image_data: str = None, model: str = "", image_detail: str = "", lang: str = "en",
+                   output: str = "text") -> str:
+    """Build a content-addressed key for one analysis request.
+
+    ``output`` names the answer's format; markdown ("text") keys are unchanged from before it existed.
+    """
+    image_digest = hashlib.sha256(image_data.encode()).hexdigest() if image_data else ""
+    fields = [agent_name, instructions, skin_type, normalize_input(user_input), image_digest, model, image_detail, lang]
+    if output != "text":
+        fields.append(output)
+    payload = json.dumps(fields, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier cache for agent analyses: a bounded in-memory LRU and an optional SQLite file.
+
+    Entries expire after ``ttl`` seconds in both tiers. The SQLite tier lets hits survive
+    restarts and be shared between Streamlit worker processes.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: int = CACHE_TTL_SECONDS, db_path: str = CACHE_DB_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        if self.db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """Open a connection for one transaction, and close it afterwards."""
+        # A short-lived connection per operation is safe across threads and processes
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str):
+        """Return the cached response for ``key``, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+        if self.db_path:
+            try:
+                with self._connect() as conn:
+                    row = conn.execute(
+                        "SELECT value, expires_at FROM responses WHERE key = ? AND expires_at > ?", (key, now)
+                    ).fetchone()
+            except sqlite3.Error:
+                row = None
+            if row is not None:
+                value, expires_at = row
+                with self._lock:
+                    self._store_memory(key, value, expires_at)
+                    self.hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: str):
+        """Store a response in both tiers."""
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store_memory(key, value, expires_at)
+        if self.db_path:
+            try:
+                with self._connect() as conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                        (key, value, expires_at)
+                    )
+                    conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+            except sqlite3.Error:
+                pass  # the on-disk tier is best effort
+
+    def _store_memory(self, key: str, value: str, expires_at: float):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry from both tiers and reset the counters."""
+        with self._lock:
+            self._memory.clear()
+            self.hits = 0
+            self.misses = 0
+        if self.db_path:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the in-memory size."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._memory),
+            }
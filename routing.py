@@ -0,0 +1,98 @@
+import json
+import os
+from dataclasses import dataclass, replace
+
+import openai
+
+from conversation import count_tokens
+from remedies import match_conditions, CONDITION_PRIORITY
+
+# Routing settings, overridable through the environment. SKINCARE_ROUTING=0 restores the fixed
+# behaviour (gpt-4o with an image, gpt-4o-mini without, 1500 tokens for every agent).
+# SKINCARE_ROUTING_CONFIG names a JSON file of per-agent overrides, e.g.
+# {"Home Remedy Expert": {"max_tokens": 600, "text_model": "gpt-4o-mini"}}.
+ROUTING_ENABLED = os.getenv("SKINCARE_ROUTING", "1").lower() not in ("0", "false", "no", "off")
+ROUTING_CONFIG_PATH = os.getenv("SKINCARE_ROUTING_CONFIG", "")
+SHORT_INPUT_TOKENS = int(os.getenv("SKINCARE_SHORT_INPUT_TOKENS", "40"))  # questions up to this long get the short budget
+ESCALATION_PRIORITY = 10  # conditions at or above this priority (e.g. melanoma) always get the stronger model
+
+# Model tried when a request is rate limited or times out; models not listed are not retried
+FALLBACK_MODELS = {"gpt-4o": "gpt-4o-mini", "gpt-4o-mini": "gpt-4o"}
+
+DETAIL_LEVELS = ["low", "high"]
+
+
+@dataclass(frozen=True)
+class AgentPolicy:
+    """How one agent's requests are routed."""
+    text_model: str = "gpt-4o-mini"
+    vision_model: str = "gpt-4o"
+    escalation_model: str = "gpt-4o"
+    max_tokens: int = 1500
+    short_max_tokens: int = 600
+    temperature: float = 0.7
+    image_detail: str = "high"  # the most detail this agent needs from a photo
+    fallback: bool = True
+
+
+@dataclass(frozen=True)
+class Route:
+    """The model and limits chosen for one request, and why."""
+    name: str
+    model: str
+    max_tokens: int
+    temperature: float
+    image_detail: str
+    fallback_model: str = None
+
+
+LEGACY_POLICY = AgentPolicy(escalation_model="gpt-4o-mini", short_max_tokens=1500, fallback=False)
+
+
+def load_overrides(path: str = ROUTING_CONFIG_PATH) -> dict:
+    """Read per-agent policy overrides from a JSON file; a missing path means none."""
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def configure(name: str, policy: AgentPolicy, overrides: dict = None) -> AgentPolicy:
+    """Apply the overrides for agent ``name`` (as listed in the sidebar) to its default policy."""
+    if not ROUTING_ENABLED:
+        return LEGACY_POLICY
+    overrides = load_overrides() if overrides is None else overrides
+    return replace(policy, **overrides.get(name, {}))
+
+
+def choose_route(policy: AgentPolicy, user_input: str, image_data: str = None, image_detail: str = "high") -> Route:
+    """Pick the model, token budget and image detail for one request.
+
+    The features are cheap and local: whether there is an image, how long the question is,
+    and which conditions it mentions (the same keyword index the tools use).
+    """
+    fallback = FALLBACK_MODELS.get if policy.fallback else (lambda model: None)
+    if image_data:
+        # Never ask for more detail than the photo was prepared for, nor more than the agent needs
+        detail = DETAIL_LEVELS[min(DETAIL_LEVELS.index(image_detail) if image_detail in DETAIL_LEVELS else 1,
+                                   DETAIL_LEVELS.index(policy.image_detail))]
+        return Route("vision", policy.vision_model, policy.max_tokens, policy.temperature, detail,
+                     fallback(policy.vision_model))
+
+    conditions = match_conditions(user_input or "")
+    if any(CONDITION_PRIORITY.get(condition, 0) >= ESCALATION_PRIORITY for condition in conditions):
+        return Route("escalated", policy.escalation_model, policy.max_tokens, policy.temperature, image_detail,
+                     fallback(policy.escalation_model))
+    if count_tokens(user_input) <= SHORT_INPUT_TOKENS and len(conditions) <= 1:
+        return Route("short", policy.text_model, policy.short_max_tokens, policy.temperature, image_detail,
+                     fallback(policy.text_model))
+    return Route("text", policy.text_model, policy.max_tokens, policy.temperature, image_detail,
+                 fallback(policy.text_model))
+
+
+def should_fall_back(error: Exception) -> bool:
+    """True for the errors a different model may not hit: rate limits, overload and timeouts."""
+    if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, openai.InternalServerError)):
+        return True
+    message = str(error).lower()
+    return "timed out" in message or "timeout" in message or "rate limit" in message
@@ -0,0 +1,356 @@
+import contextvars
+import itertools
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+
+import openai
+
+from conversation import count_tokens
+from image_processing import SHORT_SIDE, estimate_vision_tokens
+import telemetry
+
+# Scheduler settings, overridable through the environment. Limits are "model=RPM/TPM" pairs
+# (requests and tokens per minute, 0 = unlimited), such as "gpt-4o=500/30000,gpt-4o-mini=500/200000"
+# for OpenAI's usage tier 1; set them to your account's limits. Unset or "off" leaves only the
+# retries, so higher tiers are not throttled to numbers they do not have. SKINCARE_RATE_LIMIT_DB
+# shares the budgets between processes through SQLite.
+RATE_LIMITS_SPEC = os.getenv("SKINCARE_RATE_LIMITS", "off")
+RATE_LIMIT_DB_PATH = os.getenv("SKINCARE_RATE_LIMIT_DB", "")  # empty keeps the budgets per process
+API_RETRIES = int(os.getenv("SKINCARE_API_RETRIES", "4"))
+
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 20.0
+RETRY_AFTER_MAX = 60.0  # a longer Retry-After is reported instead of waited out
+
+
+@dataclass(frozen=True)
+class ModelLimit:
+    """Requests and tokens per minute allowed for one model."""
+    rpm: float
+    tpm: float
+
+
+@dataclass
+class BudgetState:
+    """What is left of one model's budget at ``updated``, and when a 429 pause ends."""
+    requests: float
+    tokens: float
+    updated: float
+    paused_until: float = 0.0
+
+
+UNLIMITED = ModelLimit(float("inf"), float("inf"))
+
+
+def parse_limits(spec: str) -> dict:
+    """Parse "gpt-4o=500/30000,gpt-4o-mini=500/200000" into {model: ModelLimit}."""
+    limits = {}
+    if spec.strip().lower() in ("", "0", "off", "none"):
+        return limits
+    for item in spec.split(","):
+        model, _, values = item.partition("=")
+        rpm, _, tpm = values.partition("/")
+        limits[model.strip()] = ModelLimit(float(rpm) or float("inf"), float(tpm or 0) or float("inf"))
+    return limits
+
+
+def settle(state: BudgetState, limit: ModelLimit, tokens: int, now: float) -> float:
+    """Refill ``state`` up to ``now`` and take one request of ``tokens`` from it if it fits.
+
+    Returns 0 when the budget was taken, otherwise the seconds until it will fit.
+    """
+    elapsed = max(0.0, now - state.updated)
+    state.requests = min(limit.rpm, state.requests + elapsed * limit.rpm / 60)
+    state.tokens = min(limit.tpm, state.tokens + elapsed * limit.tpm / 60)
+    state.updated = now
+    if state.paused_until > now:
+        return state.paused_until - now
+    # A request larger than a whole minute's budget would otherwise wait forever
+    tokens = min(tokens, limit.tpm)
+    wait = max(0.0, (1 - state.requests) * 60 / limit.rpm, (tokens - state.tokens) * 60 / limit.tpm)
+    if wait == 0:
+        state.requests -= 1
+        state.tokens -= tokens
+    return wait
+
+
+class MemoryBudgets:
+    """Per-model request and token buckets for this process. Callers hold the scheduler's lock."""
+
+    def __init__(self, limits: dict):
+        self.limits = limits
+        self._states = {}
+
+    def _state(self, model: str, now: float) -> BudgetState:
+        limit = self.limits.get(model, UNLIMITED)
+        return self._states.setdefault(model, BudgetState(limit.rpm, limit.tpm, now))
+
+    def reserve(self, model: str, tokens: int) -> float:
+        now = time.monotonic()
+        return settle(self._state(model, now), self.limits.get(model, UNLIMITED), tokens, now)
+
+    def pause(self, model: str, seconds: float):
+        now = time.monotonic()
+        state = self._state(model, now)
+        state.paused_until = max(state.paused_until, now + seconds)
+
+
+class SQLiteBudgets:
+    """The same buckets kept in a SQLite file, so every worker process draws on one budget."""
+
+    def __init__(self, limits: dict, db_path: str):
+        self.limits = limits
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS budgets (model TEXT PRIMARY KEY, requests REAL NOT NULL, "
+                "tokens REAL NOT NULL, updated REAL NOT NULL, paused_until REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        # Autocommit mode, so BEGIN IMMEDIATE below takes the write lock before reading
+        conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _update(self, model: str, change) -> float:
+        limit = self.limits.get(model, UNLIMITED)
+        try:
+            conn = self._connect()
+        except sqlite3.Error:
+            return 0  # an unreadable budget file must not stop requests altogether
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            row = conn.execute(
+                "SELECT requests, tokens, updated, paused_until FROM budgets WHERE model = ?", (model,)
+            ).fetchone()
+            state = BudgetState(*row) if row else BudgetState(limit.rpm, limit.tpm, now)
+            result = change(state, limit, now)
+            conn.execute(
+                "INSERT OR REPLACE INTO budgets (model, requests, tokens, updated, paused_until) VALUES (?, ?, ?, ?, ?)",
+                (model, state.requests, state.tokens, state.updated, state.paused_until)
+            )
+            conn.execute("COMMIT")
+            return result
+        except sqlite3.Error:
+            return 0
+        finally:
+            conn.close()
+
+    def reserve(self, model: str, tokens: int) -> float:
+        return self._update(model, lambda state, limit, now: settle(state, limit, tokens, now))
+
+    def pause(self, model: str, seconds: float):
+        def extend(state, limit, now):
+            state.paused_until = max(state.paused_until, now + seconds)
+        self._update(model, extend)
+
+
+class QueueTimeout(TimeoutError):
+    """A request's deadline passed while it was still waiting for rate-limit budget."""
+
+
+@dataclass
+class _Ticket:
+    rank: int
+    seq: int
+    model: str
+    session: str
+
+
+# The session a request belongs to and an optional callback told its queue position; worker
+# threads started with contextvars.copy_context() inherit both
+_current_session = contextvars.ContextVar("skincare_session", default=("", None))
+
+
+@contextmanager
+def use_session(session_id: str, on_queue=None):
+    """Schedule requests made inside the block as ``session_id``'s.
+
+    ``on_queue(position)`` is called while a request waits (1 = next in line) and with 0 once
+    it is sent.
+    """
+    token = _current_session.set((session_id, on_queue))
+    try:
+        yield
+    finally:
+        _current_session.reset(token)
+
+
+def background_context() -> contextvars.Context:
+    """Copy the current context for a task on a shared thread pool, without the queue callback.
+
+    The task's requests still count as this session's, but a callback bound to one session's
+    UI must not run on threads that serve every session.
+    """
+    context = contextvars.copy_context()
+    session, _on_queue = _current_session.get()
+    context.run(_current_session.set, (session, None))
+    return context
+
+
+def estimate_tokens(body: dict) -> int:
+    """Tokens a chat completion request counts against TPM: its prompt plus ``max_tokens``."""
+    total = body.get("max_tokens") or 0
+    for message in body.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            total += count_tokens(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                total += count_tokens(part["text"])
+            elif part.get("type") == "image_url":
+                total += estimate_vision_tokens(SHORT_SIDE, SHORT_SIDE, part["image_url"].get("detail", "high"))
+    return total
+
+
+def retry_after(error: Exception):
+    """Seconds the server asked us to wait in ``error``'s response headers, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(error: Exception, attempt: int):
+    """Seconds to wait before retrying after ``error``, or None if it should not be retried."""
+    if getattr(error, "code", None) == "insufficient_quota":
+        return None  # a billing limit, not a throughput one: waiting does not help
+    status = getattr(error, "status_code", None)
+    if status not in RETRY_STATUSES and not isinstance(error, openai.APIConnectionError):
+        return None
+    # Full jitter keeps sessions that were throttled together from retrying in lockstep
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    requested = retry_after(error)
+    if requested is not None:
+        if requested > RETRY_AFTER_MAX:
+            return None
+        delay = max(delay, requested)
+    return delay
+
+
+class RequestScheduler:
+    """Process-wide gate in front of the model API, shared by every Streamlit session.
+
+    Each request waits until its model's RPM and TPM budgets have room, so bursts are
+    smoothed out instead of coming back as 429s. Waiting requests are served in fair order:
+    each session's n-th queued request ranks with every other session's n-th, so one full
+    consultation cannot starve a single question from another user. Throttled (429) and
+    failed (5xx, connection) attempts are retried with jittered exponential backoff that
+    honours Retry-After, and a 429 pauses that model's budget for every session.
+    """
+
+    def __init__(self, limits: dict = None, db_path: str = RATE_LIMIT_DB_PATH, retries: int = API_RETRIES):
+        self.limits = parse_limits(RATE_LIMITS_SPEC) if limits is None else limits
+        self.budgets = SQLiteBudgets(self.limits, db_path) if db_path else MemoryBudgets(self.limits)
+        self.retries = retries
+        self.sent = 0
+        self.retried = 0
+        self.wait_seconds = 0.0
+        self._waiting = []
+        self._next_rank = {}  # session with queued requests -> rank of its next one
+        self._served_rank = 0
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def acquire(self, model: str, tokens: int, deadline: float = None):
+        """Block until a request of ``tokens`` to ``model`` may be sent.
+
+        ``deadline`` is a time.monotonic() value; QueueTimeout is raised if it passes first.
+        """
+        session, on_queue = _current_session.get()
+        start = time.monotonic()
+        with self._cond:
+            # An idle session starts level with the requests being served now, not ahead of them
+            rank = max(self._next_rank.get(session, 0), self._served_rank)
+            self._next_rank[session] = rank + 1
+            ticket = _Ticket(rank, next(self._seq), model, session)
+            self._waiting.append(ticket)
+        reported = 0
+        try:
+            while True:
+                with self._cond:
+                    position = 1 + sum(
+                        1 for other in self._waiting
+                        if other.model == model and (other.rank, other.seq) < (ticket.rank, ticket.seq)
+                    )
+                    wait = None
+                    if position == 1:
+                        wait = self.budgets.reserve(model, tokens)
+                        if wait == 0:
+                            self._served_rank = max(self._served_rank, ticket.rank)
+                            self.sent += 1
+                            self.wait_seconds += time.monotonic() - start
+                            break
+                    if position == reported or on_queue is None:
+                        if deadline is not None:
+                            remaining = deadline - time.monotonic()
+                            if remaining <= 0:
+                                raise QueueTimeout(f"Request timed out after {time.monotonic() - start:.1f}s queued for {model}")
+                            wait = remaining if wait is None else min(wait, remaining)
+                        # Woken early when a request ahead leaves the queue
+                        self._cond.wait(wait)
+                        continue
+                # Report a new position outside the lock; the callback may touch the UI
+                reported = position
+                on_queue(position)
+        finally:
+            with self._cond:
+                self._waiting.remove(ticket)
+                # An idle session starts level with the served rank anyway, so forget it
+                if not any(other.session == session for other in self._waiting):
+                    del self._next_rank[session]
+                self._cond.notify_all()
+            if reported and on_queue is not None:
+                on_queue(0)
+        telemetry.record_queue_wait(model, time.monotonic() - start)
+
+    def call(self, model: str, tokens: int, send, retries: int = None, deadline: float = None):
+        """Send a request with ``send()`` once there is budget, retrying throttled and failed attempts."""
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            self.acquire(model, tokens, deadline)
+            try:
+                return send()
+            except Exception as e:
+                delay = retry_delay(e, attempt)
+                if delay is not None and getattr(e, "status_code", None) == 429:
+                    # Every session waits out the throttle, not just this request
+                    with self._cond:
+                        self.budgets.pause(model, delay)
+                if delay is None or attempt == retries:
+                    raise
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    raise
+                with self._cond:
+                    self.retried += 1
+                telemetry.record_retry(model, getattr(e, "status_code", None))
+                time.sleep(delay)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "queued": len(self._waiting),
+                "sent": self.sent,
+                "retried": self.retried,
+                "wait_seconds": round(self.wait_seconds, 3),
+            }
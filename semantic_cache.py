@@ -0,0 +1,301 @@
+import base64
+import json
+import os
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from remedies import match_conditions
+from response_cache import normalize_input
+
+# Semantic reuse settings, overridable through the environment. SKINCARE_SEMANTIC_CACHE picks the
+# embedding: "openai", or "local" (hashed words and matched conditions, no network; meant for
+# development and tests, it cannot tell most paraphrases from near misses); empty disables.
+SEMANTIC_CACHE = os.getenv("SKINCARE_SEMANTIC_CACHE", "").lower()
+SEMANTIC_INDEX_PATH = os.getenv("SKINCARE_SEMANTIC_INDEX", ".cache/semantic-index.jsonl")
+SEMANTIC_THRESHOLD = float(os.getenv("SKINCARE_SEMANTIC_THRESHOLD", "0") or 0)  # 0 = the embedding's default
+SEMANTIC_TTL_SECONDS = int(os.getenv("SKINCARE_SEMANTIC_TTL", str(7 * 24 * 3600)))
+SEMANTIC_MAX_ENTRIES = int(os.getenv("SKINCARE_SEMANTIC_MAX_ENTRIES", "20000"))
+OPENAI_EMBEDDING_MODEL = os.getenv("SKINCARE_EMBEDDING_MODEL", "text-embedding-3-small")
+
+LOCAL_DIMENSIONS = 1024
+STOPWORDS = {"a", "an", "and", "are", "at", "be", "for", "have", "i", "in", "is", "it", "me", "my", "of", "on", "or",
+             "so", "the", "to", "what", "with", "do", "does", "can", "how", "should", "some", "got", "been", "im"}
+
+# Words that flip or narrow a question's meaning while barely moving its embedding; two questions
+# must agree on all of them (and on the conditions they mention) before an answer is reused.
+NEGATIONS = {"no", "not", "never", "without", "none", "nothing", "nor", "cannot", "stop", "stopped"}
+QUALIFIERS = {
+    # seasons and climate
+    "winter", "summer", "spring", "autumn", "fall", "cold", "hot", "humid", "sun", "sunny",
+    # body areas
+    "face", "forehead", "cheek", "cheeks", "chin", "jaw", "jawline", "nose", "lip", "lips", "eye", "eyes",
+    "eyelid", "eyelids", "ear", "ears", "scalp", "neck", "chest", "back", "shoulder", "shoulders", "arm",
+    "arms", "armpit", "armpits", "underarm", "underarms", "hand", "hands", "finger", "fingers", "nail",
+    "nails", "leg", "legs", "thigh", "thighs", "knee", "knees", "foot", "feet", "toe", "toes", "groin",
+    "buttocks", "body",
+    # who and how bad
+    "baby", "babies", "infant", "child", "children", "kid", "kids", "teen", "teenager", "pregnant",
+    "pregnancy", "breastfeeding", "elderly", "mild", "moderate", "severe", "sudden", "suddenly", "painful",
+    "bleeding", "spreading", "worse", "worsening", "better", "new", "changing", "growing",
+}
+
+
+def _add_feature(vector: np.ndarray, feature: str, weight: float):
+    digest = zlib.crc32(feature.encode("utf-8"))
+    vector[digest % len(vector)] += weight if digest & 0x80000000 else -weight
+
+
+def reuse_key(text: str) -> tuple:
+    """Return what two questions must share before one's answer is reused for the other.
+
+    That is the conditions they mention, their qualifier words and each negation together
+    with the word it negates, so "my mole is changing shape" and "my mole is not changing
+    shape" never share an answer however close their embeddings are.
+    """
+    words = [word for word in re.findall(r"[\w']+", text.lower()) if word not in STOPWORDS]
+    key = {f"condition:{condition}" for condition in match_conditions(text)}
+    for position, word in enumerate(words):
+        if word in NEGATIONS or word.endswith("n't"):
+            following = words[position + 1] if position + 1 < len(words) else ""
+            key.add(f"not:{following}")
+        elif word in QUALIFIERS:
+            key.add(word)
+    return tuple(sorted(key))
+
+
+def local_embedding(text: str, dimensions: int = LOCAL_DIMENSIONS) -> np.ndarray:
+    """Deterministic embedding from hashed words, character trigrams and matched skin conditions.
+
+    Conditions come from the remedy store's synonym index, so "forehead pimples" and "acne on
+    my forehead" share their strongest feature. Their other words differ, though, and the two
+    score about 0.8, well under the local threshold: this embedding matches rewordings of the
+    same words (order, stopwords, punctuation), not paraphrases. Lowering the threshold to
+    reach those also lets near misses through, which only ``reuse_key`` then stops.
+    """
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for condition in match_conditions(text):
+        _add_feature(vector, f"condition:{condition}", 2.0)
+    for word in re.findall(r"\w+", text.lower()):
+        if word in STOPWORDS:
+            continue
+        _add_feature(vector, f"word:{word}", 1.0)
+        padded = f" {word} "
+        for start in range(len(padded) - 2):
+            _add_feature(vector, f"gram:{padded[start:start + 3]}", 0.3)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def openai_embedding(client=None, model: str = OPENAI_EMBEDDING_MODEL):
+    """Return an embedding function backed by the OpenAI embeddings endpoint."""
+    state = {"client": client}
+
+    def embed(text: str) -> np.ndarray:
+        if state["client"] is None:
+            from openai import OpenAI
+            state["client"] = OpenAI()
+        response = state["client"].embeddings.create(model=model, input=text)
+        vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    return embed
+
+
+# Similarity needed for reuse, per embedding. Hashed features put near misses ("dry skin in winter"
+# and "... in summer") above 0.8, so the local one only reuses close rewordings.
+DEFAULT_THRESHOLDS = {"local": 0.92, "openai": 0.9}
+
+
+class SemanticCache:
+    """Reuse stored answers for questions that mean the same thing to the same agent.
+
+    Questions are embedded with a pluggable ``embed(text) -> vector`` function and searched
+    by brute-force cosine similarity over an in-memory NumPy matrix, restricted to rows with
+    the same agent, skin type and language. A similar enough entry is reused only when its
+    ``reuse_key`` (conditions, negations, qualifiers) is the same as the question's.
+
+    The index is an append-only JSONL file: every process appends its new entries and picks
+    up other processes' entries on its next lookup, and the file is rewritten only when it
+    outgrows ``max_entries``.
+    """
+
+    def __init__(self, embed, name: str, path: str = SEMANTIC_INDEX_PATH, threshold: float = None,
+                 ttl: int = SEMANTIC_TTL_SECONDS, max_entries: int = SEMANTIC_MAX_ENTRIES):
+        self.embed = embed
+        self.name = name
+        self.path = path
+        self.threshold = threshold or DEFAULT_THRESHOLDS.get(name.split(":")[0], 0.9)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._reset()
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+    def _reset(self):
+        self._vectors = None
+        self._size = 0
+        self._entries = []
+        self._rows = {}  # (agent, skin type, language) -> row numbers
+        self._offset = 0
+        self._inode = None
+
+    def _append_row(self, record: dict):
+        vector = np.frombuffer(base64.b64decode(record["vector"]), dtype=np.float32)
+        if self._vectors is None:
+            self._vectors = np.zeros((64, len(vector)), dtype=np.float32)
+        if len(vector) != self._vectors.shape[1]:
+            return
+        if self._size == len(self._vectors):
+            # Grow by doubling so appends stay amortised O(1)
+            self._vectors = np.concatenate([self._vectors, np.zeros_like(self._vectors)])
+        self._vectors[self._size] = vector
+        record.setdefault("lang", "en")  # written before answers were kept per language
+        record["key"] = tuple(record.get("key") or reuse_key(normalize_input(record["question"])))
+        self._rows.setdefault((record["agent"], record["skin_type"], record["lang"]), []).append(self._size)
+        self._entries.append({key: record[key] for key in ("agent", "skin_type", "lang", "question", "answer", "key",
+                                                             "created_at")})
+        self._size += 1
+
+    def _sync(self):
+        """Load entries appended to the index file since the last call, by this or any other process."""
+        if not self.path:
+            return
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            self._reset()  # rewritten by a compaction
+            self._inode = stat.st_ino
+        if stat.st_size == self._offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        # A line still being written by another process is left for the next sync
+        complete = data[:data.rfind(b"\n") + 1]
+        for line in complete.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("embedder") == self.name:
+                self._append_row(record)
+        self._offset += len(complete)
+
+    def lookup(self, agent: str, skin_type: str, question: str, lang: str = "en") -> tuple:
+        """Return (answer, similarity, vector); answer is None below the threshold.
+
+        The question's vector is returned so ``add`` can store it without embedding twice.
+        """
+        question = normalize_input(question)
+        vector = self.embed(question)
+        key = reuse_key(question)
+        with self._lock:
+            self._sync()
+            rows = self._rows.get((agent, skin_type, lang))
+            best, similarity = None, 0.0
+            if rows:
+                rows = np.asarray(rows)
+                scores = self._vectors[rows] @ vector
+                oldest = time.time() - self.ttl
+                for position in np.argsort(scores)[::-1]:
+                    entry = self._entries[rows[position]]
+                    if scores[position] < self.threshold:
+                        break
+                    if entry["created_at"] > oldest and entry["key"] == key:
+                        best, similarity = entry["answer"], float(scores[position])
+                        break
+            if best is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return best, similarity, vector
+
+    def add(self, agent: str, skin_type: str, question: str, answer: str, vector: np.ndarray = None, lang: str = "en"):
+        """Append one answered question to the index."""
+        if vector is None:
+            vector = self.embed(normalize_input(question))
+        record = {
+            "embedder": self.name,
+            "agent": agent,
+            "skin_type": skin_type,
+            "lang": lang,
+            "question": question,
+            "answer": answer,
+            "key": reuse_key(normalize_input(question)),
+            "created_at": time.time(),
+            "vector": base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii"),
+        }
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if not self.path:
+                self._append_row(record)
+                return
+            # One write per entry in append mode, so concurrent writers never interleave lines
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self._sync()
+            if self._size > self.max_entries * 1.25:
+                self._compact()
+
+    def _compact(self):
+        """Rewrite the index with this embedder's newest unexpired ``max_entries`` entries.
+
+        Other embedders' lines are copied through unchanged, and so are lines other processes
+        appended since the last sync, read again just before the old file is replaced.
+        """
+        oldest = time.time() - self.ttl
+        keep = [row for row in range(self._size) if self._entries[row]["created_at"] > oldest][-self.max_entries:]
+        temporary = f"{self.path}.{os.getpid()}.tmp"  # per process, so two compactions never share one
+        with open(self.path, "rb") as old, open(temporary, "wb") as f:
+            for line in old.read(self._offset).splitlines(keepends=True):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("embedder") != self.name:
+                    f.write(line)
+            for row in keep:
+                f.write((json.dumps(dict(self._entries[row], embedder=self.name, vector=base64.b64encode(
+                    self._vectors[row].tobytes()).decode("ascii")), ensure_ascii=False) + "\n").encode("utf-8"))
+            # A line still being written is left out, as _sync would leave it
+            tail = old.read()
+            f.write(tail[:tail.rfind(b"\n") + 1])
+        os.replace(temporary, self.path)
+        self._reset()
+        self._sync()
+
+    def clear(self):
+        with self._lock:
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+            self._reset()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": self._size,
+            }
+
+
+def build_semantic_cache():
+    """Create the semantic cache configured in the environment, or None when it is disabled."""
+    if SEMANTIC_CACHE == "local":
+        return SemanticCache(local_embedding, "local", threshold=SEMANTIC_THRESHOLD)
+    if SEMANTIC_CACHE == "openai":
+        return SemanticCache(openai_embedding(), f"openai:{OPENAI_EMBEDDING_MODEL}", threshold=SEMANTIC_THRESHOLD)
+    return None
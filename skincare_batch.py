@@ -0,0 +1,308 @@
+"""Run the skincare agents headlessly over a batch of intake cases.
+
+Cases come from a JSONL manifest (one {"id", "text", "image", "skin_type"} object per line,
+image paths relative to the manifest) or from a directory of images, where an optional
+sidecar .txt file with the same name holds the case text. Every (case, agent) result is
+appended to the output JSONL as soon as it finishes; rerunning with the same output file
+skips the analyses that already succeeded, so a crashed run resumes where it stopped.
+
+    python skincare_batch.py --manifest cases.jsonl --agents "Dermatologist AI" --output results.jsonl
+    python skincare_batch.py --images intake/ --workers 8 --rpm 300 --output results.jsonl
+
+With --batch-api the requests go through the OpenAI Batch API instead, for large jobs that
+can wait up to 24 hours at half the price.
+
+Set OPENAI_BASE_URL (or --base-url) to run against a local mock of the OpenAI API.
+"""
+import argparse
+import contextvars
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+from openai import OpenAI
+
+# The project modules read their SKINCARE_* settings when first imported, so .env comes first
+load_dotenv()
+
+from findings import to_dict  # noqa: E402
+from i18n import LANGUAGES, use_language  # noqa: E402
+from image_processing import preprocess_image  # noqa: E402
+from pubmed_client import TokenBucket  # noqa: E402
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp"}
+DEFAULT_TEXT = "Please analyze this skin image and provide skincare advice."
+PROGRESS_INTERVAL = 10  # seconds between progress lines
+
+
+def read_manifest(path: str) -> list:
+    """Read cases from a JSONL manifest; case ids default to the line number."""
+    base_dir = os.path.dirname(os.path.abspath(path))
+    cases = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            image = record.get("image")
+            cases.append({
+                "id": str(record.get("id", line_number)),
+                "text": record.get("text", ""),
+                "image": os.path.join(base_dir, image) if image else None,
+                "skin_type": record.get("skin_type", "normal"),
+            })
+    return cases
+
+
+def read_image_dir(path: str, skin_type: str = "normal") -> list:
+    """Turn every image under ``path`` into a case, using a sidecar .txt file as its text."""
+    cases = []
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            stem, extension = os.path.splitext(name)
+            if extension.lower() not in IMAGE_EXTENSIONS:
+                continue
+            image = os.path.join(root, name)
+            sidecar = os.path.join(root, stem + ".txt")
+            text = DEFAULT_TEXT
+            if os.path.exists(sidecar):
+                with open(sidecar, encoding="utf-8") as f:
+                    text = f.read().strip() or DEFAULT_TEXT
+            cases.append({"id": os.path.relpath(image, path), "text": text, "image": image, "skin_type": skin_type})
+    return sorted(cases, key=lambda case: case["id"])
+
+
+def completed_tasks(output_path: str) -> set:
+    """Return the (case id, agent) pairs that already have a successful result in the output file."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short by a crash is simply redone
+            if not record.get("error"):
+                done.add((record["id"], record["agent"]))
+    return done
+
+
+def batch_records(output_path: str) -> set:
+    """Return the (batch id, custom_id) pairs of the Batch API records already in the output file."""
+    from batch_api import task_id
+
+    written = set()
+    if not os.path.exists(output_path):
+        return written
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("batch_id"):
+                written.add((record["batch_id"], task_id(record["id"], record["agent"])))
+    return written
+
+
+def load_case_image(case: dict) -> tuple:
+    """Return the case's image as a (data URL, detail) pair ready for a vision request."""
+    if not case.get("image"):
+        return None, "high"
+    with open(case["image"], "rb") as f:
+        prepared = preprocess_image(f)
+    return prepared.data_url, prepared.detail
+
+
+def percentile(samples: list, fraction: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] if samples else 0.0
+
+
+class BatchRunner:
+    """Run (case, agent) tasks on a worker pool, appending each result to the output file."""
+
+    def __init__(self, agents: dict, output_path: str, workers: int = 4, rpm: float = 0, timeout: float = None,
+                 use_cache: bool = True, structured: bool = False):
+        self.agents = agents
+        self.output_path = output_path
+        self.workers = workers
+        self.limiter = TokenBucket(rpm / 60) if rpm else None
+        self.timeout = timeout
+        self.use_cache = use_cache
+        self.structured = structured
+        self.latencies = []
+        self.usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        self.succeeded = 0
+        self.failed = 0
+        self.cached = 0
+        self._lock = threading.Lock()
+
+    def run_task(self, case: dict, agent_name: str, output) -> dict:
+        image_data, image_detail = load_case_image(case)
+        if self.limiter:
+            self.limiter.acquire()
+        start = time.perf_counter()
+        result = self.agents[agent_name].run(case["text"], image_data, case["skin_type"], self.timeout,
+                                             self.use_cache, image_detail, self.structured)
+        latency = time.perf_counter() - start
+
+        record = {
+            "id": case["id"],
+            "agent": agent_name,
+            "skin_type": case["skin_type"],
+            "model": result.model,
+            "route": result.route,
+            "response": result.text,
+            "usage": result.usage,
+            "cached": result.cached,
+            "error": result.error,
+            "latency": round(latency, 3),
+        }
+        if result.findings is not None:
+            record["findings"] = to_dict(result.findings)
+        with self._lock:
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            if result.error:
+                self.failed += 1
+                return record
+            self.succeeded += 1
+            self.cached += result.cached
+            self.latencies.append(latency)
+            for key in self.usage:
+                self.usage[key] += result.usage.get(key) or 0
+        return record
+
+    def run(self, cases: list, agent_names: list) -> dict:
+        """Run every pending task and return the run's statistics."""
+        done = completed_tasks(self.output_path)
+        tasks = [(case, name) for case in cases for name in agent_names if (case["id"], name) not in done]
+        print(f"{len(cases)} cases x {len(agent_names)} agents: {len(tasks)} to run, "
+              f"{len(cases) * len(agent_names) - len(tasks)} already done", file=sys.stderr)
+
+        start = time.perf_counter()
+        last_report = start
+        with open(self.output_path, "a", encoding="utf-8") as output, ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # Workers run in a copy of the caller's context, so they answer in its language
+            futures = [executor.submit(contextvars.copy_context().run, self.run_task, case, name, output) for case, name in tasks]
+            for finished, future in enumerate(as_completed(futures), 1):
+                try:
+                    future.result()
+                except Exception as e:
+                    # Unreadable images and the like; the task is retried on the next run
+                    with self._lock:
+                        self.failed += 1
+                    print(f"Task failed: {e}", file=sys.stderr)
+                now = time.perf_counter()
+                if now - last_report >= PROGRESS_INTERVAL:
+                    last_report = now
+                    print(f"{finished}/{len(tasks)} done, {self.throughput(now - start, len(agent_names)):.1f} cases/min",
+                          file=sys.stderr)
+
+        return self.stats(time.perf_counter() - start, len(agent_names))
+
+    def throughput(self, elapsed: float, agents_per_case: int) -> float:
+        return (self.succeeded + self.failed) / agents_per_case / elapsed * 60 if elapsed else 0.0
+
+    def stats(self, elapsed: float, agents_per_case: int) -> dict:
+        with self._lock:
+            return {
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "cached": self.cached,
+                "elapsed_seconds": round(elapsed, 1),
+                "cases_per_minute": round(self.throughput(elapsed, agents_per_case), 1),
+                "latency_p50": round(statistics.median(self.latencies), 3) if self.latencies else 0.0,
+                "latency_p95": round(percentile(self.latencies, 0.95), 3),
+                "usage": dict(self.usage),
+            }
+
+
+def run_batch_api(client: OpenAI, agents: dict, cases: list, agent_names: list, output_path: str,
+                  poll_interval: float, structured: bool = False) -> dict:
+    """Submit every pending task through the OpenAI Batch API and wait for the results.
+
+    Job state is kept next to the output file, so rerunning after a restart resumes polling
+    the chunks already submitted instead of submitting them again.
+    """
+    from batch_api import BatchJob
+
+    done = completed_tasks(output_path)
+    tasks = [(case, name) for case in cases for name in agent_names if (case["id"], name) not in done]
+    job = BatchJob(client, agents, output_path + ".batch-state.json", structured)
+    created = job.submit(tasks, load_case_image)
+    print(f"{len(tasks)} tasks pending: {created} new batch chunk(s), {job.outstanding()} in progress", file=sys.stderr)
+
+    stats = {"succeeded": 0, "failed": 0, "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}}
+    start = time.perf_counter()
+    with open(output_path, "a", encoding="utf-8") as output:
+        def write(record: dict):
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            stats["failed" if record["error"] else "succeeded"] += 1
+            for key in stats["usage"]:
+                stats["usage"][key] += record["usage"].get(key) or 0
+
+        job.wait({case["id"]: case for case in cases}, write, poll_interval, batch_records(output_path))
+    elapsed = time.perf_counter() - start
+    stats["elapsed_seconds"] = round(elapsed, 1)
+    stats["cases_per_minute"] = round((stats["succeeded"] + stats["failed"]) / len(agent_names) / elapsed * 60, 1) if elapsed else 0.0
+    return stats
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--manifest", help="JSONL file of cases")
+    source.add_argument("--images", help="directory of case images")
+    parser.add_argument("--output", required=True, help="JSONL file results are appended to")
+    parser.add_argument("--agents", default="Dermatologist AI", help='comma-separated agent names, or "all"')
+    parser.add_argument("--skin-type", default="normal", help="skin type for cases from --images")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent analyses")
+    parser.add_argument("--rpm", type=float, default=0, help="maximum model requests per minute (0 = unlimited)")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds allowed per model request")
+    parser.add_argument("--no-cache", action="store_true", help="always call the model, even for repeated cases")
+    parser.add_argument("--base-url", help="OpenAI-compatible API base URL, e.g. a local mock server")
+    parser.add_argument("--batch-api", action="store_true",
+                        help="submit through the OpenAI Batch API (half price, results within 24h)")
+    parser.add_argument("--poll-interval", type=float, default=60, help="seconds between Batch API status checks")
+    parser.add_argument("--lang", default="en", choices=list(LANGUAGES), help="language of the answers and remedy texts")
+    parser.add_argument("--structured", action="store_true",
+                        help="ask for structured findings and add them to each record as \"findings\"")
+    args = parser.parse_args(argv)
+
+    # Imported here, so --help and argument errors do not wait for the agents to load
+    from skincare_core import build_agents
+    from conversation import start_tokenizer
+    import telemetry
+
+    telemetry.start_metrics_server()
+    start_tokenizer()
+
+    client = OpenAI(base_url=args.base_url) if args.base_url else OpenAI()
+    agents = build_agents(client)
+    agent_names = list(agents) if args.agents == "all" else [name.strip() for name in args.agents.split(",")]
+    unknown = [name for name in agent_names if name not in agents]
+    if unknown:
+        parser.error(f"unknown agent(s) {', '.join(unknown)}; choose from {', '.join(agents)}")
+
+    cases = read_manifest(args.manifest) if args.manifest else read_image_dir(args.images, args.skin_type)
+    with use_language(args.lang):
+        if args.batch_api:
+            stats = run_batch_api(client, agents, cases, agent_names, args.output, args.poll_interval, args.structured)
+        else:
+            runner = BatchRunner(agents, args.output, args.workers, args.rpm, args.timeout, not args.no_cache, args.structured)
+            stats = runner.run(cases, agent_names)
+    print(json.dumps(stats, indent=2))
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,649 @@
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from dataclasses import dataclass, field
+
+import requests
+from openai import OpenAI
+
+from response_cache import ResponseCache, make_cache_key
+from semantic_cache import build_semantic_cache
+from conversation import Conversation
+from remedies import lookup_remedies
+from i18n import LANGUAGES, DEFAULT_LANGUAGE, current_language, t
+from pubmed_client import PubMedClient
+from routing import AgentPolicy, Route, choose_route, configure, load_overrides, should_fall_back
+from scheduler import RequestScheduler, background_context, estimate_tokens
+from findings import Findings, RESPONSE_FORMAT, STRUCTURED_INSTRUCTIONS, dumps, loads, parse_findings, render_markdown
+import telemetry
+
+# Agent logic shared by the Streamlit UI (main.py) and the batch CLI (skincare_batch.py).
+# Importing this module creates one response cache, PubMed client, request scheduler and tool
+# pool per process.
+response_cache = ResponseCache()
+# Optional reuse of answers to paraphrased questions; None unless SKINCARE_SEMANTIC_CACHE is set.
+# Replace it with a SemanticCache built on another embedding function to change how questions match.
+semantic_cache = build_semantic_cache()
+pubmed_client = PubMedClient()
+# Every model request from every Streamlit session waits here for rate-limit budget
+request_scheduler = RequestScheduler()
+
+# Agent tools (remedy lookups, PubMed searches) run on a shared pool alongside the model request
+TOOL_MAX_WORKERS = 8
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="skincare-tool")
+TOOL_TIMEOUT = 30  # seconds tools may take when the request itself has no timeout
+
+SKIN_TYPES = ["oily", "combination", "normal", "dry", "sensitive"]
+
+# After the first chat turn an uploaded photo is replaced by this short description, fetched in
+# the background at low detail, so follow-ups do not pay for the image again
+IMAGE_DESCRIPTION_PROMPT = (
+    "Describe the visible skin in this photo objectively in under 80 words: area of the body, "
+    "colour, texture, lesions or marks and their distribution. Do not diagnose."
+)
+IMAGE_DESCRIPTION_MODEL = "gpt-4o"
+
+
+@dataclass
+class AnalysisResult:
+    """One agent analysis: the response text plus what it cost to produce."""
+    text: str
+    model: str
+    usage: dict = field(default_factory=dict)
+    cached: bool = False
+    error: bool = False
+    route: str = ""
+    findings: Findings = None  # set for structured analyses; ``text`` is then its markdown rendering
+
+
+class ToolUnavailable(Exception):
+    """Raised by a tool that cannot answer right now; the message is shown in its place."""
+
+
+# Tool Functions
+def search_pubmed_research(topic: str) -> str:
+    """Search PubMed for dermatology research papers."""
+    try:
+        result = pubmed_client.search(topic)
+        clean_topic = topic.strip().replace(' ', '+')
+
+        if result.ids:
+            if result.titles:
+                papers = []
+                for paper_id in result.ids[:3]:
+                    if paper_id in result.titles:
+                        title = result.titles[paper_id]
+                        papers.append(f"• {title[:100]}..." if len(title) > 100 else f"• {title}")
+
+                summary = t("tool.pubmed_found", count=result.count, topic=topic) + "\n\n"
+                summary += "\n".join(papers)
+                summary += "\n\n" + t("tool.pubmed_view_all", url=f"https://pubmed.ncbi.nlm.nih.gov/?term={clean_topic}+AND+(dermatology+OR+skin+OR+skincare)")
+                return summary
+            return t("tool.pubmed_ids", count=result.count, topic=topic, ids=", ".join(result.ids[:5]))
+        else:
+            return t("tool.pubmed_none", topic=topic)
+
+    except requests.RequestException:
+        raise ToolUnavailable(t("tool.pubmed_offline")) from None
+    except Exception as e:
+        raise ToolUnavailable(t("tool.pubmed_error", error=str(e)[:100])) from e
+
+
+def get_herbal_remedies(skin_condition: str, skin_type: str) -> str:
+    """Get herbal and natural remedies for specific skin conditions."""
+    matches = lookup_remedies("herbal", skin_condition, skin_type, current_language())
+    if len(matches) == 1:
+        return t("tool.herbal_heading", condition=skin_condition) + f"\n{matches[0][1]}"
+    elif matches:
+        lines = [f"**{t('condition.' + condition, default=condition.replace('_', ' ').title())}:** {remedy}" for condition, remedy in matches]
+        return t("tool.herbal_heading", condition=skin_condition) + "\n" + "\n".join(lines)
+    
+    return t("tool.herbal_general")
+
+
+def get_home_remedies(issue: str) -> str:
+    """Get home remedies using common household items."""
+    matches = lookup_remedies("home", issue, lang=current_language())
+    if matches:
+        return "\n\n".join(remedy for _, remedy in matches)
+    
+    return t("tool.home_general")
+
+
+def get_exercise_recommendations(skin_concern: str) -> str:
+    """Get exercise recommendations for better skin health."""
+    matches = lookup_remedies("exercise", skin_concern, lang=current_language())
+    if matches:
+        return "\n\n".join(exercise for _, exercise in matches)
+    
+    return t("tool.exercise_general")
+
+
+def get_dermatologist_advice(condition: str) -> str:
+    """Provide general dermatologist-level advice (not medical diagnosis)."""
+    matches = lookup_remedies("dermatologist", condition, lang=current_language())
+    if matches:
+        return "\n\n".join(recommendation for _, recommendation in matches)
+    
+    return t("tool.dermatologist_general")
+
+
+def run_tool(function, *args) -> str:
+    """Call one tool function, timed as a "tool" span."""
+    with telemetry.span("tool", function.__name__):
+        return function(*args)
+
+
+# Agent class to simulate OpenAI Agents SDK functionality
+class SkinCareAgent:
+    def __init__(self, name: str, instructions: str, tools: list, client: OpenAI = None, policy: AgentPolicy = None):
+        self.name = name
+        self.instructions = instructions
+        self.tools = tools
+        self.client = client
+        self.policy = policy or AgentPolicy()
+    
+    def build_messages(self, user_input: str, image_data: str = None, skin_type: str = "normal", image_detail: str = "high") -> list:
+        """Build the chat messages for the OpenAI API."""
+        system_prompt = f"{self.instructions} User has {skin_type} skin type."
+        lang = current_language()
+        if lang != DEFAULT_LANGUAGE:
+            # The UI, tool results and remedies are already in this language; only the answer is left
+            system_prompt += f" Respond in {LANGUAGES.get(lang, lang)}."
+        messages = [
+            {"role": "system", "content": system_prompt},
+        ]
+        
+        # Add user message with text and optionally image
+        user_message = {"role": "user", "content": []}
+        
+        if user_input:
+            user_message["content"].append({"type": "text", "text": user_input})
+        
+        if image_data:
+            user_message["content"].append({
+                "type": "image_url",
+                "image_url": {
+                    # Accept a ready-made data URL from the preprocessing stage, or bare base64 JPEG data
+                    "url": image_data if image_data.startswith("data:") else f"data:image/jpeg;base64,{image_data}",
+                    "detail": image_detail
+                }
+            })
+        
+        # If no content parts, add default text
+        if not user_message["content"]:
+            user_message["content"] = [{"type": "text", "text": "Please provide general skincare advice."}]
+        
+        messages.append(user_message)
+        return messages
+    
+    def route(self, user_input: str, image_data: str = None, image_detail: str = "high") -> Route:
+        """Choose the model, token budget and image detail for a request under this agent's policy."""
+        route = choose_route(self.policy, user_input, image_data, image_detail)
+        telemetry.record_route(self.name, route.name, route.model)
+        return route
+    
+    def request_body(self, user_input: str, image_data: str = None, skin_type: str = "normal", image_detail: str = "high", route: Route = None, structured: bool = False) -> dict:
+        """Build the chat completion request for this agent, as sent to the API or a Batch API file.
+
+        A structured request asks for JSON matching the findings schema instead of markdown.
+        """
+        route = route or self.route(user_input, image_data, image_detail)
+        body = {
+            "model": route.model,
+            "messages": self.build_messages(user_input, image_data, skin_type, route.image_detail),
+            "max_tokens": route.max_tokens,
+            "temperature": route.temperature
+        }
+        if structured:
+            body["messages"][0]["content"] += f" {STRUCTURED_INSTRUCTIONS}"
+            body["response_format"] = RESPONSE_FORMAT
+        return body
+    
+    def complete(self, body: dict, route: Route, timeout: float = None, **options) -> tuple:
+        """Send one chat completion through the request scheduler and return (response, model used).
+
+        The scheduler waits for rate-limit budget and retries throttled attempts. When the route
+        has a fallback model, a rate-limited, overloaded or timed-out request goes to it at once
+        instead, within what is left of ``timeout``.
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        tokens = estimate_tokens(body)
+        
+        def send(model):
+            # Retries are the scheduler's job, and each attempt only gets the time that is left
+            client_options = {"timeout": max(1.0, deadline - time.monotonic())} if deadline else {}
+            api_client = self.client.with_options(max_retries=0, **client_options)
+            return api_client.chat.completions.create(**dict(body, model=model), **options)
+        
+        model = body["model"]
+        try:
+            retries = 0 if route.fallback_model else None
+            return request_scheduler.call(model, tokens, lambda: send(model), retries, deadline), model
+        except Exception as e:
+            if not route.fallback_model or not should_fall_back(e) or (deadline and deadline - time.monotonic() < 1):
+                raise
+            telemetry.record_fallback(self.name, model, route.fallback_model, type(e).__name__)
+        model = route.fallback_model
+        return request_scheduler.call(model, tokens, lambda: send(model), deadline=deadline), model
+    
+    def stream(self, body: dict, route: Route, timeout: float = None, **span_fields):
+        """Stream one chat completion as text deltas, recording its token usage and latency.
+
+        Fallback and retries are ``complete``'s; errors are left to the caller.
+        """
+        start = time.perf_counter()
+        usage = {}
+        with telemetry.span("model", self.name, model=body["model"], route=route.name, stream=True, **span_fields) as span:
+            # With include_usage the final chunk reports token usage
+            stream, model = self.complete(body, route, timeout, stream=True, stream_options={"include_usage": True})
+            span.set(model=model)
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                if chunk.usage:
+                    usage = chunk.usage.model_dump(exclude_none=True)
+                    span.set(prompt_tokens=usage.get("prompt_tokens"), completion_tokens=usage.get("completion_tokens"))
+                    telemetry.record_usage(self.name, model, usage)
+        telemetry.record_route_result(route.name, model, time.perf_counter() - start, usage)
+    
+    def combine(self, base_response: str, tool_results: list) -> str:
+        """Append tool results to the model's response."""
+        if tool_results:
+            return f"{base_response}\n\n" + "\n\n".join(tool_results)
+        return base_response
+    
+    def structure(self, content: str, tool_results: list) -> Findings:
+        """Parse a structured reply into Findings, with the tool results as notes."""
+        try:
+            findings = parse_findings(content, self.name)
+        except ValueError:
+            # e.g. a refusal or a reply cut off at max_tokens; the text is still worth showing
+            findings = Findings(summary=content, agents=[self.name])
+        findings.notes.extend(tool_results)
+        return findings
+    
+    def tool_calls(self, user_input: str, skin_type: str = "normal") -> list:
+        """Return the tool calls this agent makes, as (function, args) pairs in display order."""
+        calls = []
+        if not user_input:
+            return calls
+        if "herbal" in self.name.lower():
+            calls.append((get_herbal_remedies, (user_input, skin_type)))
+        
+        if "home" in self.name.lower():
+            calls.append((get_home_remedies, (user_input,)))
+        
+        if "exercise" in self.name.lower():
+            calls.append((get_exercise_recommendations, (user_input,)))
+        
+        if "dermatologist" in self.name.lower():
+            calls.append((get_dermatologist_advice, (user_input,)))
+        
+        if "research" in self.name.lower():
+            calls.append((search_pubmed_research, (user_input,)))
+        
+        return calls
+    
+    def start_tools(self, user_input: str, skin_type: str = "normal") -> list:
+        """Start this agent's tools in the background so they overlap with the model request."""
+        # Each tool runs in a copy of the caller's context so its span joins the caller's trace
+        return [
+            tool_executor.submit(contextvars.copy_context().run, run_tool, function, *args)
+            for function, args in self.tool_calls(user_input, skin_type)
+        ]
+    
+    def run_tools(self, user_input: str, skin_type: str = "normal", timeout: float = None) -> tuple:
+        """Apply tools based on agent type; returns ``tool_results``' (results, complete) pair."""
+        return self.tool_results(self.start_tools(user_input, skin_type), time.monotonic() + (timeout or TOOL_TIMEOUT))
+    
+    def tool_results(self, tool_futures: list, deadline: float) -> tuple:
+        """Wait for started tools until ``deadline`` (a ``time.monotonic()`` value).
+
+        A tool still running then is abandoned and reported as timed out, so a slow lookup
+        never holds the answer back longer than the request's own timeout. A tool that raises
+        is reported in its place too, and never costs the model's answer.
+
+        Returns (results, complete). ``complete`` is False when a tool timed out or failed;
+        such an answer is not cached, since the failure is usually a passing one.
+        """
+        results = []
+        complete = True
+        for future in tool_futures:
+            try:
+                results.append(future.result(timeout=max(0.0, deadline - time.monotonic())))
+                continue
+            except FuturesTimeoutError:
+                future.cancel()
+                results.append(t("tool.timeout"))
+            except ToolUnavailable as e:
+                results.append(str(e))
+            except Exception:
+                # The tool's span has recorded the error
+                results.append(t("tool.failed"))
+            complete = False
+        return results, complete
+    
+    def format_error(self, error: Exception) -> str:
+        """Turn an API error into a user-facing message."""
+        error_msg = str(error)
+        if "timed out" in error_msg.lower() or "timeout" in error_msg.lower():
+            return t("error.timeout", agent=self.name)
+        elif "model" in error_msg.lower() and "not found" in error_msg.lower():
+            return t("error.model", agent=self.name)
+        elif "quota" in error_msg.lower() or "rate" in error_msg.lower():
+            return t("error.quota")
+        elif "invalid" in error_msg.lower() and "key" in error_msg.lower():
+            return t("error.api_key")
+        else:
+            return t("error.other", agent=self.name, error=error_msg)
+    
+    def cache_key(self, user_input: str, image_data: str = None, skin_type: str = "normal", model: str = "", image_detail: str = "high", output: str = "text") -> str:
+        """Content-addressed cache key for a request to this agent, in the current language."""
+        return make_cache_key(self.name, self.instructions, skin_type, user_input, image_data, model, image_detail, current_language(), output)
+    
+    def semantic_lookup(self, user_input: str, image_data: str = None, skin_type: str = "normal") -> tuple:
+        """Return (stored model answer or None, question vector) from the semantic cache.
+
+        Image requests are never matched, since the answer depends on the picture.
+        """
+        if semantic_cache is None or image_data or not (user_input or "").strip():
+            return None, None
+        try:
+            answer, _similarity, vector = semantic_cache.lookup(self.name, skin_type, user_input, current_language())
+        except Exception:
+            return None, None  # e.g. the embeddings endpoint is unreachable; fall through to the model
+        telemetry.record_cache_lookup(self.name, answer is not None, "semantic")
+        return answer, vector
+    
+    def semantic_store(self, user_input: str, skin_type: str, answer: str, vector):
+        """Index the model's answer (without tool results) under the question's vector."""
+        if vector is not None:
+            try:
+                semantic_cache.add(self.name, skin_type, user_input, answer, vector, current_language())
+            except OSError:
+                pass  # the index is best effort
+    
+    def analyze(self, user_input: str, image_data: str = None, skin_type: str = "normal", timeout: float = None, use_cache: bool = True, image_detail: str = "high", structured: bool = False):
+        """Analyze user input and provide specialized advice: markdown text, or Findings when ``structured``."""
+        result = self.run(user_input, image_data, skin_type, timeout, use_cache, image_detail, structured)
+        if structured:
+            return result.findings or Findings(summary=result.text, agents=[self.name])
+        return result.text
+    
+    def run(self, user_input: str, image_data: str = None, skin_type: str = "normal", timeout: float = None, use_cache: bool = True, image_detail: str = "high", structured: bool = False) -> AnalysisResult:
+        """Analyze user input and return the response together with the model's token usage.
+
+        With ``structured`` the model answers in the findings schema; the result then carries
+        the parsed Findings as well. Structured answers are cached apart from markdown ones
+        and never matched semantically.
+        """
+        route = self.route(user_input, image_data, image_detail)
+        model = route.model
+        key = self.cache_key(user_input, image_data, skin_type, model, route.image_detail, "findings" if structured else "text")
+        if use_cache:
+            cached = response_cache.get(key)
+            telemetry.record_cache_lookup(self.name, cached is not None)
+            if cached is not None and structured:
+                findings = loads(cached)
+                return AnalysisResult(render_markdown(findings), model, cached=True, route=route.name, findings=findings)
+            if cached is not None:
+                return AnalysisResult(cached, model, cached=True, route=route.name)
+        
+        vector = None
+        if use_cache and not structured:
+            answer, vector = self.semantic_lookup(user_input, image_data, skin_type)
+            if answer is not None:
+                # Only the model's part is reused; tools run again for the new wording
+                tool_results, complete = self.run_tools(user_input, skin_type, timeout)
+                combined_response = self.combine(answer, tool_results)
+                if complete:
+                    response_cache.set(key, combined_response)
+                return AnalysisResult(combined_response, model, cached=True, route=route.name)
+        
+        # Tools do not depend on the model's answer, so they run while the request is in flight
+        tool_futures = self.start_tools(user_input, skin_type)
+        tool_deadline = time.monotonic() + (timeout or TOOL_TIMEOUT)
+        
+        try:
+            # A per-call timeout keeps one slow agent from holding up a full consultation
+            start = time.perf_counter()
+            with telemetry.span("model", self.name, model=model, route=route.name, image_chars=len(image_data or "")) as span:
+                response, model = self.complete(self.request_body(user_input, image_data, skin_type, image_detail, route, structured), route, timeout)
+                usage = response.usage.model_dump(exclude_none=True) if response.usage else {}
+                span.set(model=model, prompt_tokens=usage.get("prompt_tokens"), completion_tokens=usage.get("completion_tokens"))
+            telemetry.record_usage(self.name, model, usage)
+            telemetry.record_route_result(route.name, model, time.perf_counter() - start, usage)
+            
+            tool_results, complete = self.tool_results(tool_futures, tool_deadline)
+            if structured:
+                message = response.choices[0].message
+                findings = self.structure(message.content or message.refusal or "", tool_results)
+                if complete:
+                    response_cache.set(key, dumps(findings))
+                return AnalysisResult(render_markdown(findings), model, usage, route=route.name, findings=findings)
+            
+            combined_response = self.combine(response.choices[0].message.content, tool_results)
+            if complete:
+                response_cache.set(key, combined_response)
+            self.semantic_store(user_input, skin_type, response.choices[0].message.content, vector)
+            return AnalysisResult(combined_response, model, usage, route=route.name)
+            
+        except Exception as e:
+            for future in tool_futures:
+                future.cancel()
+            return AnalysisResult(self.format_error(e), model, error=True, route=route.name)
+    
+    def analyze_stream(self, user_input: str, image_data: str = None, skin_type: str = "normal", timeout: float = None, use_cache: bool = True, image_detail: str = "high"):
+        """Stream the analysis as text deltas, followed by the tool results once the model is done."""
+        route = self.route(user_input, image_data, image_detail)
+        model = route.model
+        key = self.cache_key(user_input, image_data, skin_type, model, route.image_detail)
+        if use_cache:
+            cached = response_cache.get(key)
+            telemetry.record_cache_lookup(self.name, cached is not None)
+            if cached is not None:
+                yield cached
+                return
+        
+        vector = None
+        if use_cache:
+            answer, vector = self.semantic_lookup(user_input, image_data, skin_type)
+            if answer is not None:
+                tool_results, complete = self.run_tools(user_input, skin_type, timeout)
+                combined_response = self.combine(answer, tool_results)
+                if complete:
+                    response_cache.set(key, combined_response)
+                yield combined_response
+                return
+        
+        tool_futures = self.start_tools(user_input, skin_type)
+        tool_deadline = time.monotonic() + (timeout or TOOL_TIMEOUT)
+        parts = []
+        
+        try:
+            body = self.request_body(user_input, image_data, skin_type, image_detail, route)
+            for delta in self.stream(body, route, timeout, image_chars=len(image_data or "")):
+                parts.append(delta)
+                yield delta
+        except Exception as e:
+            for future in tool_futures:
+                future.cancel()
+            yield self.format_error(e)
+            return
+        
+        self.semantic_store(user_input, skin_type, "".join(parts), vector)
+        # Tools ran alongside the stream; their results are appended once it has closed
+        tool_results, complete = self.tool_results(tool_futures, tool_deadline)
+        for tool_result in tool_results:
+            parts.append(f"\n\n{tool_result}")
+            yield f"\n\n{tool_result}"
+        
+        if complete:
+            response_cache.set(key, "".join(parts))
+    
+    def describe_image(self, image_data: str) -> str:
+        """Return a compact text description of an image, cached like any other answer."""
+        key = make_cache_key("image description", IMAGE_DESCRIPTION_PROMPT, "", "", image_data, IMAGE_DESCRIPTION_MODEL, "low")
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+        body = {
+            "model": IMAGE_DESCRIPTION_MODEL,
+            "messages": [{"role": "user", "content": [
+                {"type": "text", "text": IMAGE_DESCRIPTION_PROMPT},
+                {"type": "image_url", "image_url": {
+                    "url": image_data if image_data.startswith("data:") else f"data:image/jpeg;base64,{image_data}",
+                    "detail": "low"
+                }},
+            ]}],
+            "max_tokens": 150,
+            "temperature": 0
+        }
+        with telemetry.span("model", "image description", model=IMAGE_DESCRIPTION_MODEL) as span:
+            response = request_scheduler.call(
+                IMAGE_DESCRIPTION_MODEL, estimate_tokens(body),
+                lambda: self.client.with_options(max_retries=0).chat.completions.create(**body)
+            )
+            usage = response.usage.model_dump(exclude_none=True) if response.usage else {}
+            span.set(prompt_tokens=usage.get("prompt_tokens"), completion_tokens=usage.get("completion_tokens"))
+        telemetry.record_usage("image description", IMAGE_DESCRIPTION_MODEL, usage)
+        description = response.choices[0].message.content.strip()
+        response_cache.set(key, description)
+        return description
+    
+    def chat(self, conversation: Conversation, user_input: str, image_data: str = None, skin_type: str = "normal", timeout: float = None, image_detail: str = "high"):
+        """Stream a reply to one chat turn, with the earlier turns of ``conversation`` as context.
+
+        An image is only sent the first time it appears in the conversation. Tool results are
+        shown with the reply but kept out of the conversation, so they are not resent each turn.
+        """
+        send_image = conversation.take_image(image_data)
+        route = self.route(user_input, image_data if send_image else None, image_detail)
+        body = self.request_body(user_input, image_data if send_image else None, skin_type, image_detail, route)
+        messages = body["messages"]
+        note = conversation.context_note()
+        if note:
+            messages[0]["content"] += f"\n\n{note}"
+        messages[1:1] = conversation.messages()
+        
+        tool_futures = self.start_tools(user_input, skin_type)
+        tool_deadline = time.monotonic() + (timeout or TOOL_TIMEOUT)
+        parts = []
+        try:
+            for delta in self.stream(body, route, timeout, chat_turns=len(conversation.turns)):
+                parts.append(delta)
+                yield delta
+        except Exception as e:
+            for future in tool_futures:
+                future.cancel()
+            if send_image:
+                conversation.image = ""  # not seen by the model, so send it again next turn
+            yield self.format_error(e)
+            return
+        
+        if send_image:
+            # The shared pool's threads serve every session, so the description reports no queue position
+            conversation.image_description = tool_executor.submit(background_context().run, self.describe_image, image_data)
+        conversation.add("user", user_input or "(photo)")
+        conversation.add("assistant", "".join(parts))
+        for tool_result in self.tool_results(tool_futures, tool_deadline)[0]:
+            yield f"\n\n{tool_result}"
+
+
+# Define specialized agents
+def build_agents(client: OpenAI) -> dict:
+    """Build the specialist agents, all sending their requests through ``client``.
+
+    Each agent has a routing policy sized to its job: the vision and dermatology agents keep
+    the full budget and high image detail, the lifestyle agents answer in fewer tokens.
+    """
+    overrides = load_overrides()
+    return {
+        "Vision Expert": SkinCareAgent(
+            name="Vision Skincare Expert", 
+            instructions="You are a professional skincare consultant. Analyze the uploaded image and provide detailed, safe skincare advice. Focus on identifying visible skin conditions and recommend appropriate treatments. Always advise consulting a dermatologist for serious conditions.",
+            tools=["image_analysis"],
+            client=client,
+            policy=configure("Vision Expert", AgentPolicy(max_tokens=1500, short_max_tokens=800), overrides)
+        ),
+        "Herbal Specialist": SkinCareAgent(
+            name="Herbal Skincare Specialist",
+            instructions="You are an expert in natural and herbal skincare remedies. Provide safe, natural, plant-based solutions for skin concerns. Focus on herbs, essential oils, and natural ingredients. Always mention patch testing for new ingredients.",
+            tools=["herbal_remedies"],
+            client=client,
+            policy=configure("Herbal Specialist", AgentPolicy(max_tokens=1000, short_max_tokens=500, image_detail="low"), overrides)
+        ),
+        "Home Remedy Expert": SkinCareAgent(
+            name="Home Remedy Expert",
+            instructions="You specialize in home-based skincare solutions using common household items. Provide practical, accessible remedies that people can easily make at home. Focus on kitchen ingredients and DIY treatments.",
+            tools=["home_remedies"],
+            client=client,
+            policy=configure("Home Remedy Expert", AgentPolicy(max_tokens=800, short_max_tokens=400, image_detail="low"), overrides)
+        ),
+        "Exercise & Wellness": SkinCareAgent(
+            name="Exercise & Wellness Coach",
+            instructions="You focus on how physical activity, stress management, and lifestyle factors affect skin health. Provide exercise recommendations and wellness tips that improve skin from the inside out.",
+            tools=["exercise_recommendations"],
+            client=client,
+            policy=configure("Exercise & Wellness", AgentPolicy(max_tokens=800, short_max_tokens=400, image_detail="low"), overrides)
+        ),
+        "Dermatologist AI": SkinCareAgent(
+            name="Dermatologist AI Advisor",
+            instructions="You provide professional dermatological insights and advice. Focus on evidence-based recommendations, product suggestions, and when to seek professional medical help. Never provide medical diagnoses.",
+            tools=["dermatologist_advice"],
+            client=client,
+            policy=configure("Dermatologist AI", AgentPolicy(max_tokens=1500, short_max_tokens=700), overrides)
+        ),
+        "Research Assistant": SkinCareAgent(
+            name="Research Assistant",
+            instructions="You help find and summarize relevant dermatological research and scientific studies. Provide evidence-based information and cite scientific findings when possible.",
+            tools=["research"],
+            client=client,
+            policy=configure("Research Assistant", AgentPolicy(max_tokens=1200, short_max_tokens=600, image_detail="low"), overrides)
+        )
+    }
+
+
+# Full consultation settings
+CONSULTATION_TIMEOUT = 60  # seconds allowed per agent
+CONSULTATION_MAX_WORKERS = 6
+# Ask the specialists for structured findings, merged locally into one report (SKINCARE_STRUCTURED_OUTPUT=1);
+# off by default, so full consultations keep each specialist's own markdown answer
+CONSULTATION_STRUCTURED = os.getenv("SKINCARE_STRUCTURED_OUTPUT", "0").lower() not in ("0", "false", "no", "off")
+
+
+def run_consultation(agents: dict, agent_names: list, user_input: str, image_data: str = None, skin_type: str = "normal", timeout: float = CONSULTATION_TIMEOUT, use_cache: bool = True, image_detail: str = "high", structured: bool = False):
+    """Run several agents in parallel and yield (agent_name, response) as each one finishes.
+
+    Responses are markdown text, or Findings when ``structured``; merge those with ``findings.merge_findings``.
+    """
+    executor = ThreadPoolExecutor(max_workers=max(1, min(len(agent_names), CONSULTATION_MAX_WORKERS)))
+    futures = {
+        executor.submit(contextvars.copy_context().run, agents[name].analyze, user_input, image_data, skin_type, timeout, use_cache, image_detail, structured): name
+        for name in agent_names
+    }
+    finished = set()
+    try:
+        # Small grace period on top of the per-agent API timeout
+        for future in as_completed(futures, timeout=timeout + 5):
+            finished.add(future)
+            yield futures[future], future.result()
+    except FuturesTimeoutError:
+        for future, name in futures.items():
+            if future in finished:
+                continue
+            if future.done():
+                yield name, future.result()
+            else:
+                message = t("error.consultation_timeout", agent=name, seconds=timeout)
+                yield name, Findings(summary=message, agents=[name]) if structured else message
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def merge_consultation(results: dict, agent_names: list) -> str:
+    """Merge the responses of several agents into one report, in the order they were selected."""
+    sections = [f"### 🤖 {name}\n\n{results[name]}" for name in agent_names if name in results]
+    return "\n\n---\n\n".join(sections)
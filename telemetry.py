@@ -0,0 +1,238 @@
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Telemetry settings, overridable through the environment. When disabled, span() hands back a
+# shared no-op object, so instrumented code pays for one function call and nothing else.
+TELEMETRY_ENABLED = os.getenv("SKINCARE_TELEMETRY", "").lower() in ("1", "true", "yes", "on")
+METRICS_PORT = int(os.getenv("SKINCARE_METRICS_PORT", "0"))  # 0 disables the /metrics endpoint
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = (16e3, 64e3, 256e3, 1e6, 4e6, 16e6)
+
+
+class Counter:
+    """Monotonic counter with labels, rendered in Prometheus text format."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative histogram with labels, rendered in Prometheus text format."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), key + (str(bound),))} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+SPAN_SECONDS = Histogram("skincare_span_duration_seconds", "Duration of instrumented operations", ("span", "name"))
+ERRORS = Counter("skincare_errors_total", "Failed instrumented operations by error class", ("span", "name", "error"))
+TOKENS = Counter("skincare_tokens_total", "Model tokens used", ("agent", "model", "kind"))
+IMAGE_BYTES = Histogram("skincare_image_bytes", "Image payload size", ("stage",), BYTES_BUCKETS)
+CACHE_LOOKUPS = Counter("skincare_cache_lookups_total", "Response cache lookups", ("agent", "tier", "result"))
+# Per-route metrics, so latency and cost can be compared between routing decisions
+ROUTES = Counter("skincare_route_decisions_total", "Model routing decisions", ("agent", "route", "model"))
+ROUTE_SECONDS = Histogram("skincare_route_duration_seconds", "Model request latency per route", ("route", "model"))
+ROUTE_TOKENS = Counter("skincare_route_tokens_total", "Model tokens used per route", ("route", "model", "kind"))
+FALLBACKS = Counter("skincare_model_fallbacks_total", "Requests retried on a fallback model", ("agent", "model", "fallback", "error"))
+# Request scheduler: time spent queued for a rate-limit slot, and retried API errors
+QUEUE_SECONDS = Histogram("skincare_queue_wait_seconds", "Time requests waited for rate-limit budget", ("model",))
+RETRIES = Counter("skincare_api_retries_total", "Model requests retried after a throttled or failed attempt", ("model", "status"))
+METRICS = [SPAN_SECONDS, ERRORS, TOKENS, IMAGE_BYTES, CACHE_LOOKUPS, ROUTES, ROUTE_SECONDS, ROUTE_TOKENS, FALLBACKS,
+           QUEUE_SECONDS, RETRIES]
+
+# Spans finished while a trace() block is active are collected here, including spans from
+# tool threads started with contextvars.copy_context()
+_current_trace = contextvars.ContextVar("skincare_trace", default=None)
+
+
+class Span:
+    """One timed operation. Attributes set on it show up in the debug panel."""
+
+    def __init__(self, kind: str, name: str, attributes: dict):
+        self.kind = kind
+        self.name = name
+        self.attributes = attributes
+        self.error = None
+        self.start = 0.0
+        self.duration = 0.0
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        SPAN_SECONDS.observe(self.duration, span=self.kind, name=self.name)
+        if exc_type is not None:
+            self.error = exc_type.__name__
+            ERRORS.inc(span=self.kind, name=self.name, error=self.error)
+        spans = _current_trace.get()
+        if spans is not None:
+            spans.append(self)
+        return False
+
+
+class _NoopSpan:
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def span(kind: str, name: str = "", **attributes):
+    """Time a block of code: ``with span("tool", "search_pubmed_research") as s: ...``."""
+    if not TELEMETRY_ENABLED:
+        return NOOP_SPAN
+    return Span(kind, name, attributes)
+
+
+def record_usage(agent: str, model: str, usage: dict):
+    """Count the prompt and completion tokens reported for one model call."""
+    if TELEMETRY_ENABLED and usage:
+        TOKENS.inc(usage.get("prompt_tokens") or 0, agent=agent, model=model, kind="prompt")
+        TOKENS.inc(usage.get("completion_tokens") or 0, agent=agent, model=model, kind="completion")
+
+
+def record_cache_lookup(agent: str, hit: bool, tier: str = "exact"):
+    if TELEMETRY_ENABLED:
+        CACHE_LOOKUPS.inc(agent=agent, tier=tier, result="hit" if hit else "miss")
+
+
+def record_route(agent: str, route: str, model: str):
+    if TELEMETRY_ENABLED:
+        ROUTES.inc(agent=agent, route=route, model=model)
+
+
+def record_route_result(route: str, model: str, seconds: float, usage: dict):
+    """Record the latency and tokens of one model request under the route that chose it."""
+    if TELEMETRY_ENABLED:
+        ROUTE_SECONDS.observe(seconds, route=route, model=model)
+        if usage:
+            ROUTE_TOKENS.inc(usage.get("prompt_tokens") or 0, route=route, model=model, kind="prompt")
+            ROUTE_TOKENS.inc(usage.get("completion_tokens") or 0, route=route, model=model, kind="completion")
+
+
+def record_fallback(agent: str, model: str, fallback: str, error: str):
+    if TELEMETRY_ENABLED:
+        FALLBACKS.inc(agent=agent, model=model, fallback=fallback, error=error)
+
+
+def record_queue_wait(model: str, seconds: float):
+    if TELEMETRY_ENABLED:
+        QUEUE_SECONDS.observe(seconds, model=model)
+
+
+def record_retry(model: str, status):
+    if TELEMETRY_ENABLED:
+        RETRIES.inc(model=model, status=str(status or "connection"))
+
+
+def record_image_bytes(stage: str, size: int):
+    if TELEMETRY_ENABLED:
+        IMAGE_BYTES.observe(size, stage=stage)
+
+
+@contextmanager
+def trace():
+    """Collect every span finished inside the block, for the last-request breakdown."""
+    spans = []
+    token = _current_trace.set(spans)
+    try:
+        yield spans
+    finally:
+        _current_trace.reset(token)
+
+
+def render_metrics() -> str:
+    """Return every metric in Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int = METRICS_PORT):
+    """Serve /metrics for Prometheus on a background thread; returns None if disabled."""
+    if not (TELEMETRY_ENABLED and port):
+        return None
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="skincare-metrics", daemon=True).start()
+    return server
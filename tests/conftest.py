@@ -0,0 +1,58 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+
+# The project modules read their settings at import time; keep the tests off the network and disk
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ["SKINCARE_PUBMED_RATE"] = "1000"
+os.environ["SKINCARE_CACHE_DB"] = ""
+os.environ["SKINCARE_HISTORY_DB"] = ""
+os.environ.pop("SKINCARE_SEMANTIC_CACHE", None)
+
+from mock_backend import MockBackend, MockConfig  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def mock_backend():
+    """The deterministic OpenAI/PubMed mock from the benchmarks, fast enough for tests."""
+    config = MockConfig(latency=0, tokens_per_second=1e6, completion_tokens=20, pubmed_latency=0,
+                        unknown_models=("missing-model",))
+    with MockBackend(config) as backend:
+        yield backend
+
+
+@pytest.fixture
+def openai_client(mock_backend):
+    from openai import OpenAI
+
+    return OpenAI(base_url=f"{mock_backend.url}/v1", max_retries=0)
+
+
+class TrackedConnection(sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        super().close()
+
+
+@pytest.fixture
+def sqlite_connections(monkeypatch):
+    """Record every SQLite connection opened from here on, to check that each one is closed."""
+    opened = []
+    connect = sqlite3.connect
+
+    def tracked(*args, **kwargs):
+        conn = connect(*args, factory=TrackedConnection, **kwargs)
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(sqlite3, "connect", tracked)
+    return opened
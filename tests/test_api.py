@@ -0,0 +1,100 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+import requests
+import uvicorn
+
+import api
+import skincare_core
+from api import Coalescer
+
+
+@pytest.fixture
+def server(openai_client):
+    """Serve the API on a background thread, its agents pointed at the mock backend."""
+    server = uvicorn.Server(uvicorn.Config(api.create_app(skincare_core.build_agents(openai_client)),
+                                           host="127.0.0.1", port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}"
+    server.should_exit = True
+    thread.join()
+
+
+def events(response) -> list:
+    return [(block.split("\n")[0].removeprefix("event: "), json.loads(block.split("\n")[1].removeprefix("data: ")))
+            for block in response.text.split("\n\n") if block]
+
+
+def test_a_configured_token_is_required_on_every_v1_endpoint(server, monkeypatch):
+    monkeypatch.setattr(api, "API_TOKEN", "secret")
+    body = {"agent": "Dermatologist AI", "text": "acne on my forehead"}
+
+    assert requests.get(f"{server}/v1/agents").status_code == 401
+    assert requests.get(f"{server}/v1/stats", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert requests.post(f"{server}/v1/analyze", json=body).status_code == 401
+    assert requests.post(f"{server}/v1/analyze/stream", json=body).status_code == 401
+    assert requests.get(f"{server}/health").status_code == 200
+
+    response = requests.get(f"{server}/v1/agents", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert "Dermatologist AI" in [agent["key"] for agent in response.json()["agents"]]
+
+
+def test_analysis_is_streamed_as_server_sent_events(server):
+    response = requests.post(f"{server}/v1/analyze/stream", json={
+        "agent": "Dermatologist AI", "text": "dry patches on my cheeks", "use_cache": False,
+    })
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    received = events(response)
+    assert [name for name, _data in received[:-1]] == ["delta"] * (len(received) - 1)
+    assert received[-1] == ("done", {"agent": "Dermatologist AI"})
+    assert "".join(data["text"] for _name, data in received[:-1]).strip()
+
+
+def test_concurrent_identical_calls_share_one_run():
+    coalescer = Coalescer(workers=4)
+    runs = []
+
+    def slow(question):
+        runs.append(question)
+        time.sleep(0.1)
+        return question.upper()
+
+    async def main():
+        return await asyncio.gather(*(coalescer.call("same", slow, "acne") for _ in range(5)),
+                                    coalescer.call("other", slow, "eczema"))
+
+    assert asyncio.run(main()) == ["ACNE"] * 5 + ["ECZEMA"]
+    assert sorted(runs) == ["acne", "eczema"]
+    assert coalescer.stats() == {"calls": 2, "coalesced": 4, "in_flight": 0}
+
+
+def test_streams_that_join_late_replay_what_was_already_sent():
+    coalescer = Coalescer(workers=4)
+    started = threading.Event()
+
+    def produce():
+        yield "first "
+        started.set()
+        time.sleep(0.1)
+        yield "second"
+
+    async def collect() -> str:
+        return "".join([item async for item in coalescer.stream("same", produce)])
+
+    async def main():
+        leader = asyncio.ensure_future(collect())
+        # The follower joins once the first item has been sent
+        await asyncio.get_running_loop().run_in_executor(None, started.wait)
+        return await asyncio.gather(leader, collect())
+
+    assert asyncio.run(main()) == ["first second"] * 2
+    assert coalescer.stats()["calls"] == 1 and coalescer.stats()["coalesced"] == 1
@@ -0,0 +1,133 @@
+import json
+
+import pytest
+
+import batch_api
+import skincare_batch
+import skincare_core
+from batch_api import BatchJob, task_id
+from routing import AgentPolicy
+
+CASES = [
+    {"id": "1", "text": "acne on my forehead", "image": None, "skin_type": "oily"},
+    {"id": "2", "text": "dry patches on my cheeks", "image": None, "skin_type": "dry"},
+    {"id": "3", "text": "dark spots", "image": None, "skin_type": "normal"},
+]
+
+
+@pytest.fixture
+def agents(openai_client):
+    agents = skincare_core.build_agents(openai_client)
+    # The mock backend answers 404 for this model, so its requests land in the error file
+    agents["Broken"] = skincare_core.SkinCareAgent(
+        "Broken Agent", "You always fail.", [], openai_client, AgentPolicy(text_model="missing-model", fallback=False)
+    )
+    return agents
+
+
+def tasks(agent_names: list) -> list:
+    return [(case, name) for case in CASES for name in agent_names]
+
+
+def read_records(path) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_tasks_are_split_into_chunks_within_the_limits(agents, openai_client, mock_backend, tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_api, "BATCH_MAX_REQUESTS", 2)
+    job = BatchJob(openai_client, agents, str(tmp_path / "state.json"))
+    assert job.submit(tasks(["Dermatologist AI", "Home Remedy Expert"]), skincare_batch.load_case_image) == 3
+
+    sizes = [len(mock_backend.server.files[chunk["input_file_id"]].splitlines()) for chunk in job.state["chunks"]]
+    assert sizes == [2, 2, 2]
+    assert [custom_id for chunk in job.state["chunks"] for custom_id in chunk["custom_ids"]] == [
+        task_id(case["id"], name) for case, name in tasks(["Dermatologist AI", "Home Remedy Expert"])
+    ]
+
+    monkeypatch.setattr(batch_api, "BATCH_MAX_REQUESTS", 50000)
+    monkeypatch.setattr(batch_api, "BATCH_MAX_BYTES", 1)
+    job = BatchJob(openai_client, agents, str(tmp_path / "bytes.json"))
+    # Every line is over the byte limit, so each one gets a chunk of its own
+    assert job.submit(tasks(["Dermatologist AI"]), skincare_batch.load_case_image) == 3
+
+
+def test_a_restarted_job_resumes_from_its_state_file(agents, openai_client, tmp_path):
+    state_path = str(tmp_path / "state.json")
+    first = BatchJob(openai_client, agents, state_path)
+    assert first.submit(tasks(["Dermatologist AI"]), skincare_batch.load_case_image) == 1
+
+    resumed = BatchJob(openai_client, agents, state_path)
+    assert resumed.state == first.state
+    # Tasks already in a submitted chunk are not submitted again
+    assert resumed.submit(tasks(["Dermatologist AI"]), skincare_batch.load_case_image) == 0
+    assert resumed.outstanding() == 1
+
+    records = []
+    resumed.wait({case["id"]: case for case in CASES}, records.append, poll_interval=0)
+    assert sorted(record["id"] for record in records) == ["1", "2", "3"]
+    assert BatchJob(openai_client, agents, state_path).state["chunks"][0]["collected"]
+
+
+def test_output_and_error_files_are_collected(agents, openai_client, tmp_path):
+    job = BatchJob(openai_client, agents, str(tmp_path / "state.json"))
+    job.submit(tasks(["Dermatologist AI", "Broken"]), skincare_batch.load_case_image)
+    records = []
+    job.wait({case["id"]: case for case in CASES}, records.append, poll_interval=0)
+
+    assert len(records) == 6
+    chunk = job.state["chunks"][0]
+    assert chunk["status"] == "completed" and chunk["output_file_id"] and chunk["error_file_id"]
+    failed = [record for record in records if record["error"]]
+    assert sorted(record["id"] for record in failed) == ["1", "2", "3"]
+    assert {record["agent"] for record in failed} == {"Broken"}
+    assert all("missing-model" in record["response"] for record in failed)
+
+    # Failed tasks are submitted again on the next run; the succeeded ones are not
+    assert job.submitted() == set()
+    assert job.submit(tasks(["Broken"]), skincare_batch.load_case_image) == 1
+
+
+def test_records_get_the_same_tool_post_processing_as_run(agents, openai_client, tmp_path):
+    job = BatchJob(openai_client, agents, str(tmp_path / "state.json"))
+    agent = agents["Home Remedy Expert"]
+    content = "Rinse with lukewarm water."
+    output = {"custom_id": task_id("2", "Home Remedy Expert"), "response": {"status_code": 200, "body": {
+        "model": "gpt-4o-mini", "usage": {"total_tokens": 12},
+        "choices": [{"message": {"role": "assistant", "content": content}}],
+    }}}
+
+    record = job._record(output, {case["id"]: case for case in CASES}, "batch-1")
+    tool_results, _complete = agent.run_tools(CASES[1]["text"], CASES[1]["skin_type"])
+    assert record["response"] == agent.combine(content, tool_results)
+    assert record["response"] != content
+    assert record["error"] is False and record["batch_id"] == "batch-1" and record["usage"] == {"total_tokens": 12}
+
+    structured = BatchJob(openai_client, agents, str(tmp_path / "structured.json"), structured=True)
+    record = structured._record(output, {case["id"]: case for case in CASES})
+    assert record["findings"]["notes"] == tool_results
+
+    # Results for cases that are no longer in the input are dropped
+    assert job._record(dict(output, custom_id=task_id("gone", "Home Remedy Expert")), {}) is None
+
+
+def test_a_crash_before_the_state_is_saved_writes_no_duplicates(agents, openai_client, tmp_path, monkeypatch):
+    output_path = str(tmp_path / "results.jsonl")
+    save = BatchJob.save
+
+    def crash_once_collected(job):
+        if any(chunk["collected"] for chunk in job.state["chunks"]):
+            raise KeyboardInterrupt
+        save(job)
+
+    monkeypatch.setattr(BatchJob, "save", crash_once_collected)
+    with pytest.raises(KeyboardInterrupt):
+        skincare_batch.run_batch_api(openai_client, agents, CASES, ["Dermatologist AI", "Broken"], output_path, 0)
+    assert len(read_records(output_path)) == 6
+
+    monkeypatch.setattr(BatchJob, "save", save)
+    stats = skincare_batch.run_batch_api(openai_client, agents, CASES, ["Dermatologist AI", "Broken"], output_path, 0)
+    records = read_records(output_path)
+    assert len(records) == 6
+    assert len({(record["id"], record["agent"]) for record in records}) == 6
+    assert stats["succeeded"] == stats["failed"] == 0
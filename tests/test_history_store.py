@@ -0,0 +1,93 @@
+import sqlite3
+import threading
+import time
+
+import history_store
+from history_store import HistoryStore
+
+
+def make_store(tmp_path, **options) -> HistoryStore:
+    return HistoryStore(str(tmp_path / "history.db"), flush_interval=0.01, **options)
+
+
+def record(store: HistoryStore, count: int, user_id: str = "user"):
+    for number in range(count):
+        store.record(user_id, "session", "Dermatologist AI", "oily", f"question {number}", f"answer {number}")
+    store.flush()
+
+
+def test_pages_walk_a_users_history_newest_first(tmp_path):
+    store = make_store(tmp_path)
+    record(store, 5)
+    record(store, 2, user_id="someone else")
+
+    first, cursor = store.page("user", limit=3)
+    second, last = store.page("user", before=cursor, limit=3)
+    assert [entry["question"] for entry in first + second] == [f"question {number}" for number in range(4, -1, -1)]
+    assert last is None
+    assert store.count("user") == 5
+    assert store.get(first[0]["id"])["response"] == "answer 4"
+
+
+def test_reads_close_their_connections(tmp_path, sqlite_connections):
+    store = make_store(tmp_path)
+    record(store, 3)
+    writer = [conn for conn in sqlite_connections if not conn.closed]
+
+    entries, _ = store.page("user")
+    store.get(entries[0]["id"])
+    store.count("user")
+    assert all(conn.closed for conn in sqlite_connections if conn not in writer)
+    assert len(sqlite_connections) - len(writer) >= 4  # setup and each read opened its own
+
+
+def test_a_failed_compaction_keeps_the_committed_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(history_store, "COMPACT_EVERY", 1)
+
+    def broken(self, conn):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(HistoryStore, "_compact", broken)
+    store = make_store(tmp_path, max_rows=2)
+    record(store, 4)
+
+    assert store.stats()["dropped"] == 0
+    assert store.stats()["written"] == 4
+    assert store.count("user") == 4
+
+
+def test_compaction_keeps_the_newest_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(history_store, "COMPACT_EVERY", 1)
+    store = make_store(tmp_path, max_rows=2)
+    record(store, 4)
+
+    assert store.count("user") == 2
+    assert [entry["question"] for entry in store.page("user")[0]] == ["question 3", "question 2"]
+
+
+def test_flush_gives_up_when_the_writer_is_gone_or_stuck(tmp_path, monkeypatch):
+    monkeypatch.setattr(HistoryStore, "_write_loop", lambda store: None)
+    store = make_store(tmp_path)
+    store._writer.join()
+    store.record("user", "session", "Dermatologist AI", "oily", "question", "answer")
+    start = time.monotonic()
+    assert store.flush() is False
+    assert time.monotonic() - start < 1
+
+    stuck = threading.Event()
+    monkeypatch.setattr(HistoryStore, "_write_loop", lambda store: stuck.wait())
+    store = make_store(tmp_path)
+    store.record("user", "session", "Dermatologist AI", "oily", "question", "answer")
+    start = time.monotonic()
+    assert store.flush(timeout=0.2) is False
+    assert 0.2 <= time.monotonic() - start < 1
+    stuck.set()
+
+
+def test_a_row_that_cannot_be_written_does_not_stop_the_writer(tmp_path):
+    store = make_store(tmp_path)
+    store._queue.put(("user", "session", "Dermatologist AI", "oily", "question", object(), None, None, 0.0))
+    assert store.flush(timeout=5)
+    record(store, 1)
+    assert store.count("user") == 1
+    assert store.stats()["dropped"] == 1
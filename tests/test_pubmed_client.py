@@ -0,0 +1,185 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+import pubmed_client
+from pubmed_client import PubMedClient, TokenBucket, _InFlight
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """ESearch/ESummary stub. Each request takes the next scripted (status, headers) reply, then 200s."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        stub = self.server.stub
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        with stub.lock:
+            stub.requests.append(url.path.rsplit("/", 1)[-1])
+            status, headers = stub.script.pop(0) if stub.script else (200, {})
+        time.sleep(stub.latency)
+        if status != 200:
+            payload = {"error": "unavailable"}
+        elif url.path.endswith("esearch.fcgi"):
+            ids = [str(30000000 + n) for n in range(int(params.get("retmax", 5)))]
+            payload = {"esearchresult": {"count": "42", "idlist": ids}}
+        else:
+            payload = {"result": {paper_id: {"title": f"Paper {paper_id}"} for paper_id in params["id"].split(",")}}
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class PubMedStub:
+    def __init__(self):
+        self.requests = []
+        self.script = []
+        self.latency = 0.0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def count(self, endpoint: str) -> int:
+        with self.lock:
+            return self.requests.count(endpoint)
+
+
+@pytest.fixture
+def stub():
+    stub = PubMedStub()
+    thread = threading.Thread(target=stub.server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield stub
+    stub.server.shutdown()
+    stub.server.server_close()
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    """Record the jitter ranges drawn for each retry and sleep for none of them."""
+    ranges = []
+
+    def uniform(low, high):
+        ranges.append((low, high))
+        return 0.0
+
+    monkeypatch.setattr(pubmed_client.random, "uniform", uniform)
+    return ranges
+
+
+def client_for(stub: PubMedStub, **options) -> PubMedClient:
+    return PubMedClient(base_url=stub.url, **dict({"rate": 1000}, **options))
+
+
+def test_token_bucket_spaces_requests_at_its_rate():
+    bucket = TokenBucket(rate=20, capacity=1)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    # The first token is free, the other four wait 1/20 s each
+    assert time.monotonic() - start >= 0.19
+
+
+def test_search_returns_ids_and_titles(stub):
+    result = client_for(stub).search("acne", max_ids=4, max_titles=2)
+    assert result.count == "42"
+    assert result.ids == ["30000000", "30000001", "30000002", "30000003"]
+    assert result.titles == {"30000000": "Paper 30000000", "30000001": "Paper 30000001"}
+
+
+def test_throttled_requests_are_retried_with_full_jitter(stub, no_backoff):
+    stub.script = [(503, {}), (429, {})]
+    result = client_for(stub, retries=3).search("eczema")
+    assert result.ids
+    assert stub.count("esearch.fcgi") == 3
+    # Each retry draws its delay from [0, base * 2**attempt]
+    assert no_backoff == [(0, pubmed_client.BACKOFF_BASE), (0, pubmed_client.BACKOFF_BASE * 2)]
+
+
+def test_retry_after_is_honored(stub, no_backoff):
+    stub.script = [(429, {"Retry-After": "1"})]
+    start = time.monotonic()
+    client_for(stub).search("rosacea")
+    assert time.monotonic() - start >= 1
+    assert stub.count("esearch.fcgi") == 2
+
+
+def test_retries_stop_at_the_deadline(stub, no_backoff):
+    stub.script = [(503, {"Retry-After": "5"})] * 4
+    start = time.monotonic()
+    with pytest.raises(requests.HTTPError):
+        client_for(stub, deadline=1).search("melasma")
+    # Waiting five seconds would pass the deadline, so the 503 is raised at once
+    assert time.monotonic() - start < 1
+    assert stub.count("esearch.fcgi") == 1
+
+
+def test_search_gives_up_after_its_retries(stub, no_backoff):
+    stub.script = [(503, {})] * 3
+    with pytest.raises(requests.HTTPError):
+        client_for(stub, retries=2).search("psoriasis")
+    assert stub.count("esearch.fcgi") == 3
+
+
+def test_results_are_cached_until_their_ttl(stub):
+    client = client_for(stub)
+    client.search("Dark  Spots")
+    client.search("dark spots")
+    assert stub.count("esearch.fcgi") == 1
+    assert stub.count("esummary.fcgi") == 1
+    assert client.stats()["hits"] == 1
+
+    expired = client_for(stub, ttl=0)
+    expired.search("dark spots")
+    expired.search("dark spots")
+    assert stub.count("esearch.fcgi") == 3
+
+
+def test_failed_searches_are_not_cached(stub, no_backoff):
+    client = client_for(stub, retries=0)
+    stub.script = [(503, {})]
+    with pytest.raises(requests.HTTPError):
+        client.search("hives")
+    assert client.search("hives").ids
+    assert stub.count("esearch.fcgi") == 2
+
+
+def test_concurrent_searches_share_one_request(stub):
+    stub.latency = 0.2
+    client = client_for(stub)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.search("acne scars"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 8
+    assert all(result.ids == results[0].ids for result in results)
+    assert stub.count("esearch.fcgi") == 1
+    assert stub.count("esummary.fcgi") == 1
+
+
+def test_followers_stop_waiting_at_the_leaders_deadline(stub):
+    client = client_for(stub)
+    # A leader that never finishes
+    client._inflight[("milia", 5)] = _InFlight(time.monotonic() + 0.2)
+    start = time.monotonic()
+    with pytest.raises(requests.Timeout):
+        client.search("milia")
+    assert time.monotonic() - start < 1
+    assert stub.count("esearch.fcgi") == 0
@@ -0,0 +1,90 @@
+import json
+import sqlite3
+
+import pytest
+
+from remedies import KeywordIndex
+from remedy_store import SCHEMA_VERSION, RemedyStore, build_store
+
+
+def write_json(path, conditions: list):
+    path.write_text(json.dumps({"conditions": conditions}), encoding="utf-8")
+
+
+def write_csv(path, rows: list):
+    lines = ["condition,category,lang,skin_type,text,priority"] + [",".join(row) for row in rows]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+@pytest.fixture
+def sources(tmp_path):
+    base = tmp_path / "base.json"
+    write_json(base, [{
+        "id": "acne", "priority": 1, "terms": {"en": ["acne", "pimples"]},
+        "advice": {"home": {"en": {"all": "Base acne advice.", "oily": "Base oily acne advice."}}},
+    }])
+    extra = tmp_path / "extra.csv"
+    write_csv(extra, [
+        ("acne", "term", "en", "all", "zits", "3"),
+        ("acne", "home", "en", "all", "Extra acne advice.", "3"),
+        ("eczema", "term", "en", "all", "eczema", "0"),
+        ("eczema", "home", "en", "all", "Extra eczema advice.", "0"),
+    ])
+    return base, extra, str(tmp_path / "remedies.db")
+
+
+def test_sources_sharing_a_condition_keep_their_own_rows(sources):
+    base, extra, db_path = sources
+    assert len(build_store([str(base), str(extra)], db_path)) == 2
+    store = RemedyStore(db_path)
+    assert store.terms() == {"acne": "acne", "pimples": "acne", "zits": "acne", "eczema": "eczema"}
+    assert store.priorities() == {"acne": 3, "eczema": 0}
+    # The source loaded last wins where both have an entry; the others still fall back as usual
+    assert store.advice("acne", "home") == "Extra acne advice."
+    assert store.advice("acne", "home", "oily") == "Base oily acne advice."
+
+    # Rebuilding the extra source without acne leaves the base source's acne in place
+    write_csv(extra, [("eczema", "term", "en", "all", "eczema", "0"),
+                      ("eczema", "home", "en", "all", "Rebuilt eczema advice.", "0")])
+    assert build_store([str(base), str(extra)], db_path) == [str(extra)]
+    store = RemedyStore(db_path)
+    assert store.terms() == {"acne": "acne", "pimples": "acne", "eczema": "eczema"}
+    assert store.priorities() == {"acne": 1, "eczema": 0}
+    assert store.advice("acne", "home") == "Base acne advice."
+
+    # Dropping the base source removes only what it alone provided
+    build_store([str(extra)], db_path)
+    store = RemedyStore(db_path)
+    assert store.priorities() == {"eczema": 0}
+    assert store.advice("acne", "home") is None
+    assert store.advice("eczema", "home") == "Rebuilt eczema advice."
+
+
+def test_unchanged_sources_are_not_reloaded(sources):
+    base, extra, db_path = sources
+    build_store([str(base), str(extra)], db_path)
+    assert build_store([str(base), str(extra)], db_path) == []
+
+
+def test_a_store_from_an_older_schema_is_rebuilt(sources):
+    base, _extra, db_path = sources
+    conn = sqlite3.connect(db_path)
+    conn.executescript("CREATE TABLE conditions (id TEXT PRIMARY KEY, source_id INTEGER, priority INTEGER);"
+                       "INSERT INTO conditions VALUES ('stale', 1, 0);")
+    conn.close()
+
+    assert build_store([str(base)], db_path) == [str(base)]
+    store = RemedyStore(db_path)
+    assert store.priorities() == {"acne": 1}
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    conn.close()
+
+
+def test_keyword_index_finds_whole_words_in_one_pass():
+    index = KeywordIndex({"mole": "moles", "dark spot": "dark_spots", "spot": "acne", "ニキビ": "acne"})
+
+    assert index.find("A Dark Spot near a mole") == [(2, 11, "dark_spots"), (7, 11, "acne"), (19, 23, "moles")]
+    # Terms inside a longer word do not count, except in scripts written without spaces
+    assert index.find("a molecule, spotless") == []
+    assert index.find("顔のニキビが痛い") == [(2, 5, "acne")]
@@ -0,0 +1,80 @@
+import os
+import re
+import zlib
+
+import pytest
+
+import report
+from report import BUNDLED_FONTS, FONT_DIR, ReportTemplate
+
+JAPANESE = "ニキビ 洗顔料"
+ARABIC = "حب الشباب"
+HINDI = "मुँहासे"
+
+
+@pytest.fixture
+def template(monkeypatch):
+    template = ReportTemplate([os.path.join(FONT_DIR, name) for name in BUNDLED_FONTS])
+    monkeypatch.setattr(report, "REPORT_TEMPLATE", template)
+    return template
+
+
+def pdf_objects(pdf: bytes) -> dict:
+    return {int(number): body for number, body in re.findall(rb"(\d+) 0 obj(.*?)endobj", pdf, re.S)}
+
+
+def stream(body: bytes) -> bytes:
+    data = re.search(rb"stream\r?\n(.*)\r?\nendstream", body, re.S).group(1)
+    return zlib.decompress(data) if b"/FlateDecode" in body else data
+
+
+def embedded_characters(pdf: bytes) -> dict:
+    """Map each embedded font's name to the characters its subset's ToUnicode CMap covers."""
+    objects = pdf_objects(pdf)
+    fonts = {}
+    for body in objects.values():
+        if b"/Subtype /Type0" not in body:
+            continue
+        name = re.search(rb"/BaseFont /[A-Z]{6}\+([\w-]+)", body).group(1).decode()
+        cmap = stream(objects[int(re.search(rb"/ToUnicode (\d+) 0 R", body).group(1))]).decode("latin-1")
+        characters = set()
+        for block in re.findall(r"beginbfchar(.*?)endbfchar", cmap, re.S):
+            for _cid, unicode in re.findall(r"<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]+)>", block):
+                characters.add(bytes.fromhex(unicode).decode("utf-16-be"))
+        fonts[name] = characters - {"\x00", " "}
+    return fonts
+
+
+def letters(text: str) -> set:
+    return set(text) - {" "}
+
+
+def test_documents_from_one_template_embed_their_own_glyph_subsets(template):
+    # Attaching a font to a document resets fpdf2's per-document font state; if an fpdf2
+    # upgrade adds or renames any of it, glyphs leak between documents or go missing.
+    first = embedded_characters(report.build_pdf_report("Dermatologist AI", "oily", "acne " + JAPANESE, "Wash gently."))
+    second = embedded_characters(report.build_pdf_report("Herbal", "dry", "zits " + HINDI, ARABIC + " Vox"))
+    again = embedded_characters(report.build_pdf_report("Dermatologist AI", "oily", "acne " + JAPANESE, "Wash gently."))
+
+    assert first["NotoSansJPRegular"] == letters(JAPANESE)
+    assert not first["NotoNaskhArabic"] and not first["NotoSerifDevanagari"]
+    assert first["NotoSans"] == letters("acne Wash gently.")
+
+    assert not second["NotoSansJPRegular"]
+    assert second["NotoNaskhArabic"] == letters(ARABIC)
+    # Shaping may substitute glyphs, but the subset must hold the word's letters and nothing else
+    assert second["NotoSerifDevanagari"] and second["NotoSerifDevanagari"] <= letters(HINDI)
+    assert second["NotoSans"] == letters("zits Vox")
+
+    assert again == first
+
+
+def test_long_headings_wrap_and_only_complex_scripts_are_shaped(template):
+    pdf = template.new_document()
+    top = pdf.get_y()
+    template.heading(pdf, "Full Consultation (" + ", ".join(["Dermatologist AI Advisor"] * 6) + ")")
+    # Two lines or more, rather than one running off the page
+    assert pdf.get_y() - top >= 20
+
+    template.write_text(pdf, "Plain Latin text.\n" + HINDI + "\nMore Latin text.")
+    assert not pdf.text_shaping
@@ -0,0 +1,27 @@
+from response_cache import ResponseCache
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    path = str(tmp_path / "cache.db")
+    ResponseCache(db_path=path).set("key", "answer")
+
+    cache = ResponseCache(db_path=path)
+    assert cache.get("key") == "answer"
+    assert cache.get("missing") is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_expired_entries_are_not_returned(tmp_path):
+    cache = ResponseCache(ttl=-1, db_path=str(tmp_path / "cache.db"))
+    cache.set("key", "answer")
+    assert cache.get("key") is None
+
+
+def test_every_operation_closes_its_connection(tmp_path, sqlite_connections):
+    cache = ResponseCache(db_path=str(tmp_path / "cache.db"))
+    cache.set("key", "answer")
+    ResponseCache(db_path=cache.db_path).get("key")
+    cache.clear()
+
+    assert len(sqlite_connections) == 5
+    assert all(conn.closed for conn in sqlite_connections)
@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+from scheduler import ModelLimit, QueueTimeout, RequestScheduler, parse_limits, use_session
+
+UNLIMITED_RPM = float("inf")
+
+
+def drain(scheduler: RequestScheduler, model: str, tokens: int = 0):
+    """Use up the budget a scheduler starts with, so the next request has to wait for a refill."""
+    while scheduler.budgets.reserve(model, tokens) == 0:
+        pass
+
+
+def test_limits_are_parsed_per_model():
+    assert parse_limits("gpt-4o=500/30000, gpt-4o-mini=500") == {
+        "gpt-4o": ModelLimit(500, 30000), "gpt-4o-mini": ModelLimit(500, float("inf")),
+    }
+    assert parse_limits("off") == {}
+
+
+def test_a_session_flooding_the_queue_does_not_starve_another():
+    # One request every 0.1 s once the starting budget is gone
+    scheduler = RequestScheduler({"gpt-4o": ModelLimit(600, float("inf"))}, db_path="")
+    drain(scheduler, "gpt-4o")
+    served = []
+
+    def request(session: str):
+        with use_session(session):
+            scheduler.acquire("gpt-4o", 0)
+        served.append(session)
+
+    flood = [threading.Thread(target=request, args=("flood",)) for _ in range(6)]
+    for thread in flood:
+        thread.start()
+    while scheduler.stats()["queued"] < 5:
+        time.sleep(0.005)
+    single = threading.Thread(target=request, args=("single",))
+    single.start()
+    for thread in flood + [single]:
+        thread.join()
+
+    # Queued behind at least five of the flood's requests, the single one waits for one of them at most
+    # (plus any sent before it arrived)
+    assert "single" in served[:3]
+    assert scheduler.stats()["sent"] == 7
+
+
+def test_a_token_budget_refill_unblocks_waiters():
+    # 10 tokens a second
+    scheduler = RequestScheduler({"gpt-4o": ModelLimit(UNLIMITED_RPM, 600)}, db_path="")
+    drain(scheduler, "gpt-4o", 600)
+    finished = []
+
+    def request():
+        scheduler.acquire("gpt-4o", 3)
+        finished.append(time.monotonic())
+
+    start = time.monotonic()
+    waiters = [threading.Thread(target=request) for _ in range(2)]
+    for thread in waiters:
+        thread.start()
+    for thread in waiters:
+        thread.join(timeout=5)
+
+    # Each waiter needs 0.3 s of refill, and gets it in turn
+    assert len(finished) == 2
+    assert 0.25 <= finished[0] - start and 0.55 <= finished[1] - start < 2
+
+
+def test_a_waiter_gives_up_at_its_deadline():
+    scheduler = RequestScheduler({"gpt-4o": ModelLimit(1, float("inf"))}, db_path="")
+    drain(scheduler, "gpt-4o")
+    start = time.monotonic()
+    with pytest.raises(QueueTimeout):
+        scheduler.acquire("gpt-4o", 0, deadline=start + 0.2)
+    assert time.monotonic() - start < 1
+    assert scheduler.stats()["queued"] == 0
+
+
+def test_processes_sharing_a_budget_file_draw_on_one_budget(tmp_path):
+    db_path = str(tmp_path / "budgets.db")
+    limits = {"gpt-4o": ModelLimit(UNLIMITED_RPM, 600)}
+    first, second = RequestScheduler(limits, db_path=db_path), RequestScheduler(limits, db_path=db_path)
+
+    assert first.budgets.reserve("gpt-4o", 600) == 0
+    # The second process sees the first one's spend: 300 tokens take half a minute to refill
+    assert second.budgets.reserve("gpt-4o", 300) == pytest.approx(30, abs=1)
+    # and a 429 pause in one process holds back the other
+    second.budgets.pause("gpt-4o-mini", 20)
+    assert first.budgets.reserve("gpt-4o-mini", 0) == pytest.approx(20, abs=1)
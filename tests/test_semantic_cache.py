@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from semantic_cache import DEFAULT_THRESHOLDS, SemanticCache, local_embedding
+
+STORED = "acne on my forehead"
+
+# Question -> whether it reuses the stored answer at the local default (0.92), the OpenAI
+# default (0.9) and a lowered 0.8 threshold, with the local embedding
+CASES = {
+    # Rewordings of the same words score 1.0
+    "I have acne on my forehead": (True, True, True),
+    "Acne on the forehead?": (True, True, True),
+    # Paraphrases share the acne condition but few words, and score about 0.8
+    "forehead pimples": (False, False, True),
+    "pimples on my forehead": (False, False, True),
+    "breakouts on my forehead": (False, False, False),
+    # Near misses: the winter question scores about 0.9, but a season or a different area changes the reuse key
+    "acne on my forehead in winter": (False, False, False),
+    "acne on my chin": (False, False, False),
+}
+THRESHOLDS = [DEFAULT_THRESHOLDS["local"], DEFAULT_THRESHOLDS["openai"], 0.8]
+
+
+@pytest.mark.parametrize("question", CASES)
+@pytest.mark.parametrize("column, threshold", list(enumerate(THRESHOLDS)))
+def test_local_embedding_matches(question, column, threshold):
+    cache = SemanticCache(local_embedding, "local", path="", threshold=threshold)
+    cache.add("Dermatologist AI Advisor", "oily", STORED, "stored answer")
+
+    answer, _similarity, _vector = cache.lookup("Dermatologist AI Advisor", "oily", question)
+    assert (answer == "stored answer") is CASES[question][column]
+
+
+def test_answers_stay_with_their_agent_skin_type_and_language():
+    cache = SemanticCache(local_embedding, "local", path="")
+    cache.add("Dermatologist AI Advisor", "oily", STORED, "stored answer")
+
+    assert cache.lookup("Dermatologist AI Advisor", "dry", STORED)[0] is None
+    assert cache.lookup("Research Assistant", "oily", STORED)[0] is None
+    assert cache.lookup("Dermatologist AI Advisor", "oily", STORED, "fr")[0] is None
+    assert cache.stats()["misses"] == 3
+
+
+def test_compaction_keeps_other_embedders_and_lines_appended_since_the_last_sync(tmp_path):
+    path = str(tmp_path / "index.jsonl")
+    other = SemanticCache(lambda text: local_embedding(text, 16), "other", path=path)
+    other.add("Dermatologist AI Advisor", "oily", STORED, "other embedder's answer")
+    cache = SemanticCache(local_embedding, "local", path=path, max_entries=2)
+    for number in range(2):
+        cache.add("Dermatologist AI Advisor", "oily", f"question {number}", f"answer {number}")
+    # Another process appends an entry this one has not synced yet
+    writer = SemanticCache(local_embedding, "local", path=path)
+    writer.add("Dermatologist AI Advisor", "dry", STORED, "written meanwhile")
+
+    with cache._lock:
+        cache._compact()
+
+    reader = SemanticCache(local_embedding, "local", path=path)
+    assert reader.lookup("Dermatologist AI Advisor", "dry", STORED)[0] == "written meanwhile"
+    assert reader.lookup("Dermatologist AI Advisor", "oily", "question 1")[0] == "answer 1"
+    other = SemanticCache(lambda text: local_embedding(text, 16), "other", path=path)
+    assert other.lookup("Dermatologist AI Advisor", "oily", STORED)[0] == "other embedder's answer"
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
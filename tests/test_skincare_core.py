@@ -0,0 +1,68 @@
+import time
+
+import pytest
+import requests
+
+import skincare_core
+from pubmed_client import PubMedClient
+from response_cache import ResponseCache
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResponseCache()
+    monkeypatch.setattr(skincare_core, "response_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def agents(openai_client):
+    return skincare_core.build_agents(openai_client)
+
+
+def test_failed_pubmed_search_is_shown_but_not_cached(agents, cache, mock_backend, monkeypatch):
+    client = PubMedClient(base_url=mock_backend.url, rate=1000)
+    monkeypatch.setattr(skincare_core, "pubmed_client", client)
+    agent = agents["Research Assistant"]
+    key = agent.cache_key("acne studies", model=agent.route("acne studies").model)
+
+    def offline(topic):
+        raise requests.ConnectionError("PubMed is down")
+
+    monkeypatch.setattr(client, "search", offline)
+    result = agent.run("acne studies")
+    assert not result.error
+    assert skincare_core.t("tool.pubmed_offline") in result.text
+    assert cache.get(key) is None
+
+    monkeypatch.delattr(client, "search")
+    result = agent.run("acne studies")
+    assert skincare_core.t("tool.pubmed_offline") not in result.text
+    assert cache.get(key) == result.text
+
+
+def test_streamed_answer_survives_a_raising_tool(agents, cache, monkeypatch):
+    def broken(condition):
+        raise RuntimeError("remedy store unavailable")
+
+    monkeypatch.setattr(skincare_core, "get_dermatologist_advice", broken)
+    agent = agents["Dermatologist AI"]
+
+    text = "".join(agent.analyze_stream("rosacea flare"))
+    assert text.endswith(skincare_core.t("tool.failed"))
+    assert len(text) > len(skincare_core.t("tool.failed"))
+    assert cache.get(agent.cache_key("rosacea flare", model=agent.route("rosacea flare").model)) is None
+
+
+def test_tool_timeout_is_not_cached(agents, cache, monkeypatch):
+    def slow(issue):
+        time.sleep(1)
+        return "too late"
+
+    monkeypatch.setattr(skincare_core, "get_home_remedies", slow)
+    monkeypatch.setattr(skincare_core, "TOOL_TIMEOUT", 0.1)
+    agent = agents["Home Remedy Expert"]
+
+    result = agent.run("oily t-zone", structured=True)
+    assert skincare_core.t("tool.timeout") in result.findings.notes
+    assert cache.get(agent.cache_key("oily t-zone", model=agent.route("oily t-zone").model, output="findings")) is None
@@ -0,0 +1,78 @@
+# Languages and translated text live in the catalogues under locales/ (see i18n.py)
+from i18n import LANGUAGES, t  # noqa: F401
+
+
+# Custom CSS for the Streamlit page
+APP_CSS = """
+    <style>
+    .main {
+        background: linear-gradient(135deg, #e0f7fa 0%, #fce4ec 100%);
+    }
+    .stApp {
+        font-family: 'Segoe UI', 'Arial', sans-serif;
+        background: linear-gradient(135deg, #e0f7fa 0%, #fce4ec 100%);
+    }
+    .stTitle, .stMarkdown h1, .stMarkdown h2, .stMarkdown h3 {
+        color: #00695c;
+        font-weight: 700;
+    }
+    .stButton>button {
+        background: linear-gradient(90deg,#43cea2,#185a9d);
+        color: white;
+        border-radius: 8px;
+        font-weight: bold;
+        border: none;
+        padding: 0.5em 1.5em;
+        box-shadow: 0 2px 8px #b2dfdb;
+    }
+    .stDownloadButton>button {
+        background: linear-gradient(90deg,#ffaf7b,#d76d77);
+        color: white;
+        border-radius: 8px;
+        font-weight: bold;
+        border: none;
+        padding: 0.5em 1.5em;
+        box-shadow: 0 2px 8px #f8bbd0;
+    }
+    .stTextArea textarea {
+        background: #f1f8e9;
+        border-radius: 8px;
+        border: 1px solid #aed581;
+        font-size: 1.1em;
+    }
+    .stSelectbox, .stSlider {
+        background: #fffde7;
+        border-radius: 8px;
+        border: 1px solid #ffd54f;
+    }
+    .stFileUploader {
+        background: #e3f2fd;
+        border-radius: 8px;
+        border: 1px solid #90caf9;
+    }
+    .stSuccess {
+        background: #e0f2f1;
+        color: #004d40;
+        border-radius: 8px;
+        font-weight: bold;
+        padding: 0.5em;
+    }
+    .stWarning {
+        background: #fff3e0;
+        color: #e65100;
+        border-radius: 8px;
+        font-weight: bold;
+        padding: 0.5em;
+    }
+    .stInfo {
+        background: #e3f2fd;
+        color: #01579b;
+        border-radius: 8px;
+        font-weight: bold;
+        padding: 0.5em;
+    }
+    .stMarkdown {
+        font-size: 1.1em;
+    }
+    </style>
+"""